@@ -0,0 +1,14 @@
+"""
+Benchmarks of the scripts on synthetic sphinx-needs exports.
+
+The scripts are plain modules importing each other by name, so the scripts
+folder is put on the module search path for all benchmarks.
+"""
+
+import sys
+from pathlib import Path
+
+scripts_dir : Path = Path(__file__).resolve().parent.parent / "scripts"
+
+if str(scripts_dir) not in sys.path:
+    sys.path.insert(0, str(scripts_dir))
@@ -0,0 +1,141 @@
+# usage:
+# python -m benchmarks.conf_startup --sizes 500 2000 8000 --repeat 5
+
+"""
+conf.py load time with pasted literal config and with a metamodel snapshot.
+
+For each metamodel size, json2conf.py generates the conf text, the schema and
+the snapshot. Two conf.py variants are then evaluated like Sphinx does it
+(read, compile and exec the file): one with the conf text pasted in and the
+schema read from the .schema.json (needs_schema_definitions_from_json), and
+one calling load_snapshot. The version prints and the sphinx imports of the
+test-project conf.py cost the same in both variants and are left out.
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import benchmarks  # also puts the scripts on the module search path
+from benchmarks.synthetic import export, synthetic_metamodel
+
+import json2conf
+
+literal_conf : str = """\
+import json
+with open({schema!r}, 'r') as infile:
+    needs_schema_definitions = json.load(infile)
+
+{conf}"""
+
+snapshot_conf : str = """\
+import sys
+sys.path.append({scripts!r})
+from metamodel_snapshot import load_snapshot
+
+metamodel = load_snapshot({snapshot!r})
+needs_types = metamodel["needs_types"]
+needs_extra_options = metamodel["needs_extra_options"]
+needs_extra_links = metamodel["needs_extra_links"]
+needs_schema_definitions = metamodel["schema"]
+"""
+
+
+config_types : Dict[str, type] = {
+    "needs_types": json2conf.NeedType,
+    "needs_extra_options": json2conf.NeedExtraOption,
+    "needs_extra_links": json2conf.LinkOptionsType,
+}
+
+
+def converted(elements: List[Dict[str, Any]], typed_dict: type) -> List[Dict[str, Any]]:
+    """
+    Config dicts with the values converted like json2conf.elements2config does.
+    """
+    bools = json2conf.bool_fields(typed_dict)
+    result = []
+    for element in elements:
+        values = {k: json2conf.config_value(k, v, bools) for k, v in element.items()}
+        result.append({k: v for k, v in values.items() if v is not None})
+    return result
+
+
+def eval_conf(path: Path) -> Dict[str, Any]:
+    """
+    Evaluate a conf.py the way sphinx.config.eval_config_file does.
+    """
+    namespace: Dict[str, Any] = {"__file__": str(path)}
+    code = compile(path.read_bytes(), str(path), "exec")
+    exec(code, namespace)
+    return namespace
+
+
+def timed(path: Path, repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        # garbage of the previous run is not charged to this one
+        gc.collect()
+        start = time.perf_counter()
+        eval_conf(path)
+        times.append(time.perf_counter() - start)
+    return {"min_s": min(times), "median_s": statistics.median(times)}
+
+
+def main(sizes: List[int], repeat: int, json_path: Path) -> None:
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        for size in sizes:
+            input_path = work_dir / f"needs_{size}.json"
+            output_path = work_dir / f"output_{size}.txt"
+            metamodel = synthetic_metamodel(types=size, typegroups=max(1, size // 20),
+                                            options=max(1, size // 4), links=10)
+            with open(input_path, 'w') as outfile:
+                json.dump(export(metamodel, "Metamodel"), outfile)
+            with contextlib.redirect_stdout(io.StringIO()):
+                json2conf.main(input_path, output_path, snapshot=True)
+
+            literal_path = work_dir / f"conf_literal_{size}.py"
+            literal_path.write_text(literal_conf.format(schema=str(output_path.with_suffix('.schema.json')),
+                                                        conf=output_path.read_text()))
+            snapshot_path = work_dir / f"conf_snapshot_{size}.py"
+            snapshot_path.write_text(snapshot_conf.format(scripts=str(benchmarks.scripts_dir),
+                                                          snapshot=str(output_path.with_suffix('.snapshot'))))
+
+            # both variants must configure the same values, the pasted text still holds the raw export values
+            literal, snapshot = eval_conf(literal_path), eval_conf(snapshot_path)
+            for name, typed_dict in config_types.items():
+                literal[name] = converted(literal[name], typed_dict)
+            for name in ["needs_types", "needs_extra_options", "needs_extra_links", "needs_schema_definitions"]:
+                if literal[name] != snapshot[name]:
+                    raise AssertionError(f"{name} differs between literal and snapshot conf.py")
+
+            for variant, path, data_paths in [("literal", literal_path, [output_path.with_suffix('.schema.json')]),
+                                              ("snapshot", snapshot_path, [output_path.with_suffix('.snapshot')])]:
+                size_bytes = path.stat().st_size + sum(data_path.stat().st_size for data_path in data_paths)
+                results.append({"types": size, "variant": variant, "bytes": size_bytes, **timed(path, repeat)})
+
+    print(f"{'types':>7}  {'variant':<10}{'min [s]':>10}{'median [s]':>12}{'size [KiB]':>12}")
+    for result in results:
+        print(f"{result['types']:>7}  {result['variant']:<10}{result['min_s']:>10.4f}"
+              f"{result['median_s']:>12.4f}{result['bytes'] / 1024:>12.1f}")
+
+    if json_path is not None:
+        with open(json_path, 'w') as outfile:
+            json.dump({"repeat": repeat, "results": results}, outfile, indent=4)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Benchmark conf.py load time, literal config vs snapshot.")
+      parser.add_argument("--sizes", help="Numbers of sn_type elements.", nargs="+", default=[500, 2000, 8000], type=int)
+      parser.add_argument("--repeat", help="Number of timed loads per variant.", default=5, type=int)
+      parser.add_argument("--json", help="Path of the machine-readable results.", default=None, type=Path)
+      args = parser.parse_args()
+
+      main(args.sizes, args.repeat, args.json)
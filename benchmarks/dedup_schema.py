@@ -0,0 +1,93 @@
+# usage:
+# python -m benchmarks.dedup_schema --sizes 100 1000 --project-needs 5000 --repeat 3
+
+"""
+Bytes saved and equivalence of the deduplicated schema output (--dedup).
+
+For the use_datamodel fixture and for synthetic metamodels, the generated
+schema and its flattened form are deduplicated. Each deduplicated document
+must fail exactly the same (need, schema entry) pairs of a project with
+broken needs as the original, see flat_schema. The pretty printed size,
+the time of the deduplication and the validation time are reported.
+"""
+
+import argparse
+import gc
+import statistics
+import time
+from typing import Any, Dict, List
+
+from benchmarks.flat_schema import break_needs, fixture_path, verdicts
+from benchmarks.synthetic import synthetic_metamodel, synthetic_project
+
+import validate
+from json2conf import json2schema
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json
+from schema_dedup import dedup_schema
+from schema_flatten import flatten_schema
+
+
+def check(name: str, metamodel: Dict[str, Any], project: Dict[str, Any], repeat: int) -> List[Dict[str, Any]]:
+    schema = json2schema(MetamodelIndex(needs2records(metamodel)))
+
+    results = []
+    for variant, original in [("nested", schema), ("flat", flatten_schema(schema))]:
+        start = time.perf_counter()
+        deduplicated, stats = dedup_schema(original)
+        dedup_s = time.perf_counter() - start
+
+        found = {}
+        for document, label in [(original, variant), (deduplicated, variant + "+dedup")]:
+            compiled = validate.CompiledSchemas(document)
+            needs = {need_id: validate.reduce_need({k: v for k, v in need.items() if k in compiled.fields})
+                     for need_id, need in project.items()}
+            times = []
+            for _ in range(repeat):
+                gc.collect()
+                start = time.perf_counter()
+                messages = validate.validate_needs(compiled, needs)
+                times.append(time.perf_counter() - start)
+            found[label] = verdicts(messages)
+            results.append({"metamodel": name, "variant": label, "failed": len(found[label]),
+                            "bytes": stats["bytes_after" if document is deduplicated else "bytes_before"],
+                            "shared_defs": stats["shared_defs"] if document is deduplicated else 0,
+                            "dedup_s": dedup_s if document is deduplicated else 0.0,
+                            "median_s": statistics.median(times)})
+
+        if found[variant] != found[variant + "+dedup"]:
+            difference = sorted(found[variant] ^ found[variant + "+dedup"])[:10]
+            raise AssertionError(f"{name}: deduplicated {variant} schema is not equivalent, e.g. {difference}")
+    return results
+
+
+def main(sizes: List[int], project_needs: int, repeat: int) -> None:
+    cases = [("use_datamodel", stream_needs_from_json(fixture_path))]
+    cases += [(f"synthetic {size}", synthetic_metamodel(types=size, typegroups=max(1, size // 10),
+                                                         options=max(1, size // 5)))
+              for size in sizes]
+
+    results = []
+    for name, metamodel in cases:
+        project = synthetic_project(metamodel, project_needs)
+        break_needs(project, metamodel)
+        results += check(name, metamodel, project, repeat)
+
+    print(f"{'metamodel':<18}{'variant':<13}{'failed':>8}{'size [KiB]':>12}{'saved':>8}{'shared':>8}"
+          f"{'dedup [s]':>11}{'validate [s]':>14}")
+    for original, deduplicated in zip(results[::2], results[1::2]):
+        saved = 1 - deduplicated["bytes"] / original["bytes"]
+        for result in (original, deduplicated):
+            print(f"{result['metamodel']:<18}{result['variant']:<13}{result['failed']:>8}"
+                  f"{result['bytes'] / 1024:>12.1f}{saved if result is deduplicated else 0:>8.1%}"
+                  f"{result['shared_defs']:>8}{result['dedup_s']:>11.4f}{result['median_s']:>14.4f}")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Check the deduplicated schema output and report the bytes saved.")
+      parser.add_argument("--sizes", help="Numbers of sn_type elements of the synthetic metamodels.", nargs="+", default=[100, 1000], type=int)
+      parser.add_argument("--project-needs", help="Number of needs in each project.", default=5000, type=int)
+      parser.add_argument("--repeat", help="Number of timed validations per schema.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.sizes, args.project_needs, args.repeat)
@@ -0,0 +1,139 @@
+# usage:
+# python -m benchmarks.flat_schema --sizes 100 1000 --project-needs 5000 --repeat 3
+
+"""
+Equivalence and validation time of the flattened schema output (--flat).
+
+For the use_datamodel fixture and for synthetic metamodels, the generated
+schema and its flattened form validate the same project needs. The project
+has valid needs and needs broken on purpose: a required option removed, an
+option unknown to the type added, an option value outside its enum, a link
+to a need of the wrong type. Both schemas must fail exactly the same (need,
+schema entry) pairs. Then the validation time per schema is measured.
+Each flattened schema must also be accepted by sphinx-needs, loaded with
+needs_schema_definitions_from_json into a sphinx project built with -W.
+"""
+
+import argparse
+import gc
+import json
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+import benchmarks
+from benchmarks.synthetic import synthetic_metamodel, synthetic_project
+
+import validate
+from json2conf import index2config, json2schema
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json
+from schema_flatten import flatten_schema
+
+fixture_path : Path = benchmarks.scripts_dir.parent / "use_datamodel" / "needs.json"
+
+
+def break_needs(project: Dict[str, Any], metamodel: Dict[str, Any], seed: int = 0) -> None:
+    """
+    Break every second need of the project in one of four ways.
+    """
+    rng = random.Random(seed)
+    option_names = [n["name"] for n in metamodel.values() if n["type"] == "sn_option"]
+    link_options = [n["option"] for n in metamodel.values() if n["type"] == "sn_link"]
+    need_ids = list(project)
+    for k, need in enumerate(project.values()):
+        if k % 2:
+            continue
+        mode = rng.randrange(4)
+        set_options = [name for name in option_names if need.get(name)]
+        if mode == 0 and set_options:
+            del need[rng.choice(set_options)]
+        elif mode == 1 and option_names:
+            need[rng.choice(option_names)] = "ASIL-B"
+        elif mode == 2 and set_options:
+            need[rng.choice(set_options)] = "not in any enum"
+        elif link_options:
+            option = rng.choice(link_options)
+            need[option] = [*need.get(option, []), rng.choice(need_ids)]
+
+
+def verdicts(messages: List[str]) -> Set[Tuple[str, str]]:
+    return {tuple(message.split(": ", 2)[:2]) for message in messages}
+
+
+def sphinx_load(index: MetamodelIndex, flat: Dict[str, Any]) -> None:
+    """
+    Build a sphinx project configured from the metamodel with the flattened schema.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        project_dir = Path(tmp)
+        (project_dir / "flat.schema.json").write_text(json.dumps(flat, indent=4), encoding="utf-8")
+        conf = ["extensions = ['sphinx_needs']"]
+        conf += [f"{name} = {value!r}" for name, value in index2config(index).items()]
+        conf.append("needs_schema_definitions_from_json = 'flat.schema.json'")
+        (project_dir / "conf.py").write_text("\n".join(conf) + "\n", encoding="utf-8")
+        (project_dir / "index.rst").write_text("Flat schema\n===========\n", encoding="utf-8")
+        subprocess.run([sys.executable, "-m", "sphinx", "-b", "dummy", "-q", "-W", str(project_dir),
+                        str(project_dir / "_build")], check=True)
+
+
+def check(name: str, metamodel: Dict[str, Any], project: Dict[str, Any], repeat: int) -> List[Dict[str, Any]]:
+    index = MetamodelIndex(needs2records(metamodel))
+    schema = json2schema(index)
+    flat = flatten_schema(schema)
+    sphinx_load(index, flat)
+
+    results = []
+    found = {}
+    for variant, document in [("nested", schema), ("flat", flat)]:
+        compiled = validate.CompiledSchemas(document)
+        needs = {need_id: validate.reduce_need({k: v for k, v in need.items() if k in compiled.fields})
+                 for need_id, need in project.items()}
+        times = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            messages = validate.validate_needs(compiled, needs)
+            times.append(time.perf_counter() - start)
+        found[variant] = verdicts(messages)
+        results.append({"metamodel": name, "variant": variant, "failed": len(found[variant]),
+                        "bytes": len(json.dumps(document, indent=4)),
+                        "min_s": min(times), "median_s": statistics.median(times)})
+
+    if found["nested"] != found["flat"]:
+        difference = sorted(found["nested"] ^ found["flat"])[:10]
+        raise AssertionError(f"{name}: flat schema is not equivalent, e.g. {difference}")
+    return results
+
+
+def main(sizes: List[int], project_needs: int, repeat: int) -> None:
+    cases = [("use_datamodel", stream_needs_from_json(fixture_path))]
+    cases += [(f"synthetic {size}", synthetic_metamodel(types=size, typegroups=max(1, size // 10),
+                                                         options=max(1, size // 5)))
+              for size in sizes]
+
+    results = []
+    for name, metamodel in cases:
+        project = synthetic_project(metamodel, project_needs)
+        break_needs(project, metamodel)
+        results += check(name, metamodel, project, repeat)
+
+    print(f"{'metamodel':<18}{'variant':<9}{'failed':>8}{'min [s]':>10}{'median [s]':>12}{'size [KiB]':>12}")
+    for result in results:
+        print(f"{result['metamodel']:<18}{result['variant']:<9}{result['failed']:>8}{result['min_s']:>10.4f}"
+              f"{result['median_s']:>12.4f}{result['bytes'] / 1024:>12.1f}")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Check and time the flattened schema output.")
+      parser.add_argument("--sizes", help="Numbers of sn_type elements of the synthetic metamodels.", nargs="+", default=[100, 1000], type=int)
+      parser.add_argument("--project-needs", help="Number of needs in each project.", default=5000, type=int)
+      parser.add_argument("--repeat", help="Number of timed validations per schema.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.sizes, args.project_needs, args.repeat)
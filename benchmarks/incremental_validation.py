@@ -0,0 +1,122 @@
+# usage:
+# python -m benchmarks.incremental_validation --types 200 --project-needs 20000 --repeat 3
+
+"""
+Equivalence and time of the incremental project validation (validation_cache).
+
+A synthetic project with broken needs is validated once in full and then
+through the cache: cold, unchanged, after editing one need, after changing
+the schema of one option and after retargeting one association. After each
+step the cached messages must equal a full validation of the same inputs.
+The revalidated and skipped needs, the needs governed by the changed
+metamodel elements and the time of each step are reported.
+"""
+
+import argparse
+import gc
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+from benchmarks.flat_schema import break_needs
+from benchmarks.synthetic import synthetic_metamodel, synthetic_project
+
+import validate
+from json2conf import json2schema
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from validation_cache import ValidationCache, validate_needs_cached
+
+# a step edits the metamodel or the project in place
+Step = Tuple[str, Callable[[Dict[str, Any], Dict[str, Any]], None]]
+
+
+def edit_need(metamodel: Dict[str, Any], project: Dict[str, Any]) -> None:
+    option_names = {n["name"] for n in metamodel.values() if n["type"] == "sn_option"}
+    need = next(n for n in project.values() if option_names & n.keys())
+    name = sorted(option_names & need.keys())[0]
+    need[name] = "ASIL-D" if need[name] != "ASIL-D" else "QM"
+
+
+def edit_option(metamodel: Dict[str, Any], project: Dict[str, Any]) -> None:
+    option = next(n for n in metamodel.values() if n["type"] == "sn_option")
+    option["schema"] = json.dumps({"type": "string", "enum": ["ASIL-A", "ASIL-B", "ASIL-C", "ASIL-D"]})
+
+
+def edit_association(metamodel: Dict[str, Any], project: Dict[str, Any]) -> None:
+    association = next(n for n in metamodel.values() if n["type"] == "sn_association")
+    types = [n["id"] for n in metamodel.values() if n["type"] == "sn_type"]
+    old, new = association["targets"][0], next(t for t in types if t != association["targets"][0])
+    association["targets"] = [new]
+    metamodel[old]["targets_back"].remove(association["id"])
+    metamodel[new]["targets_back"].append(association["id"])
+
+
+steps : List[Step] = [
+    ("cold", lambda metamodel, project: None),
+    ("unchanged", lambda metamodel, project: None),
+    ("one need edited", edit_need),
+    ("option schema changed", edit_option),
+    ("association retargeted", edit_association),
+]
+
+
+def prepare(metamodel: Dict[str, Any], project: Dict[str, Any]) -> Tuple[MetamodelIndex, Dict[str, Any], validate.CompiledSchemas, Dict[str, Any]]:
+    index = MetamodelIndex(needs2records(metamodel))
+    document = json.loads(json.dumps(json2schema(index)))
+    schemas = validate.CompiledSchemas(document)
+    needs = {need_id: validate.reduce_need({k: v for k, v in need.items() if k in schemas.fields})
+             for need_id, need in project.items()}
+    return index, document, schemas, needs
+
+
+def main(types: int, project_needs: int, repeat: int) -> None:
+    metamodel = synthetic_metamodel(types=types, typegroups=max(1, types // 10), options=max(1, types // 5))
+    project = synthetic_project(metamodel, project_needs)
+    break_needs(project, metamodel)
+
+    print(f"{'step':<24}{'revalidated':>12}{'skipped':>9}{'elements':>10}{'governed':>10}"
+          f"{'full [s]':>10}{'cached [s]':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = Path(tmp) / "validation.cache.json"
+        for name, step in steps:
+            step(metamodel, project)
+            index, document, schemas, needs = prepare(metamodel, project)
+
+            gc.collect()
+            start = time.perf_counter()
+            expected = validate.validate_needs(schemas, needs)
+            full_s = time.perf_counter() - start
+
+            # the first run of a step is checked, the repeats only find the results of this step
+            times = []
+            for k in range(repeat):
+                snapshot = cache_path.read_bytes() if cache_path.exists() else None
+                gc.collect()
+                start = time.perf_counter()
+                messages, stats = validate_needs_cached(schemas, document, needs, ValidationCache(cache_path), index)
+                times.append(time.perf_counter() - start)
+                if k == 0:
+                    if messages != expected:
+                        difference = sorted(set(messages) ^ set(expected))[:10]
+                        raise AssertionError(f"{name}: cached validation differs, e.g. {difference}")
+                    first = stats
+                if k < repeat - 1 and snapshot is not None:
+                    cache_path.write_bytes(snapshot)
+                elif k < repeat - 1:
+                    cache_path.unlink()
+
+            print(f"{name:<24}{first['validated']:>12}{first['skipped']:>9}{first['changed_elements']:>10}"
+                  f"{first['governed_needs']:>10}{full_s:>10.4f}{statistics.median(times):>12.4f}")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Check and time the incremental project validation.")
+      parser.add_argument("--types", help="Number of sn_type elements of the synthetic metamodel.", default=200, type=int)
+      parser.add_argument("--project-needs", help="Number of needs in the project.", default=20000, type=int)
+      parser.add_argument("--repeat", help="Number of timed cached validations per step.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.types, args.project_needs, args.repeat)
@@ -0,0 +1,92 @@
+# usage:
+# python -m benchmarks.json_backend --types 2000 --filler 50000 --repeat 3
+
+"""
+Load and dump times of the JSON backends and sizes of the schema output modes.
+
+Loads a synthetic metamodel export with the stdlib and, if installed, with
+orjson, then writes the generated schema pretty printed (indent 4, the default
+output), compact and compact streamed.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import benchmarks  # noqa: F401, puts the scripts on the module search path
+from benchmarks.synthetic import export, synthetic_metamodel
+
+import json_io
+import json2conf
+from output_writer import write_chunks_if_changed, write_if_changed
+
+
+def timed(run: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {"min_s": min(times), "median_s": statistics.median(times)}
+
+
+def main(params: Dict[str, int], repeat: int, json_path: Path) -> None:
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        input_path = work_dir / "needs.json"
+        with open(input_path, 'w') as outfile:
+            json.dump(export(synthetic_metamodel(**params), "Metamodel"), outfile)
+        data = input_path.read_bytes()
+
+        results.append({"name": "load json", "bytes": len(data), **timed(lambda: json.loads(data), repeat)})
+        if json_io.orjson is not None:
+            results.append({"name": "load orjson", "bytes": len(data),
+                            **timed(lambda: json_io.orjson.loads(data), repeat)})
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            json2conf.main(input_path, work_dir / "output.txt")
+        schema = json_io.load(work_dir / "output.schema.json")
+
+        def write(name: str, run: Callable[[Path], Any]) -> None:
+            path = work_dir / f"{name.replace(' ', '_')}.schema.json"
+            # always write, the comparison with the existing file is not measured here
+            timing = timed(lambda: (path.unlink(missing_ok=True), run(path)), repeat)
+            results.append({"name": name, "bytes": path.stat().st_size, **timing})
+
+        write("dump pretty", lambda p: write_if_changed(p, json_io.dumps(schema)))
+        write("dump compact", lambda p: write_if_changed(p, json_io.dumps(schema, compact=True, sort_keys=True)))
+        write("dump compact streamed", lambda p: write_chunks_if_changed(p, json_io.iter_dump(schema, compact=True)))
+
+    print(f"backend: {json_io.backend}")
+    print(f"{'case':<24}{'min [s]':>10}{'median [s]':>12}{'size [KiB]':>12}")
+    for result in results:
+        print(f"{result['name']:<24}{result['min_s']:>10.4f}{result['median_s']:>12.4f}"
+              f"{result['bytes'] / 1024:>12.1f}")
+
+    if json_path is not None:
+        report = {"backend": json_io.backend, "params": params, "repeat": repeat, "results": results}
+        with open(json_path, 'w') as outfile:
+            json.dump(report, outfile, indent=4)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Benchmark the JSON backends and schema output modes.")
+      parser.add_argument("--types", help="Number of sn_type elements.", default=2000, type=int)
+      parser.add_argument("--typegroups", help="Number of sn_typegroup elements.", default=100, type=int)
+      parser.add_argument("--options", help="Number of sn_option elements.", default=100, type=int)
+      parser.add_argument("--links", help="Number of sn_link elements.", default=10, type=int)
+      parser.add_argument("--associations", help="Number of sn_association elements per type.", default=3, type=int)
+      parser.add_argument("--filler", help="Number of ordinary needs in the metamodel export.", default=20000, type=int)
+      parser.add_argument("--repeat", help="Number of timed runs per case.", default=3, type=int)
+      parser.add_argument("--json", help="Path of the machine-readable results.", default=None, type=Path)
+      args = parser.parse_args()
+
+      params = dict(types=args.types, typegroups=args.typegroups, options=args.options, links=args.links,
+                    associations=args.associations, filler=args.filler)
+      main(params, args.repeat, args.json)
@@ -0,0 +1,93 @@
+# usage:
+# python -m benchmarks.pipeline --types 1000 --filler 20000 --repeat 3
+
+"""
+One load for all outputs (pipeline.py) against one script run per output.
+
+The separate runs are json2conf.main for the conf text and the schema,
+basic_json2conf.main for the basic flavor and a TOML-only pipeline run, each
+parsing the export on its own. The pipeline writes the same outputs from one
+parse. The outputs of both must be identical, and a sphinx project reading
+the TOML output with needs_from_toml must build.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.synthetic import export, synthetic_metamodel
+
+import basic_json2conf
+import json2conf
+import pipeline
+
+
+def timed(run: Callable[[], None], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(types: int, filler: int, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        input_path = work_dir / "needs.json"
+        metamodel = synthetic_metamodel(types=types, typegroups=max(1, types // 10), options=max(1, types // 5),
+                                        filler=filler)
+        with open(input_path, 'w') as outfile:
+            json.dump(export(metamodel, "Metamodel"), outfile)
+        (work_dir / "separate").mkdir()
+        (work_dir / "pipeline").mkdir()
+        names = list(pipeline.emitters)
+
+        def separate() -> None:
+            output_path = work_dir / "separate" / "output.txt"
+            json2conf.main(input_path, output_path)
+            basic_json2conf.main(input_path, output_path.with_suffix(".basic.txt"))
+            pipeline.main(input_path, output_path, ["toml"])
+
+        def single() -> None:
+            pipeline.main(input_path, work_dir / "pipeline" / "output.txt", names)
+
+        separate_s = timed(separate, repeat)
+        single_s = timed(single, repeat)
+
+        for name in names:
+            output = pipeline.emitters[name].output(Path("output.txt"))
+            if (work_dir / "separate" / output).read_bytes() != (work_dir / "pipeline" / output).read_bytes():
+                raise AssertionError(f"{output} differs between the separate runs and the pipeline")
+
+        # the TOML must configure sphinx-needs, not only parse back to the same values
+        project_dir = work_dir / "toml_project"
+        project_dir.mkdir()
+        (project_dir / "ubproject.toml").write_bytes((work_dir / "pipeline" / "output.toml").read_bytes())
+        (project_dir / "conf.py").write_text("extensions = ['sphinx_needs']\nneeds_from_toml = 'ubproject.toml'\n",
+                                             encoding="utf-8")
+        (project_dir / "index.rst").write_text("TOML\n====\n", encoding="utf-8")
+        subprocess.run([sys.executable, "-m", "sphinx", "-b", "dummy", "-q", "-W", str(project_dir),
+                        str(project_dir / "_build")], check=True)
+
+        print(f"export {input_path.stat().st_size / 1024 / 1024:.1f} MiB, outputs: {', '.join(names)}")
+        print(f"{'separate runs':<16}{separate_s:>10.4f} s")
+        print(f"{'pipeline':<16}{single_s:>10.4f} s  ({separate_s / single_s:.1f}x)")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Compare the pipeline with one script run per output.")
+      parser.add_argument("--types", help="Number of sn_type elements.", default=1000, type=int)
+      parser.add_argument("--filler", help="Number of ordinary needs in the export.", default=20000, type=int)
+      parser.add_argument("--repeat", help="Number of timed runs.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.types, args.filler, args.repeat)
@@ -0,0 +1,126 @@
+# usage:
+# python -m benchmarks.plantuml_render --plantuml "java -jar ./_tools/plantuml.jar" --typegroups 20 --jobs 2
+# python -m benchmarks.plantuml_render --project ./metamodel
+
+"""
+Diagram rendering with one JVM per diagram against the cached pipe rendering (plantuml_render).
+
+For every typegroup of the use_datamodel fixture and of a synthetic
+metamodel, a flow diagram of its types and their associations is generated,
+like the needflow of the metamodel documentation. The diagrams are rendered
+with one PlantUML process each (as sphinxcontrib.plantuml does), with pipe
+processes and an empty cache (cold), and with a new renderer on the filled
+cache (warm, as the next build). All three must give the same images.
+
+With --project, the build time of the sphinx project is measured as well:
+without the extension (plantuml_pipe_processes=0), with a cold and with a
+warm cache, each into a new output folder.
+"""
+
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, List, Optional
+
+from benchmarks.synthetic import synthetic_metamodel
+
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json
+from plantuml_render import PlantumlRenderer, format_arguments, plantuml_command, with_start_end
+
+fixture_path : Path = Path(__file__).resolve().parent.parent / "use_datamodel" / "needs.json"
+
+
+def flow_diagrams(index: MetamodelIndex) -> List[str]:
+    """
+    A flow diagram per typegroup, with its types and the associations between them.
+    """
+    diagrams = []
+    for group in index.typegroups:
+        types = index.typegroup_closure.types_in(group["id"])
+        lines = ["@startuml", f'rectangle "{group.get("title", group["id"])}" {{']
+        lines += [f'  node "{index[t].get("title", t)}" as {t}' for t in types]
+        lines.append("}")
+        for t in types:
+            for child in index[t].get("parent_needs_back", []):
+                association = index.association(child)
+                targets = index.get(child, {}).get("targets", []) if association is not None else []
+                lines += [f"{t} --> {target} : {association.option}" for target in targets if target in types]
+        lines.append("@enduml")
+        diagrams.append("\n".join(lines))
+    return diagrams
+
+
+def one_process_each(command: List[str], sources: List[str]) -> List[bytes]:
+    images = []
+    for source in sources:
+        result = subprocess.run(command + ["-pipe", "-charset", "utf-8", format_arguments["svg"]],
+                                input=(with_start_end(source) + "\n").encode("utf-8"), capture_output=True, check=True)
+        images.append(result.stdout)
+    return images
+
+
+def timed(run: Callable[[], Any]) -> Any:
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, result
+
+
+def build_project(project: Path, work_dir: Path, name: str, settings: List[str]) -> float:
+    command = [sys.executable, "-m", "sphinx", "-b", "html", "-q", str(project), str(work_dir / name)]
+    for setting in settings:
+        command += ["-D", setting]
+    seconds, _ = timed(lambda: subprocess.run(command, check=True))
+    return seconds
+
+
+def main(plantuml: str, typegroups: int, jobs: int, project: Optional[Path]) -> None:
+    sources = flow_diagrams(MetamodelIndex(needs2records(stream_needs_from_json(fixture_path))))
+    metamodel = synthetic_metamodel(types=typegroups * 5, typegroups=typegroups, options=5, nested_groups=True)
+    sources += flow_diagrams(MetamodelIndex(needs2records(metamodel)))
+    command = plantuml_command(plantuml)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_dir = Path(tmp) / "cache"
+        each_s, expected = timed(lambda: one_process_each(command, sources))
+
+        cold = PlantumlRenderer(plantuml, cache_dir, jobs)
+        cold_s, cold_images = timed(lambda: cold.render_many(sources))
+        cold.close()
+
+        warm = PlantumlRenderer(plantuml, cache_dir, jobs)
+        warm_s, warm_images = timed(lambda: warm.render_many(sources))
+        warm.close()
+
+        if cold_images != expected or warm_images != expected:
+            raise AssertionError("pipe rendering differs from one PlantUML process per diagram")
+        if warm.misses:
+            raise AssertionError(f"{warm.misses} diagrams rendered again with a warm cache")
+
+        print(f"{len(sources)} diagrams, {jobs} pipe processes")
+        print(f"{'one process each':<18}{each_s:>10.3f} s")
+        print(f"{'pipe, cold cache':<18}{cold_s:>10.3f} s  ({each_s / cold_s:.1f}x)")
+        print(f"{'pipe, warm cache':<18}{warm_s:>10.3f} s  ({each_s / warm_s:.1f}x)")
+
+        if project is not None:
+            cache = f"plantuml_cache_dir={Path(tmp) / 'project_cache'}"
+            builds = [("without extension", "stock", ["plantuml_pipe_processes=0"]),
+                      ("cold cache", "cold", [cache]),
+                      ("warm cache", "warm", [cache])]
+            print(f"sphinx-build of {project}")
+            for label, name, settings in builds:
+                print(f"{label:<18}{build_project(project, Path(tmp), name, settings):>10.3f} s")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Compare one PlantUML process per diagram with the cached pipe rendering.")
+      parser.add_argument("--plantuml", help="Command to run PlantUML.", default=f"java -jar {Path(__file__).resolve().parent.parent / '_tools' / 'plantuml.jar'}")
+      parser.add_argument("--typegroups", help="Number of typegroups, one diagram each, of the synthetic metamodel.", default=20, type=int)
+      parser.add_argument("-j", "--jobs", help="Number of PlantUML pipe processes.", default=1, type=int)
+      parser.add_argument("--project", help="Also measure the build time of this sphinx project.", default=None, type=Path)
+      args = parser.parse_args()
+
+      main(args.plantuml, args.typegroups, args.jobs, args.project)
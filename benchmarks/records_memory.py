@@ -0,0 +1,54 @@
+# usage:
+# python -m benchmarks.records_memory --types 5000 --options 500 --typegroups 200
+
+"""
+Compare the retained memory of the metamodel elements as plain sphinx-needs
+dicts and as compact records (metamodel_records) on a synthetic metamodel.
+"""
+
+import argparse
+import json
+import tracemalloc
+
+import benchmarks  # noqa: F401, puts the scripts on the module search path
+from benchmarks.synthetic import synthetic_metamodel
+
+from metamodel_records import needs2records, record_types
+
+
+def retained(build) -> int:
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main(types: int, typegroups: int, options: int, links: int, associations: int) -> None:
+    needs = synthetic_metamodel(types, typegroups, options, links, associations)
+    # the dicts as kept by the reader: only the fields the generators read
+    needs = {k: {f: v for f, v in need.items() if f in record_types[need["type"]].fields}
+             for k, need in needs.items()}
+    # serialize once, so both representations are decoded from fresh strings like from a needs.json
+    text = json.dumps(needs)
+
+    dict_bytes = retained(lambda: json.loads(text))
+    record_bytes = retained(lambda: needs2records(json.loads(text)))
+
+    print(f"elements: {len(needs)}")
+    print(f"dicts:    {dict_bytes / 1024 / 1024:8.2f} MiB")
+    print(f"records:  {record_bytes / 1024 / 1024:8.2f} MiB")
+    print(f"saved:    {100 * (1 - record_bytes / dict_bytes):8.1f} %")
+
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Compare memory of metamodel dicts and records.")
+      parser.add_argument("--types", help="Number of sn_type elements.", default=5000, type=int)
+      parser.add_argument("--typegroups", help="Number of sn_typegroup elements.", default=200, type=int)
+      parser.add_argument("--options", help="Number of sn_option elements.", default=500, type=int)
+      parser.add_argument("--links", help="Number of sn_link elements.", default=20, type=int)
+      parser.add_argument("--associations", help="Number of sn_association elements per type.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.types, args.typegroups, args.options, args.links, args.associations)
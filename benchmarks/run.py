@@ -0,0 +1,170 @@
+# usage:
+# python -m benchmarks.run --types 1000 --filler 20000 --repeat 5 --json ./bench_results.json
+
+"""
+Timing and peak memory benchmarks of the conversion stages on synthetic exports.
+
+Each stage is timed over several repeats (min and median wall time) and run
+once more under tracemalloc for its peak memory. With --json the results are
+written machine-readable, so CI can compare them between runs.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+import benchmarks  # also puts the scripts on the module search path
+from benchmarks.synthetic import export, synthetic_metamodel, synthetic_project
+
+import json2conf
+import validate
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json, is_metamodel_need
+from needs_mmap import LazyNeeds, scan_offsets
+from rst_metamodel import read_rst_metamodel
+
+# the metamodel sources of the repository, read without a Sphinx build
+rst_index_path : Path = benchmarks.scripts_dir.parent / "metamodel" / "index.rst"
+
+# setup() returns the argument of run(), only run() is measured
+Benchmark = Tuple[str, Callable[[], Any], Callable[[Any], Any]]
+
+
+def measure(setup: Callable[[], Any], run: Callable[[Any], Any], repeat: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeat):
+        argument = setup()
+        start = time.perf_counter()
+        run(argument)
+        times.append(time.perf_counter() - start)
+
+    argument = setup()
+    tracemalloc.start()
+    run(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_bytes": peak,
+    }
+
+
+def quiet(function: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Drop the stdout of a stage, printing is not what we measure.
+    """
+    def run(*args: Any) -> Any:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function(*args)
+    return run
+
+
+def stage_benchmarks(work_dir: Path, metamodel_path: Path, project_path: Path) -> List[Benchmark]:
+    # the parallel generation includes starting its worker processes
+    jobs = max(2, os.cpu_count() or 1)
+
+    def load() -> Dict[str, Any]:
+        with open(metamodel_path, 'r') as infile:
+            return json.load(infile)
+
+    def index() -> MetamodelIndex:
+        needs = stream_needs_from_json(metamodel_path, keep=is_metamodel_need, fields=json2conf.metamodel_fields)
+        return MetamodelIndex(needs2records(needs))
+
+    def lazy_index() -> MetamodelIndex:
+        with LazyNeeds.open(metamodel_path) as needs:
+            return MetamodelIndex(needs.subset(lambda need_type: str(need_type).startswith("sn_")))
+
+    def validation() -> Tuple[validate.CompiledSchemas, Dict[str, Any]]:
+        with open(work_dir / "output.schema.json", 'r') as infile:
+            schemas = validate.CompiledSchemas(json.load(infile))
+        needs = stream_needs_from_json(project_path, fields=schemas.fields)
+        return schemas, {k: validate.reduce_need(v) for k, v in needs.items()}
+
+    return [
+        ("json.load", lambda: None, lambda _: load()),
+        ("extract_needs_from_json", load, json2conf.extract_needs_from_json),
+        ("stream_needs_from_json", lambda: None,
+         lambda _: stream_needs_from_json(metamodel_path, keep=is_metamodel_need, fields=json2conf.metamodel_fields)),
+        ("read_rst_metamodel", lambda: None, lambda _: read_rst_metamodel(rst_index_path)),
+        ("scan_offsets", lambda: None, lambda _: scan_offsets(metamodel_path)),
+        # the setup writes the offset index, the run reads it
+        ("LazyNeeds.open", lambda: LazyNeeds.open(metamodel_path).close(), lambda _: lazy_index()),
+        ("json_to_conf", index, quiet(json2conf.json_to_conf)),
+        ("needs2defs", index, json2conf.needs2defs),
+        ("needs2schemas", index, json2conf.needs2schemas),
+        ("json2schema", index, json2conf.json2schema),
+        (f"json2schema_parallel[{jobs}]", index, lambda arg: json2conf.json2schema_parallel(arg, jobs)),
+        ("main", lambda: None, quiet(lambda _: json2conf.main(metamodel_path, work_dir / "output.txt"))),
+        ("validate_needs", validation, lambda arg: validate.validate_needs(*arg)),
+    ]
+
+
+def main(params: Dict[str, int], repeat: int, json_path: Path) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        metamodel = synthetic_metamodel(params["types"], params["typegroups"], params["options"],
+                                        params["links"], params["associations"], params["filler"])
+        metamodel_path = work_dir / "needs.json"
+        with open(metamodel_path, 'w') as outfile:
+            json.dump(export(metamodel, "Metamodel"), outfile)
+        project_path = work_dir / "project.json"
+        with open(project_path, 'w') as outfile:
+            json.dump(export(synthetic_project(metamodel, params["project_needs"]), "Project"), outfile)
+        del metamodel
+
+        # the schema read by validate_needs
+        quiet(json2conf.main)(metamodel_path, work_dir / "output.txt")
+
+        results = []
+        print(f"{'stage':<26}{'min [s]':>10}{'median [s]':>12}{'peak [MiB]':>12}")
+        for name, setup, run in stage_benchmarks(work_dir, metamodel_path, project_path):
+            result = {"name": name, **measure(setup, run, repeat)}
+            results.append(result)
+            print(f"{name:<26}{result['min_s']:>10.4f}{result['median_s']:>12.4f}"
+                  f"{result['peak_bytes'] / 1024 / 1024:>12.2f}")
+
+        sizes = {
+            "metamodel_bytes": metamodel_path.stat().st_size,
+            "project_bytes": project_path.stat().st_size,
+        }
+
+    if json_path is not None:
+        report = {
+            "python": platform.python_version(),
+            "params": params,
+            "repeat": repeat,
+            "sizes": sizes,
+            "results": results,
+        }
+        with open(json_path, 'w') as outfile:
+            json.dump(report, outfile, indent=4)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Benchmark the conversion stages on synthetic exports.")
+      parser.add_argument("--types", help="Number of sn_type elements.", default=500, type=int)
+      parser.add_argument("--typegroups", help="Number of sn_typegroup elements.", default=50, type=int)
+      parser.add_argument("--options", help="Number of sn_option elements.", default=50, type=int)
+      parser.add_argument("--links", help="Number of sn_link elements.", default=10, type=int)
+      parser.add_argument("--associations", help="Number of sn_association elements per type.", default=3, type=int)
+      parser.add_argument("--filler", help="Number of ordinary needs in the metamodel export.", default=10000, type=int)
+      parser.add_argument("--project-needs", help="Number of needs in the project export.", default=10000, type=int)
+      parser.add_argument("--repeat", help="Number of timed runs per stage.", default=5, type=int)
+      parser.add_argument("--json", help="Path of the machine-readable results.", default=None, type=Path)
+      args = parser.parse_args()
+
+      params = dict(types=args.types, typegroups=args.typegroups, options=args.options, links=args.links,
+                    associations=args.associations, filler=args.filler, project_needs=args.project_needs)
+      main(params, args.repeat, args.json)
@@ -0,0 +1,218 @@
+# usage:
+# python -m benchmarks.synthetic --types 1000 --filler 20000 -o ./bench/needs.json --project ./bench/project.json
+
+"""
+Generator of synthetic sphinx-needs exports.
+
+The metamodel export holds sn_type, sn_typegroup, sn_option, sn_link and
+sn_association elements with the back-links sphinx-needs computes, next to
+ordinary filler needs. The project export holds needs of the generated types
+with their options set and links following the associations. Every need
+carries the full set of sphinx-needs fields, so file sizes and parse costs are
+close to real exports. The output only depends on the counts and the seed.
+"""
+
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List
+
+version : str = "1.0.0"
+
+# fields and default values of a need in a sphinx-needs 6 export
+need_defaults : Dict[str, Any] = {
+    'allow_dead_links': '', 'arch': {}, 'avatar': '', 'closed_at': '', 'color': '', 'completion': None,
+    'constraints': [], 'constraints_error': None, 'constraints_passed': True, 'constraints_results': {},
+    'content': '', 'copy': '', 'created_at': '', 'description': '', 'directive': '', 'docname': None,
+    'doctype': '.rst', 'duration': None, 'external_css': 'external_link', 'external_url': None, 'groups': [],
+    'groups_back': [], 'has_dead_links': False, 'has_forbidden_dead_links': False, 'id': '', 'id_prefix': '',
+    'incoming': '', 'is_external': False, 'is_import': False, 'is_modified': False, 'jinja_content': False,
+    'layout': None, 'lineno': None, 'link': [], 'link_back': [], 'links': [], 'links_back': [], 'mandatory': [],
+    'mandatory_back': [], 'max_amount': '', 'max_content_lines': '', 'modifications': 0, 'name': '',
+    'optional': [], 'optional_back': [], 'option': '', 'outgoing': '', 'params': '', 'parent_need': None,
+    'parent_needs': [], 'parent_needs_back': [], 'parts': {}, 'post_content': None, 'post_template': None,
+    'pre_content': None, 'pre_template': None, 'prefix': '', 'query': '', 'schema': '', 'section_name': None,
+    'sections': [], 'service': '', 'signature': None, 'specific': '', 'status': None, 'style': None,
+    'style_end': '', 'style_part': '', 'style_start': '', 'tags': [], 'targets': [], 'targets_back': [],
+    'template': None, 'title': '', 'type': '', 'type_name': '', 'updated_at': '', 'url': '', 'url_postfix': '',
+    'user': '',
+}
+
+option_values : List[str] = ["QM", "ASIL-A", "ASIL-B", "ASIL-C", "ASIL-D"]
+
+
+def new_need(need_id: str, need_type: str, lineno: int, **fields: Any) -> Dict[str, Any]:
+    need = json.loads(json.dumps(need_defaults))
+    need.update(id=need_id, type=need_type, type_name=need_type.upper(), docname="index", lineno=lineno,
+                section_name="Synthetic", sections=["Synthetic"])
+    need.update(fields)
+    return need
+
+
+def add_back_link(needs: Dict[str, Any], source: str, field: str, targets: List[str]) -> None:
+    for target in targets:
+        if target in needs:
+            needs[target][f"{field}_back"].append(source)
+
+
+def synthetic_metamodel(types: int = 100, typegroups: int = 10, options: int = 20, links: int = 5,
+                        associations: int = 3, filler: int = 0, seed: int = 0,
+                        nested_groups: bool = False) -> Dict[str, Any]:
+    """
+    Needs of a synthetic metamodel, with associations per type and filler needs.
+
+    With nested_groups, the typegroups form a binary tree below the first one.
+    """
+    rng = random.Random(seed)
+    needs: Dict[str, Any] = {}
+    lineno = 0
+
+    option_ids = [f"OPTION__option_{i}" for i in range(options)]
+    link_ids = [f"LINK__link_{i}" for i in range(links)]
+    group_ids = [f"GROUP__group_{i}" for i in range(typegroups)]
+    type_ids = [f"TYPE__type_{i}" for i in range(types)]
+
+    for i, option_id in enumerate(option_ids):
+        lineno += 5
+        schema = json.dumps({"type": "string", "enum": option_values})
+        needs[option_id] = new_need(option_id, "sn_option", lineno, title=f"option_{i}", name=f"option_{i}",
+                                    description=f"option {i}", schema=schema,
+                                    content=f"The option_{i} option of the synthetic metamodel.")
+    for i, link_id in enumerate(link_ids):
+        lineno += 5
+        needs[link_id] = new_need(link_id, "sn_link", lineno, title=f"link_{i}", option=f"link_{i}",
+                                  incoming=f"is link_{i} of", outgoing=f"link_{i}", copy="true",
+                                  allow_dead_links="false", style="#000000", style_part="#000000",
+                                  style_start="-", style_end="->",
+                                  content=f"A link_{i} link of the synthetic metamodel.")
+    for i, group_id in enumerate(group_ids):
+        lineno += 5
+        groups = [group_ids[(i - 1) // 2]] if nested_groups and i > 0 else []
+        needs[group_id] = new_need(group_id, "sn_typegroup", lineno, title=f"Group {i}", groups=groups)
+
+    for i, type_id in enumerate(type_ids):
+        lineno += 10
+        mandatory = rng.sample(option_ids, min(len(option_ids), rng.randint(1, 3)))
+        optional = [o for o in rng.sample(option_ids, min(len(option_ids), 3)) if o not in mandatory]
+        groups = [rng.choice(group_ids)] if group_ids and rng.random() < 0.8 else []
+        needs[type_id] = new_need(type_id, "sn_type", lineno, title=f"Type {i}", directive=f"type_{i}",
+                                  prefix=f"TYPE_{i}__", color="#FFA500", style="node",
+                                  mandatory=mandatory, optional=optional, groups=groups)
+
+    if link_ids:
+        for type_id in type_ids:
+            for k in range(associations):
+                association_id = f"{type_id}__{k}"
+                target = rng.choice(type_ids + group_ids)
+                lineno += 3
+                needs[association_id] = new_need(association_id, "sn_association", lineno,
+                                                 title=f"association {k}", link=[rng.choice(link_ids)],
+                                                 targets=[target], parent_need=type_id, parent_needs=[type_id])
+
+    for i in range(filler):
+        lineno += 7
+        need_id = f"FILLER__{i}"
+        needs[need_id] = new_need(need_id, "need", lineno, title=f"Filler {i}",
+                                  content=f"Filler need {i} of the metamodel documentation. " * 4)
+
+    # back-links as computed by sphinx-needs
+    for need_id, need in list(needs.items()):
+        for field in ("mandatory", "optional", "groups", "link", "targets", "parent_needs"):
+            add_back_link(needs, need_id, field, need.get(field, []))
+
+    return needs
+
+
+def synthetic_project(metamodel: Dict[str, Any], needs: int = 1000, seed: int = 0) -> Dict[str, Any]:
+    """
+    Needs of a project using the metamodel, with options set and links along the associations.
+    """
+    rng = random.Random(seed)
+    sn_types = [n for n in metamodel.values() if n["type"] == "sn_type"]
+    if not sn_types:
+        return {}
+
+    project: Dict[str, Any] = {}
+    by_directive: Dict[str, List[str]] = {}
+    for i in range(needs):
+        sn_type = rng.choice(sn_types)
+        need_id = f"{sn_type.get('prefix', '')}{i}"
+        # exported metamodels may lack the reference fields of unused relations
+        fields = {metamodel[o]["name"]: rng.choice(option_values)
+                  for o in sn_type.get("mandatory", []) + sn_type.get("optional", []) if o in metamodel}
+        project[need_id] = new_need(need_id, sn_type["directive"], i, title=f"{sn_type['title']} {i}",
+                                    content=f"Synthetic need {i}.", **fields)
+        project[need_id]["_sn_type"] = sn_type["id"]
+        by_directive.setdefault(sn_type["directive"], []).append(need_id)
+
+    for need in project.values():
+        sn_type = metamodel[need.pop("_sn_type")]
+        for association_id in sn_type.get("parent_needs_back", []):
+            association = metamodel.get(association_id, {})
+            if association.get("type") != "sn_association" or not association.get("link") or not association.get("targets"):
+                continue
+            option = metamodel[association["link"][0]]["option"]
+            target = metamodel[association["targets"][0]]
+            if target["type"] == "sn_type":
+                directives = [target["directive"]]
+            else:
+                directives = [metamodel[t]["directive"] for t in target.get("groups_back", [])
+                              if metamodel[t]["type"] == "sn_type"]
+            candidates = [c for d in directives for c in by_directive.get(d, [])]
+            if candidates:
+                need.setdefault(option, [])
+                need[option] += rng.sample(candidates, min(len(candidates), rng.randint(1, 2)))
+                need["links"] = sorted(set(need["links"]) | set(need[option]))
+
+    return project
+
+
+def export(needs: Dict[str, Any], project: str = "Synthetic") -> Dict[str, Any]:
+    """
+    Wrap needs into the structure of a sphinx-needs needs.json.
+    """
+    return {
+        "created": "2025-01-01T00:00:00",
+        "current_version": version,
+        "project": project,
+        "versions": {
+            version: {
+                "created": "2025-01-01T00:00:00",
+                "creator": {"program": "sphinx_needs", "version": "6.1.0"},
+                "needs": needs,
+                "needs_amount": len(needs),
+            },
+        },
+    }
+
+
+def main(output_path: Path, project_path: Path, types: int, typegroups: int, options: int, links: int,
+         associations: int, filler: int, project_needs: int, seed: int) -> None:
+    metamodel = synthetic_metamodel(types, typegroups, options, links, associations, filler, seed)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w') as outfile:
+        json.dump(export(metamodel, "Metamodel"), outfile)
+
+    if project_path is not None:
+        project = synthetic_project(metamodel, project_needs, seed)
+        project_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(project_path, 'w') as outfile:
+            json.dump(export(project, "Project"), outfile)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Generate synthetic sphinx-needs exports.")
+      parser.add_argument("-o", "--output", help="Path to the metamodel needs.json.", required=True, type=Path)
+      parser.add_argument("--project", help="Path to the project needs.json.", default=None, type=Path)
+      parser.add_argument("--types", help="Number of sn_type elements.", default=100, type=int)
+      parser.add_argument("--typegroups", help="Number of sn_typegroup elements.", default=10, type=int)
+      parser.add_argument("--options", help="Number of sn_option elements.", default=20, type=int)
+      parser.add_argument("--links", help="Number of sn_link elements.", default=5, type=int)
+      parser.add_argument("--associations", help="Number of sn_association elements per type.", default=3, type=int)
+      parser.add_argument("--filler", help="Number of ordinary needs in the metamodel export.", default=0, type=int)
+      parser.add_argument("--project-needs", help="Number of needs in the project export.", default=1000, type=int)
+      parser.add_argument("--seed", help="Seed of the generator.", default=0, type=int)
+      args = parser.parse_args()
+
+      main(args.output, args.project, args.types, args.typegroups, args.options, args.links,
+           args.associations, args.filler, args.project_needs, args.seed)
@@ -0,0 +1,105 @@
+# usage:
+# python -m benchmarks.typegroup_closure --types 2000 --typegroups 200 --repeat 3
+
+"""
+Nested typegroup membership from the precomputed closure against graph walks.
+
+The typegroups of a synthetic metamodel form a binary tree. For every
+typegroup the types below it, and for every type the typegroups containing
+it, are answered once by walking groups_back and groups per query and once by
+building the TypegroupClosure and looking them up. Both must agree, a cycle of
+typegroups must be reported, and the generated schema must accept the needs of
+a project using the nested metamodel.
+"""
+
+import argparse
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.synthetic import synthetic_metamodel, synthetic_project
+
+import validate
+from json2conf import json2schema
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from typegroup_closure import TypegroupClosure
+
+
+def walk_types(index: MetamodelIndex, group_id: str) -> List[str]:
+    found: List[str] = []
+    for member in index[group_id].get("groups_back", []):
+        if index[member]["type"] == "sn_type":
+            found += [member] if member not in found else []
+        else:
+            found += [t for t in walk_types(index, member) if t not in found]
+    return found
+
+
+def walk_groups(index: MetamodelIndex, element_id: str) -> List[str]:
+    found: List[str] = []
+    for group_id in index[element_id].get("groups", []):
+        found += [g for g in [group_id, *walk_groups(index, group_id)] if g not in found]
+    return found
+
+
+def timed(run: Callable[[], Any], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main(types: int, typegroups: int, repeat: int) -> None:
+    metamodel = synthetic_metamodel(types=types, typegroups=typegroups, options=20, nested_groups=True)
+    index = MetamodelIndex(needs2records(metamodel))
+
+    def walks() -> Dict[str, List[str]]:
+        answers = {g["id"]: walk_types(index, g["id"]) for g in index.typegroups}
+        answers |= {t["id"]: walk_groups(index, t["id"]) for t in index.types}
+        return answers
+
+    def lookups() -> Dict[str, List[str]]:
+        closure = TypegroupClosure(index.types, index.typegroups)
+        answers = {g["id"]: closure.types_in(g["id"]) for g in index.typegroups}
+        answers |= {t["id"]: closure.groups_of(t["id"]) for t in index.types}
+        return answers
+
+    expected = walks()
+    if lookups() != expected:
+        raise AssertionError("closure and graph walks disagree")
+    closure = index.typegroup_closure
+
+    cyclic = [{"id": "G1", "groups_back": ["G2"]}, {"id": "G2", "groups_back": ["G3"]}, {"id": "G3", "groups_back": ["G1"]}]
+    try:
+        TypegroupClosure([], cyclic)
+    except ValueError as e:
+        print(e)
+    else:
+        raise AssertionError("cycle of typegroups not reported")
+
+    compiled = validate.CompiledSchemas(json2schema(index))
+    project = synthetic_project(metamodel, needs=2000)
+    needs = {need_id: validate.reduce_need({k: v for k, v in need.items() if k in compiled.fields})
+             for need_id, need in project.items()}
+    messages = validate.validate_needs(compiled, needs)
+    if messages:
+        raise AssertionError(f"{len(messages)} needs of the nested project fail, e.g. {messages[0]}")
+
+    walk_s = timed(walks, repeat)
+    closure_s = timed(lookups, repeat)
+    depth = max(len(closure.groups_of(t["id"])) for t in index.types)
+    print(f"{types} types, {typegroups} typegroups, nesting depth {depth}")
+    print(f"{'graph walks':<16}{walk_s:>10.4f} s")
+    print(f"{'closure':<16}{closure_s:>10.4f} s  ({walk_s / closure_s:.1f}x)")
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Compare the typegroup closure with graph walks per query.")
+      parser.add_argument("--types", help="Number of sn_type elements.", default=2000, type=int)
+      parser.add_argument("--typegroups", help="Number of nested sn_typegroup elements.", default=200, type=int)
+      parser.add_argument("--repeat", help="Number of timed runs.", default=3, type=int)
+      args = parser.parse_args()
+
+      main(args.types, args.typegroups, args.repeat)
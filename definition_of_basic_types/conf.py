@@ -15,6 +15,7 @@ from sphinx_needs import __version__ as sphinx_needs_version
 print ('sphinx-needs version: ' + str(sphinx_needs_version))
 
 sys.path.append(os.path.abspath('.'))
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scripts')))
 
 # -- Project information
 
@@ -36,6 +37,7 @@ on_rtd = os.environ.get("READTHEDOCS") == "True"
 extensions = [
     'sphinx_needs',
     'sphinxcontrib.plantuml',
+    'plantuml_render',
 ]
 
 exclude_patterns = ['_tools/*',]
@@ -64,6 +66,9 @@ print('plantuml path: ' + str(plantuml))
 
 plantuml_output_format = 'svg'
 
+# rendered diagrams are shared by all projects and kept across output folders
+plantuml_cache_dir = os.path.join(os.path.dirname(__file__), "..", ".plantuml_cache")
+
 # --  sphinx-needs configuration
 
 needs_id_required = True
@@ -6,21 +6,14 @@ We read a JSON file containing configuration data only using 'need' types and
 convert it into a sphinx-needs configuration format.
 """
 
-import json
 from pathlib import Path
 import argparse
 from typing import Any, Dict, List
 
-def extract_needs_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Extract 'needs' section from the JSON data.
-    """
-    current_version = data.get("current_version", {})
-    versions = data.get("versions", {})
-    current_version_data = versions.get(current_version, {})
-    needs = current_version_data.get("needs", {})
-    return needs
+from needs_reader import stream_needs_from_json
 
+# fields read by json_to_conf, all others are dropped while reading
+basic_fields : List[str] = ["id", "type", "sn_attributes", "sn_links"]
 
 def types2python(types: List[Any]) -> List[str]:
     """
@@ -91,13 +84,11 @@ def links2python(links: List[str]) -> str:
 
 
 
-def json_to_conf(data: Dict[str, Any]) -> str:
+def json_to_conf(needs: Dict[str, Any]) -> str:
     """
-    Convert a dictionary to a custom configuration format.
+    Convert the needs of the current version to a custom configuration format.
     """
 
-    needs = extract_needs_from_json(data)
-
     types = needs.keys()
     sn_attributes = []
     sn_links = []
@@ -132,12 +123,11 @@ def main(input_path: Path, output_path: Path) -> None:
     """
     Main function to read JSON input and write configuration output.
     """
-    # Read JSON data from input file
-    with open(input_path, 'r') as infile:
-        data = json.load(infile)
+    # Read the needs of the current version from input file
+    needs = stream_needs_from_json(input_path, fields=basic_fields)
 
     # Convert JSON data to custom configuration format
-    conf_data = json_to_conf(data)
+    conf_data = json_to_conf(needs)
 
     # Write the configuration data to output file
     with open(output_path, 'w') as outfile:
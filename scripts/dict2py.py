@@ -1,43 +1,81 @@
-from typing import Any, List
+import io
+from typing import Any, List, TextIO
 
-def pyvalue_to_code(value: Any) -> str:
+# brackets of the sequence types written element by element
+_brackets = {
+    list: ("[", "]"),
+    tuple: ("(", ")"),
+    set: ("{", "}"),
+}
+
+# values written as their repr, without the stack
+_scalars = frozenset([str, int, float, bool, type(None)])
+
+def write_pyvalue(out: TextIO, value: Any) -> None:
     """
-    Wandelt beliebige Python-Werte in Python-Code um.
+    Schreibt den Python-Code eines Werts nach out, ohne Rekursion.
     """
-    if isinstance(value, str):
-        return repr(value) # saubere String-Escapes
-    if isinstance(value, (int, float, bool)) or value is None:
-        return repr(value)
-    if isinstance(value, dict):
-        return dict_to_dictcall(value)
-    if isinstance(value, (list, tuple, set)):
-        open_, close_ = {
-            list: ("[", "]"),
-            tuple: ("(", ")"),
-            set: ("{", "}")
-        }[type(value)]
-        inner = ", ".join(pyvalue_to_code(v) for v in value)
+    if type(value) in _scalars:
+        out.write(repr(value))
+        return
+    # stack entries: (True, code to write) or (False, value to convert)
+    stack = [(False, value)]
+    while stack:
+        is_code, item = stack.pop()
+        if is_code:
+            out.write(item)
+            continue
+        if isinstance(item, dict):
+            # nested dicts are written without include keys
+            out.write("dict()")
+            continue
+        brackets = _brackets.get(type(item))
+        if brackets is None:
+            out.write(repr(item)) # saubere String-Escapes
+            continue
+        open_, close_ = brackets
+        out.write(open_)
         # Sonderfall: 1-Element-Tuple → (x,)
-        if isinstance(value, tuple) and len(value) == 1:
-            inner += ","
-        return f"{open_}{inner}{close_}"
-    # Fallback für unbekannte Typen (z.B. eigene Klassen)
-    return repr(value)
+        stack.append((True, "," + close_ if isinstance(item, tuple) and len(item) == 1 else close_))
+        items = list(item)
+        for k in range(len(items) - 1, -1, -1):
+            stack.append((False, items[k]))
+            if k:
+                stack.append((True, ", "))
 
 
-def dict_to_dictcall(d: dict, include: List[str]=[])-> str:
+def write_dictcall(out: TextIO, d: dict, include: List[str]) -> None:
     """
-    Konvertiert ein dict in einen dict(...)-String.
-    include = Menge/Liste von Keys, die gerneriert werden sollen.
+    Schreibt ein dict als dict(...)-Aufruf nach out, nur mit den Keys aus include.
     """
-    include = (include or [])
     parts = []
-
     for k in include:
         if k not in d:
             continue
-        key_code = k
-        value_code = pyvalue_to_code(d[k])
-        parts.append(f"{key_code}={value_code}")
+        value = d[k]
+        if type(value) in _scalars:
+            parts.append(f"{k}={value!r}")
+        else:
+            buffer = io.StringIO()
+            write_pyvalue(buffer, value)
+            parts.append(f"{k}={buffer.getvalue()}")
+    out.write(f"dict({', '.join(parts)})")
+
 
-    return f"dict({', '.join(parts)})"
+def pyvalue_to_code(value: Any) -> str:
+    """
+    Wandelt beliebige Python-Werte in Python-Code um.
+    """
+    out = io.StringIO()
+    write_pyvalue(out, value)
+    return out.getvalue()
+
+
+def dict_to_dictcall(d: dict, include: List[str]=[])-> str:
+    """
+    Konvertiert ein dict in einen dict(...)-String.
+    include = Menge/Liste von Keys, die gerneriert werden sollen.
+    """
+    out = io.StringIO()
+    write_dictcall(out, d, include or [])
+    return out.getvalue()
@@ -0,0 +1,79 @@
+"""
+TOML text of the generated config values, e.g. for an ubproject.toml read by
+sphinx-needs with needs_from_toml.
+
+Only the value types of the config dicts are supported: strings, booleans,
+numbers, lists and nested dicts (written as inline tables). TOML has no null,
+keys with the value None are left out.
+"""
+
+import io
+import math
+import re
+from typing import Any, Dict, List, TextIO
+
+_bare_key_re = re.compile(r"^[A-Za-z0-9_-]+$")
+
+_escapes = {'"': '\\"', "\\": "\\\\", "\b": "\\b", "\t": "\\t", "\n": "\\n", "\f": "\\f", "\r": "\\r"}
+
+
+def toml_key(key: str) -> str:
+    return key if _bare_key_re.match(key) else toml_string(key)
+
+
+def toml_string(text: str) -> str:
+    out = []
+    for c in text:
+        if c in _escapes:
+            out.append(_escapes[c])
+        elif c < " " or c == "\x7f":
+            out.append(f"\\u{ord(c):04x}")
+        else:
+            out.append(c)
+    return '"' + "".join(out) + '"'
+
+
+def toml_value(value: Any) -> str:
+    """
+    TOML text of a single value.
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, str):
+        return toml_string(value)
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "nan"
+        if math.isinf(value):
+            return "inf" if value > 0 else "-inf"
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(toml_value(v) for v in value if v is not None) + "]"
+    if isinstance(value, dict):
+        items = [f"{toml_key(str(k))} = {toml_value(v)}" for k, v in value.items() if v is not None]
+        return "{" + ", ".join(items) + "}" if items else "{}"
+    raise ValueError(f"No TOML representation for {type(value).__name__} values.")
+
+
+def write_tables(out: TextIO, table: str, values: Dict[str, List[Dict[str, Any]]]) -> None:
+    """
+    Write lists of dicts as arrays of tables below the given table, empty lists as empty arrays.
+    """
+    out.write(f"[{table}]\n")
+    for name, elements in values.items():
+        if not elements:
+            out.write(f"{toml_key(name)} = []\n")
+    for name, elements in values.items():
+        for element in elements:
+            out.write(f"\n[[{table}.{toml_key(name)}]]\n")
+            for key, value in element.items():
+                if value is not None:
+                    out.write(f"{toml_key(str(key))} = {toml_value(value)}\n")
+
+
+def tables_to_toml(table: str, values: Dict[str, List[Dict[str, Any]]]) -> str:
+    out = io.StringIO()
+    write_tables(out, table, values)
+    return out.getvalue()
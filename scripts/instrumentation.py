@@ -0,0 +1,85 @@
+"""
+Stage-level instrumentation of the conversion.
+
+A Profiler records named spans around the stages of a run (load, extraction,
+conf emission, $defs and schema generation, write). Each span holds its wall
+time, element counts and, if enabled, the tracemalloc peak reached inside the
+span. The spans are reported as a table for humans or as JSON for tools.
+"""
+
+import contextlib
+import time
+import tracemalloc
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Span:
+    """
+    Measurements of one stage.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.wall_s = 0.0
+        self.counts: Dict[str, int] = {}
+        self.peak_bytes: Optional[int] = None
+
+    def count(self, key: str, value: int) -> None:
+        self.counts[key] = self.counts.get(key, 0) + value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "wall_s": self.wall_s,
+            "counts": self.counts,
+            "peak_bytes": self.peak_bytes,
+        }
+
+
+class Profiler:
+    """
+    Collects the spans of a run.
+    """
+
+    def __init__(self, trace_memory: bool = False) -> None:
+        self.trace_memory = trace_memory
+        self.spans: List[Span] = []
+
+    @contextlib.contextmanager
+    def span(self, name: str) -> Iterator[Span]:
+        span = Span(name)
+        self.spans.append(span)
+
+        started_tracing = False
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                started_tracing = True
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+
+        start = time.perf_counter()
+        try:
+            yield span
+        finally:
+            span.wall_s = time.perf_counter() - start
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                span.peak_bytes = max(0, peak - base)
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def table(self) -> str:
+        lines = [f"{'stage':<16}{'wall [s]':>10}{'peak [MiB]':>12}  counts"]
+        for span in self.spans:
+            peak = f"{span.peak_bytes / 1024 / 1024:>12.2f}" if span.peak_bytes is not None else f"{'-':>12}"
+            counts = ", ".join(f"{k}={v}" for k, v in span.counts.items())
+            lines.append(f"{span.name:<16}{span.wall_s:>10.4f}{peak}  {counts}")
+        lines.append(f"{'total':<16}{sum(s.wall_s for s in self.spans):>10.4f}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "total_wall_s": sum(s.wall_s for s in self.spans),
+            "spans": [s.to_dict() for s in self.spans],
+        }
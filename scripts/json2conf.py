@@ -1,165 +1,241 @@
 # usage:
 # python ./scripts/json2conf.py -i ./use_datamodel/needs.json -o ./use_datamodel/output2.txt
+# python ./scripts/json2conf.py --batch "./exports/*/needs.json" --jobs 8
+# python ./scripts/json2conf.py -i ./use_datamodel/needs.json -o ./use_datamodel/output2.txt --versions
+# python ./scripts/json2conf.py -i ./metamodel/index.rst -o ./use_datamodel/output2.txt
 
 """
 We read a JSON file containing configuration data following the in basic defined
 metamodel and convert it into a sphinx-needs configuration format.
 """
 
+import contextlib
+import glob
+import hashlib
+import io
 import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import argparse
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
 
 from sphinx_needs.config import NeedType, NeedExtraOption, LinkOptionsType
 
 from get_class_variables import typed_dict_fields
 
-from dict2py import dict_to_dictcall, pyvalue_to_code
+from dict2py import write_dictcall
 
-intendation : str = f"    "
+from metamodel_index import MetamodelIndex
 
+from metamodel_records import needs2records
 
-def extract_needs_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Extract 'needs' section from the JSON data.
-    """
-    current_version = data.get("current_version", {})
-    versions = data.get("versions", {})
-    current_version_data = versions.get(current_version, {})
-    needs = current_version_data.get("needs", {})
-    return needs
+from schema_cache import SchemaCache
 
+from output_writer import write_if_changed, write_bytes_if_changed
 
-def types2python(types: List[Dict[str, Any]]) -> List[str]:
-    """
-    Convert a list of types to a Python-compatible string representation.
-    """
+from needs_reader import extract_needs_from_json  # noqa: F401, re-exported for the benchmarks
+from needs_reader import stream_needs_from_json, stream_versions_from_json, is_metamodel_need
 
-    inlude_keys: str = list(typed_dict_fields(NeedType).keys())
-    #print("NeedType: " + str(inlude_keys))
+from instrumentation import Profiler
 
-    dicts_data = []
-    for t in types:
-        t_str = intendation
-        if "id" in t and len(t["id"]) >= 1 and t["id"][0] == '#':
-            t_str += f'# '
-        t_str += dict_to_dictcall(t, include=inlude_keys) + ",\n"
-        dicts_data.append(t_str)
+from needs_mmap import LazyNeeds
 
-    return_string = "needs_types = [\n" + "".join(dicts_data) + "]\n"
+from metamodel_snapshot import dump_snapshot, snapshot_suffix, source_hash
 
-    #print("Generated needs_types:\n" + return_string)
+from metamodel_versions import share_records, versions_delta
 
-    needs_types = [
-        dict(directive="need", title="Need", prefix="N_", color="#9856a5", style="node")
-    ]
+from rst_metamodel import read_rst_metamodel
+from schema_dedup import dedup_schema
+from schema_flatten import flatten_schema
 
-    return return_string
+import json_io
 
+from output_writer import ChangedFile, write_chunks_if_changed
 
-def attributes2python(attributes: List[Dict[str, Any]]) -> str:
+intendation : str = f"    "
+
+# 0: no progress output, 1: element listings and generated blocks, 2: every need of the export
+verbosity : int = 0
+
+def log(level: int, text: str) -> None:
     """
-    Convert a list of attributes to a Python-compatible string representation.
+    Print text if the verbosity is at least level.
     """
+    if verbosity >= level:
+        print(text)
 
-    inlude_keys: str = list(typed_dict_fields(NeedExtraOption).keys())
-    #print("NeedExtraOption: " + str(inlude_keys))
+# fields of a metamodel element read by the generators, all others are dropped while reading
+metamodel_fields : List[str] = [
+    "id", "type",
+    "mandatory", "optional", "groups", "groups_back", "parent_needs_back",
+    "link", "targets",
+    *typed_dict_fields(NeedType),
+    *typed_dict_fields(NeedExtraOption),
+    *typed_dict_fields(LinkOptionsType),
+]
 
-    dicts_data = []
 
-    for a in attributes:
-        a_str = intendation
-        if "id" in a and len(a["id"]) >= 1 and a["id"][0] == '#':
-            a_str += f'# '
-        a_str += dict_to_dictcall(a, include=inlude_keys) + ",\n"
-        dicts_data.append(a_str)
+# keys of the generated dicts per sphinx-needs TypedDict, projected once
+need_type_keys : List[str] = list(typed_dict_fields(NeedType).keys())
+extra_option_keys : List[str] = list(typed_dict_fields(NeedExtraOption).keys())
+link_option_keys : List[str] = list(typed_dict_fields(LinkOptionsType).keys())
 
-    needs_extra_options = [
-        "my_extra_option",
-    ]
 
-    return_string = "needs_extra_options = [\n" + "".join(dicts_data) + "]\n"
+def write_elements(out: TextIO, name: str, elements: List[Dict[str, Any]], include_keys: List[str]) -> None:
+    """
+    Write a config list of dict(...) calls, elements with an id starting with '#' commented out.
+    """
+    out.write(name + " = [\n")
+    for e in elements:
+        out.write(intendation)
+        if "id" in e and len(e["id"]) >= 1 and e["id"][0] == '#':
+            out.write('# ')
+        write_dictcall(out, e, include_keys)
+        out.write(",\n")
+    out.write("]\n")
 
-    #print("Generated needs_extra_options:\n" + return_string)
 
-    return return_string
+def types2python(types: List[Dict[str, Any]]) -> str:
+    """
+    Convert a list of types to a Python-compatible string representation.
+    """
+    out = io.StringIO()
+    write_elements(out, "needs_types", types, need_type_keys)
+    return out.getvalue()
+
+
+def attributes2python(attributes: List[Dict[str, Any]]) -> str:
+    """
+    Convert a list of attributes to a Python-compatible string representation.
+    """
+    out = io.StringIO()
+    write_elements(out, "needs_extra_options", attributes, extra_option_keys)
+    return out.getvalue()
 
 
 def links2python(links: List[Dict[str, Any]]) -> str:
     """
     Convert a list of links to a Python-compatible string representation.
     """
+    log(1, "LinkOptionsType: " + str(link_option_keys))
 
-    inlude_keys: str = list(typed_dict_fields(LinkOptionsType).keys())
-    print("LinkOptionsType: " + str(inlude_keys))
-
-    dicts_data = []
+    out = io.StringIO()
+    write_elements(out, "needs_extra_links", links, link_option_keys)
+    return_string = out.getvalue()
 
-    for l in links:
-        l_str = intendation
-        if "id" in l and len(l["id"]) >= 1 and l["id"][0] == '#':
-            l_str += f'# '
-        l_str += dict_to_dictcall(l, include=inlude_keys) + ",\n"
-        dicts_data.append(l_str)
+    log(1, "Generated needs_extra_links:\n" + return_string)
 
-    needs_extra_links = [
-        dict(option = "checks", incoming = "is checked by", outgoing ="checks",),
-    ]
+    return return_string
 
-    return_string =  "needs_extra_links = [\n"
-    return_string += "".join(dicts_data)
-    return_string += "]\n"
 
-    print("Generated needs_extra_links:\n" + return_string)
+def write_conf(out: TextIO, index: MetamodelIndex) -> None:
+    """
+    Write the configuration of the indexed metamodel to a text stream.
+    """
 
-    return return_string
+    if verbosity >= 2:
+        for need in index.needs.values():
+            print(need["id"] + ": " + need["type"])
 
+    log(1, "---- Filtering needs by type ----")
 
+    sn_types = index.types
+    if verbosity >= 1:
+        for value in sn_types:
+            print(value["id"] + " : " + value["type"])
 
-def json_to_conf(data: Dict[str, Any]) -> str:
-    """
-    Convert a dictionary to a custom configuration format.
-    """
+    log(1, "---- Filtering needs by option ----")
 
-    needs = extract_needs_from_json(data)
+    sn_attributes = index.options
+    if verbosity >= 1:
+        for value in sn_attributes:
+            print(value["id"] + " : " + value["type"])
 
-    types = needs.keys()
-    sn_attributes = []
-    sn_links = []
+    log(1, "---- Filtering needs by link ----")
 
-    for need in needs.values():
-        print(need["id"] + ": " + need["type"])
+    sn_links = index.links
+    if verbosity >= 1:
+        for value in sn_links:
+            print(value["id"] + " : " + value["type"])
 
-    print("---- Filtering needs by type ----")
+    write_elements(out, "needs_types", sn_types, need_type_keys)
+    out.write("\n")
 
-    # filter list of needs dict by type == "sn_type"
-    sn_types = list(filter(lambda need: need.get("type") == "sn_type", needs.values()))
-    for value in sn_types:
-        print(value["id"] + " : " + value["type"])
+    write_elements(out, "needs_extra_options", sn_attributes, extra_option_keys)
+    out.write("\n")
 
-    print("---- Filtering needs by option ----")
+    if verbosity >= 1:
+        # the generated links are also printed
+        out.write(links2python(sn_links))
+    else:
+        write_elements(out, "needs_extra_links", sn_links, link_option_keys)
+    out.write("\n")
 
-    sn_attributes = list(filter(lambda need: need.get("type") == "sn_option", needs.values()))
-    for value in sn_attributes:
-        print(value["id"] + " : " + value["type"])
 
-    print("---- Filtering needs by link ----")
+def json_to_conf(index: MetamodelIndex) -> str:
+    """
+    Convert the indexed metamodel to a custom configuration format.
+    """
+    out = io.StringIO()
+    write_conf(out, index)
+    return out.getvalue()
 
-    sn_links = list(filter(lambda need: need.get("type") == "sn_link", needs.values()))
-    for value in sn_links:
-        print(value["id"] + " : " + value["type"])
+def bool_fields(typed_dict: type) -> List[str]:
+    """
+    Keys of a sphinx-needs TypedDict annotated as bool, also with postponed annotations.
+    """
+    fields = []
+    for key, annotation in typed_dict_fields(typed_dict).items():
+        name = getattr(annotation, "__forward_arg__", getattr(annotation, "__name__", str(annotation)))
+        if "bool" in name:
+            fields.append(key)
+    return fields
+
+def config_value(key: str, value: Any, bools: List[str]) -> Any:
+    """
+    Convert a text value of the export to the value sphinx-needs expects.
+    None for values left unset: empty strings and None.
+    """
+    if value is None or value == "":
+        return None
+    if key == "schema" and isinstance(value, str):
+        return json.loads(value)
+    if key in bools and value in ("true", "false"):
+        return value == "true"
+    return value
+
+def elements2config(elements: List[Dict[str, Any]], typed_dict: type) -> List[Dict[str, Any]]:
+    """
+    Convert elements to the config dicts the generated conf text describes,
+    with the values converted for sphinx-needs (see config_value).
+    Elements with an id starting with '#' are commented out there and skipped here.
+    """
+    inlude_keys = list(typed_dict_fields(typed_dict).keys())
+    bools = bool_fields(typed_dict)
 
-    conf_lines = types2python(sn_types)
-    conf_lines += "\n"
+    config = []
+    for e in elements:
+        if "id" in e and len(e["id"]) >= 1 and e["id"][0] == '#':
+            continue
+        values = {k: config_value(k, e[k], bools) for k in inlude_keys if k in e}
+        config.append({k: v for k, v in values.items() if v is not None})
 
-    conf_lines += attributes2python(sn_attributes)
-    conf_lines += "\n"
+    return config
 
-    conf_lines += links2python(sn_links)
-    conf_lines += "\n"
 
-    return conf_lines
+def index2config(index: MetamodelIndex) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Convert the indexed metamodel to the sphinx-needs config values.
+    """
+    return {
+        "needs_types": elements2config(index.types, NeedType),
+        "needs_extra_options": elements2config(index.options, NeedExtraOption),
+        "needs_extra_links": elements2config(index.links, LinkOptionsType),
+    }
 
 selector_prefix : str = 'select_'
 
@@ -187,25 +263,25 @@ def get_schema_name(need: Dict[str, Any]) -> str:
     schema_name = schema_prefix + str(need["id"])
     return schema_name
 
-def needs2defs_attributes(needs: Dict[str, Any]) -> Dict[str, Any]:
+def needs2defs_attribute(attribute: Dict[str, Any]) -> Dict[str, Any]:
+    dict_defs = {}
+    if "schema" not in attribute or not attribute["schema"]:
+        attribute_schema = { "type": "string" }
+    else:
+        attribute_schema = json.loads(attribute["schema"])
+    dict_defs[attribute["id"]] = attribute_schema
+
+    return dict_defs
+
+def needs2defs_attributes(index: MetamodelIndex) -> Dict[str, Any]:
     dict_defs = {}
-    sn_attributes = list(filter(lambda need: need.get("type") == "sn_option", needs.values()))
     # add each sn_attribute to schema $defs
-    for attribute in sn_attributes:
-        if "schema" not in attribute or not attribute["schema"]:
-            attribute_schema = { "type": "string" }
-        else:
-            attribute_schema = json.loads(attribute["schema"])
-        str_attribute = {
-            "properties": {
-                f"{attribute['name']}": attribute_schema
-            }
-        }
-        dict_defs[attribute["id"]] = attribute_schema
+    for attribute in index.options:
+        dict_defs |= needs2defs_attribute(attribute)
 
     return dict_defs
 
-def needs2defs_types_typegroups(needs: Dict[str, Any], need: Dict[str, Any]) -> Dict[str, Any]:
+def needs2defs_types_typegroups(needs: MetamodelIndex, need: Dict[str, Any]) -> Dict[str, Any]:
 
     if True:
 
@@ -224,18 +300,11 @@ def needs2defs_types_typegroups(needs: Dict[str, Any], need: Dict[str, Any]) ->
         added_a_link = False
         # links from associations
         for child in need.get("parent_needs_back", []):
-            if child not in needs:
-                continue
-            if not "sn_association" == needs[child]["type"]:
-                continue
-            association_need = needs[child]
-            link = association_need.get("link", None)
-            if not link or len(link) != 1 or link[0] not in needs:
-                # todo: warn about missing link
+            association = needs.association(child)
+            if association is None:
                 continue
-            link_need = needs[link[0]]
 
-            properties[link_need["option"]] = {
+            properties[association.option] = {
                 "type": "array",
                 "items": {"type": "string"}
             }
@@ -253,48 +322,57 @@ def needs2defs_types_typegroups(needs: Dict[str, Any], need: Dict[str, Any]) ->
     }
     return dict_defs
 
-def needs2defs_types(needs: Dict[str, Any]) -> Dict[str, Any]:
+def needs2defs_type(needs: MetamodelIndex, current_type: Dict[str, Any]) -> Dict[str, Any]:
     dict_defs = {}
-    sn_types = list(filter(lambda need: need.get("type") == "sn_type", needs.values()))
-    # add each sn_type to schema $defs
-    for current_type in sn_types:
-        # - def selector
-        str_type = {
-            "properties": {
-                "type": { "const": f"{current_type['directive']}" },
-            },
-        }
-        dict_defs[get_selector(current_type)] = str_type
+    # - def selector
+    str_type = {
+        "properties": {
+            "type": { "const": f"{current_type['directive']}" },
+        },
+    }
+    dict_defs[get_selector(current_type)] = str_type
 
-        # - def type with extended properties
-        dict_defs[current_type["id"]] = needs2defs_types_typegroups(needs, current_type)
+    # - def type with extended properties
+    dict_defs[current_type["id"]] = needs2defs_types_typegroups(needs, current_type)
 
     return dict_defs
 
-def needs2defs_typegroups(needs: Dict[str, Any]) -> Dict[str, Any]:
+def needs2defs_types(needs: MetamodelIndex) -> Dict[str, Any]:
     dict_defs = {}
+    # add each sn_type to schema $defs
+    for current_type in needs.types:
+        dict_defs |= needs2defs_type(needs, current_type)
 
-    sn_typegroups = list(filter(lambda need: need.get("type") == "sn_typegroup", needs.values()))
-    # add each sn_typegroup to schema $defs
-    for typegroup in sn_typegroups:
-        # - def selector
-        list_anyOf = []
-        for type in typegroup.get("groups_back", []):
-            if type not in needs:
-                continue
-            list_anyOf.append({ "$ref": f"#/$defs/{get_selector(needs[type])}" })
+    return dict_defs
 
-        str_typegroup = {
-            "anyOf": list_anyOf
-        }
-        dict_defs[get_selector(typegroup)] = str_typegroup
+def needs2defs_typegroup(needs: MetamodelIndex, typegroup: Dict[str, Any]) -> Dict[str, Any]:
+    dict_defs = {}
+    # - def selector
+    # the types of nested typegroups select the group as well
+    list_anyOf = []
+    for type in needs.typegroup_closure.types_in(typegroup["id"]):
+        list_anyOf.append({ "$ref": f"#/$defs/{get_selector(needs[type])}" })
+
+    str_typegroup = {
+        "anyOf": list_anyOf
+    }
+    dict_defs[get_selector(typegroup)] = str_typegroup
+
+    # - def typegroup with extended properties
+    dict_defs[typegroup["id"]] = needs2defs_types_typegroups(needs, typegroup)
+
+    return dict_defs
 
-        # - def typegroup with extended properties
-        dict_defs[typegroup["id"]] = needs2defs_types_typegroups(needs, typegroup)
+def needs2defs_typegroups(needs: MetamodelIndex) -> Dict[str, Any]:
+    dict_defs = {}
+
+    # add each sn_typegroup to schema $defs
+    for typegroup in needs.typegroups:
+        dict_defs |= needs2defs_typegroup(needs, typegroup)
 
     return dict_defs
 
-def needs2defs(needs: Dict[str, Any]) -> Dict[str, Any]:
+def needs2defs(needs: MetamodelIndex) -> Dict[str, Any]:
     """
     Convert needs to schema definitions.
     """
@@ -308,110 +386,93 @@ def needs2defs(needs: Dict[str, Any]) -> Dict[str, Any]:
 
     return dict_defs
 
-def needs2schemas_types(needs: Dict[str, Any]) -> List[Dict[str, Any]]:
+def needs2schemas_type(needs: MetamodelIndex, current_type: Dict[str, Any]) -> List[Dict[str, Any]]:
 
     list_schemas = []
 
-    sn_types = list(filter(lambda need: need.get("type") == "sn_type", needs.values()))
-    for current_type in sn_types:
-        selector = get_selector(current_type)
+    selector = get_selector(current_type)
 
-        # for the local validation, we do need the current type and all its groups
-        allOf_list = [
-            {
-                "$ref": f"#/$defs/{current_type['id']}"
+    # for the local validation, we do need the current type and all its groups,
+    # including the groups containing its groups
+    allOf_list = [
+        {
+            "$ref": f"#/$defs/{current_type['id']}"
+        }
+    ]
+    for group in needs.typegroup_closure.groups_of(current_type["id"]):
+        new_ref = { "$ref": f"#/$defs/{group}" }
+        allOf_list.append(new_ref)
+
+    validate_network = {}
+    additional_added_links = []
+    # for the network validation, we need to evaluate the associations
+    for child in current_type.get("parent_needs_back", []):
+        association = needs.association(child)
+        if association is None or association.targets is None:
+            continue
+
+        local_list_of_types = {
+            "properties": {
+                "type": {
+                        "type": "string",
+                        "enum": list(association.targets)
+                }
             }
-        ]
-        for group in current_type.get("groups", []):
-            new_ref = { "$ref": f"#/$defs/{group}" }
-            allOf_list.append(new_ref)
-
-        validate_network = {}
-        additional_added_links = []
-        # for the network validation, we need to evaluate the associations
-        for child in current_type.get("parent_needs_back", []):
-            if child not in needs:
-                continue
-            if not "sn_association" == needs[child]["type"]:
-                continue
-            association_need = needs[child]
-            link = association_need.get("link", None)
-            if not link or len(link) != 1 or link[0] not in needs:
-                continue
-
-            link_need = needs[link[0]]
+        }
 
-            targets = association_need.get("targets", [])
-            if len(targets) == 0 or targets[0] not in needs:
-                continue
 
-            list_targets = []
-            for t in targets:
-                if t not in needs:
-                    continue
-                target_need = needs[t]
-                if "type" in target_need and target_need["type"] == "sn_type":
-                    list_targets.append(target_need["directive"])
-                elif "type" in target_need and target_need["type"] == "sn_typegroup":
-                    for group_type in target_need.get("groups_back", []):
-                        if group_type not in needs:
-                            continue
-                        group_type_need = needs[group_type]
-                        list_targets.append(group_type_need["directive"])
-
-            local_list_of_types = {
-                "properties": {
-                    "type": {
-                            "type": "string",
-                            "enum": list_targets
-                    }
-                }
-            }
+        my_dict = {
+                "contains": {
+                    "local": local_list_of_types
+                },
+                "minContains": 0
+        }
 
+        if association.option not in validate_network:
+            validate_network[association.option] = my_dict
+        else:
+            additional_added_links.append((association.option, my_dict))
+
+
+    schema_entry = {
+        "id": get_schema_name(current_type),
+        "select": {
+            "$ref": f"#/$defs/{selector}"
+        },
+        "validate": {
+            "local": {
+                "allOf": allOf_list,
+                "unevaluatedProperties": False
+            },
+            "network": validate_network
+        }
+    }
+    if not schema_entry["validate"]["network"]: # no network validations
+        del schema_entry["validate"]["network"]
+    list_schemas.append(schema_entry)
+
+    if additional_added_links:
+        for add_link in additional_added_links:
+            new_schema_entry = schema_entry.copy()
+            new_schema_entry["id"] = f"[{schema_entry['id']}]_with_additional_[{add_link[0]}]"
+            # remove previous local validation to avoid duplication
+            new_schema_entry["validate"] = {}
+            new_schema_entry["validate"]["network"] = {}
+            new_schema_entry["validate"]["network"][add_link[0]] = add_link[1]
+            list_schemas.append(new_schema_entry)
 
-            my_dict = {
-                    "contains": {
-                        "local": local_list_of_types
-                    },
-                    "minContains": 0
-            }
+    return list_schemas
 
-            if link_need["option"] not in validate_network:
-                validate_network[link_need["option"]] = my_dict
-            else:
-                additional_added_links.append((link_need["option"], my_dict))
+def needs2schemas_types(needs: MetamodelIndex) -> List[Dict[str, Any]]:
 
+    list_schemas = []
 
-        schema_entry = {
-            "id": get_schema_name(current_type),
-            "select": {
-                "$ref": f"#/$defs/{selector}"
-            },
-            "validate": {
-                "local": {
-                    "allOf": allOf_list,
-                    "unevaluatedProperties": False
-                },
-                "network": validate_network
-            }
-        }
-        if not schema_entry["validate"]["network"]: # no network validations
-            del schema_entry["validate"]["network"]
-        list_schemas.append(schema_entry)
-
-        if additional_added_links:
-            for add_link in additional_added_links:
-                new_schema_entry = schema_entry.copy()
-                new_schema_entry["id"] = f"[{schema_entry['id']}]_with_additional_[{add_link[0]}]"
-                # remove previous local validation to avoid duplication
-                new_schema_entry["validate"] = {}
-                new_schema_entry["validate"]["network"] = {}
-                new_schema_entry["validate"]["network"][add_link[0]] = add_link[1]
-                list_schemas.append(new_schema_entry)
+    for current_type in needs.types:
+        list_schemas += needs2schemas_type(needs, current_type)
 
     return list_schemas
 
-def needs2schemas(needs: Dict[str, Any]) -> List[Dict[str, Any]]:
+def needs2schemas(needs: MetamodelIndex) -> List[Dict[str, Any]]:
 
     list_schemas = []
 
@@ -419,50 +480,431 @@ def needs2schemas(needs: Dict[str, Any]) -> List[Dict[str, Any]]:
 
     return list_schemas
 
-def json2schema(data: Dict[str, Any]) -> Dict[str, Any]:
+def needs2fragment(needs: MetamodelIndex, need: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Generate the $defs and schema entries contributed by a single element.
     """
-    Convert JSON data to a schema representation.
+    fragment: Dict[str, Any] = {
+        "$defs": {},
+        "schemas": [],
+    }
+    if need["type"] == "sn_option":
+        fragment["$defs"] = needs2defs_attribute(need)
+    elif need["type"] == "sn_type":
+        fragment["$defs"] = needs2defs_type(needs, need)
+        fragment["schemas"] = needs2schemas_type(needs, need)
+    elif need["type"] == "sn_typegroup":
+        fragment["$defs"] = needs2defs_typegroup(needs, need)
+    return fragment
+
+def json2schema(index: MetamodelIndex, cache: Optional[SchemaCache] = None) -> Dict[str, Any]:
     """
-    needs = extract_needs_from_json(data)
+    Convert the indexed metamodel to a schema representation.
 
-    schema: Dict[str, Any] = {
-        "$defs": needs2defs(needs),
-        "schemas": needs2schemas(needs),
+    With a cache, only the fragments of elements whose inputs changed are generated.
+    """
+    if cache is None:
+        schema: Dict[str, Any] = {
+            "$defs": needs2defs(index),
+            "schemas": needs2schemas(index),
+        }
+        return schema
+
+    schema = {
+        "$defs": {},
+        "schemas": [],
     }
+    # same order as needs2defs: options, types, typegroups
+    for need in [*index.options, *index.types, *index.typegroups]:
+        key = cache.fragment_key(index, need)
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = needs2fragment(index, need)
+            cache.put(key, fragment)
+        schema["$defs"] |= fragment["$defs"]
+        schema["schemas"] += fragment["schemas"]
 
     return schema
 
 
-def main(input_path: Path, output_path: Path) -> None:
+# element types with schema fragments, in the order of needs2defs
+fragment_element_types : List[str] = ["sn_option", "sn_type", "sn_typegroup"]
+
+# index of a worker of the parallel schema generation
+_worker_index : Optional[MetamodelIndex] = None
+
+def _init_schema_worker(index: MetamodelIndex) -> None:
+    global _worker_index
+    _worker_index = index
+
+def _schema_chunk(task: Tuple[str, int, int]) -> Dict[str, Any]:
+    element_type, start, stop = task
+    chunk: Dict[str, Any] = {
+        "$defs": {},
+        "schemas": [],
+    }
+    for need in _worker_index.buckets[element_type][start:stop]:
+        fragment = needs2fragment(_worker_index, need)
+        chunk["$defs"] |= fragment["$defs"]
+        chunk["schemas"] += fragment["schemas"]
+    return chunk
+
+def submit_schema_chunks(index: MetamodelIndex, jobs: int,
+                         threads: bool = False) -> Tuple[Executor, Iterator[Dict[str, Any]]]:
+    """
+    Start generating the schema on a pool, sharded by element type and chunks of elements.
+
+    Returns the pool and the chunk results in serial order, see merge_schema_chunks.
+    """
+    tasks = []
+    for element_type in fragment_element_types:
+        count = len(index.buckets[element_type])
+        # a few chunks per worker balance types with many and with few associations
+        size = max(1, -(-count // (jobs * 4)))
+        tasks += [(element_type, start, min(start + size, count)) for start in range(0, count, size)]
+
+    if threads:
+        _init_schema_worker(index)
+        pool: Executor = ThreadPoolExecutor(max_workers=jobs)
+    else:
+        # each worker receives the index once, not with every chunk
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=_init_schema_worker, initargs=(index,))
+    return pool, pool.map(_schema_chunk, tasks)
+
+def merge_schema_chunks(chunks: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge chunk results in serial order, the result equals json2schema(index).
+    """
+    schema: Dict[str, Any] = {
+        "$defs": {},
+        "schemas": [],
+    }
+    for chunk in chunks:
+        schema["$defs"] |= chunk["$defs"]
+        schema["schemas"] += chunk["schemas"]
+    return schema
+
+def json2schema_parallel(index: MetamodelIndex, jobs: int, threads: bool = False) -> Dict[str, Any]:
+    """
+    Convert the indexed metamodel to a schema representation on a pool of jobs workers.
+    """
+    pool, chunks = submit_schema_chunks(index, jobs, threads)
+    with pool:
+        return merge_schema_chunks(chunks)
+
+# modules the schema fragments are generated with, besides this one
+generator_modules : List[str] = [
+    "metamodel_index", "typegroup_closure", "metamodel_records", "schema_cache",
+    "get_class_variables", "sphinx_needs.config",
+]
+
+# hash of the generator, changes invalidate cached schema fragments
+generator_hash : str = hashlib.sha256(b"".join(
+    Path(path).read_bytes() for path in [__file__, *(sys.modules[m].__file__ for m in generator_modules)]
+)).hexdigest()
+
+def generate(index: MetamodelIndex, input_path: Path, output_path: Path, profiler: Profiler,
+             compact: bool = False, snapshot: bool = False, cache: Optional[SchemaCache] = None,
+             memo: Optional[json_io.EntryMemo] = None, jobs: Optional[int] = None,
+             threads: bool = False, flat: bool = False, dedup: bool = False) -> None:
+    """
+    Write the conf text, the schema and optionally the snapshot of an indexed metamodel.
+    With jobs > 1 and without a cache, the schema is generated on a pool while the
+    conf text is written. With flat, the schema is written flattened. With dedup,
+    repeated subschemas are written once as shared $defs.
+    """
+    pool = None
+    if jobs is not None and jobs > 1 and cache is None:
+        pool, chunks = submit_schema_chunks(index, jobs, threads)
+
+    # the pool is shut down also if writing the conf text fails
+    try:
+        # Convert JSON data to custom configuration format
+        # the conf text is streamed to a temporary file and replaces the output only if changed
+        with profiler.span("conf") as span:
+            conf_file = ChangedFile(output_path)
+            with conf_file as outfile:
+                write_conf(outfile, index)
+            span.count("elements", len(index.types) + len(index.options) + len(index.links))
+
+        # Convert JSON data to schema, reusing the fragments of unchanged elements
+        if pool is not None:
+            with profiler.span("defs+schemas") as span:
+                schema = merge_schema_chunks(chunks)
+                span.count("defs", len(schema["$defs"]))
+                span.count("schemas", len(schema["schemas"]))
+                span.count("jobs", jobs)
+        elif cache is None:
+            with profiler.span("defs") as span:
+                schema_defs = needs2defs(index)
+                span.count("defs", len(schema_defs))
+            with profiler.span("schemas") as span:
+                schemas = needs2schemas(index)
+                span.count("schemas", len(schemas))
+            schema: Dict[str, Any] = {
+                "$defs": schema_defs,
+                "schemas": schemas,
+            }
+        else:
+            with profiler.span("defs+schemas") as span:
+                schema = json2schema(index, cache)
+                span.count("defs", len(schema["$defs"]))
+                span.count("schemas", len(schema["schemas"]))
+                span.count("cache_hits", cache.hits)
+                span.count("cache_misses", cache.misses)
+            log(1, f"schema cache: {cache.hits} fragments reused, {cache.misses} regenerated")
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    # Resolve the $ref and allOf chains of the schema entries at generation time
+    if flat:
+        with profiler.span("flatten") as span:
+            schema = flatten_schema(schema)
+            span.count("defs", len(schema["$defs"]))
+
+    # Share repeated subschemas through $defs
+    if dedup:
+        with profiler.span("dedup") as span:
+            schema, stats = dedup_schema(schema)
+            for key, value in stats.items():
+                span.count(key, value)
+        saved = stats["bytes_before"] - stats["bytes_after"]
+        log(0, f"dedup: {stats['replaced']} subschemas replaced by {stats['shared_defs']} shared defs, "
+               f"{saved} bytes saved ({saved / max(1, stats['bytes_before']):.1%} of the indented schema)")
+
+    # Write the outputs, keep them untouched if unchanged
+    with profiler.span("write") as span:
+        span.count("written", conf_file.written)
+        schema_output_path = output_path.with_suffix('.schema.json')
+        span.count("written", write_chunks_if_changed(schema_output_path, json_io.iter_dump(schema, compact, memo)))
+        if snapshot:
+            data = dump_snapshot(index2config(index), schema, source_hash(input_path))
+            span.count("written", write_bytes_if_changed(output_path.with_suffix(snapshot_suffix), data))
+
+
+def main(input_path: Path, output_path: Path, cache_path: Optional[Path] = None,
+         profiler: Optional[Profiler] = None, compact: bool = False, lazy: bool = False,
+         snapshot: bool = False, cache: Optional[SchemaCache] = None,
+         memo: Optional[json_io.EntryMemo] = None, jobs: Optional[int] = None,
+         threads: bool = False, flat: bool = False, dedup: bool = False) -> Profiler:
     """
     Main function to read JSON input and write configuration output.
+    With compact, the schema is written without whitespace and with sorted keys.
+    With lazy, the input is memory-mapped and only the metamodel elements are decoded.
+    An input ending in .rst is read as the index of the metamodel sources, see rst_metamodel.
+    With snapshot, the config and the schema are also written as <output>.snapshot for conf.py.
+    A resident cache and memo, e.g. of the watch mode, reuse the fragments and
+    their pretty text of earlier runs in the same process.
+    With jobs > 1, the schema is generated by that many processes, or threads.
+    With flat, each schema entry is written as one flat subschema, see schema_flatten.
+    With dedup, repeated subschemas are shared through $defs, see schema_dedup.
+    Returns the profiler holding the measurements of the stages.
+    """
+    profiler = profiler or Profiler()
+    rst = input_path.suffix == ".rst"
+    lazy = lazy and not rst
+
+    # a memory-mapped input stays open until the outputs are written
+    with contextlib.ExitStack() as stack:
+        # Read only the metamodel elements of the current version from input file
+        with profiler.span("load") as span:
+            if rst:
+                # the metamodel sources themselves, scanned without a Sphinx build
+                needs = read_rst_metamodel(input_path)
+            elif lazy:
+                # the offset index is persisted next to the input, later runs skip the scan
+                lazy_needs = stack.enter_context(LazyNeeds.open(input_path))
+                needs = lazy_needs.subset(lambda need_type: str(need_type).startswith("sn_"))
+            else:
+                needs = stream_needs_from_json(input_path, keep=is_metamodel_need, fields=metamodel_fields)
+            span.count("elements", len(needs))
+
+        # Bucket the metamodel elements once as compact records, all generators read from the index
+        with profiler.span("extraction") as span:
+            # lazily decoded needs are kept by the mapping, records would only duplicate them
+            index = MetamodelIndex(needs if lazy else needs2records(needs))
+            if lazy:
+                span.count("decoded", needs.decoded)
+            for bucket, elements in index.buckets.items():
+                span.count(bucket, len(elements))
+
+        if cache is None and cache_path is not None:
+            cache = SchemaCache(cache_path, generator=generator_hash)
+        generate(index, input_path, output_path, profiler, compact, snapshot, cache, memo, jobs, threads, flat, dedup)
+        if cache is not None:
+            cache.save()
+
+    return profiler
+
+def version_output_path(output_path: Path, version: str) -> Path:
     """
-    # Read JSON data from input file
-    with open(input_path, 'r') as infile:
-        data = json.load(infile)
+    Output path of a version, <output stem>-<version><output suffix>.
+    """
+    name = "".join(c if c.isalnum() or c in "._-" else "_" for c in version)
+    return output_path.with_name(f"{output_path.stem}-{name}{output_path.suffix}")
 
-    # Convert JSON data to custom configuration format
-    conf_data = json_to_conf(data)
+def main_versions(input_path: Path, output_path: Path, versions: Optional[List[str]] = None,
+                  cache_path: Optional[Path] = None, profiler: Optional[Profiler] = None,
+                  compact: bool = False, snapshot: bool = False, flat: bool = False,
+                  dedup: bool = False) -> Profiler:
+    """
+    Convert several versions of an export in one pass over the input file.
 
-    # Write the configuration data to output file
-    with open(output_path, 'w') as outfile:
-        outfile.write(conf_data)
+    Each version is written to its own outputs, see version_output_path. Elements
+    unchanged between versions share their record and their schema fragments. The
+    delta between consecutive versions is written to <output stem>.delta.json.
+    snapshot, flat and dedup apply to the outputs of every version, as in main.
+    """
+    profiler = profiler or Profiler()
+
+    with profiler.span("load") as span:
+        needs_per_version = stream_versions_from_json(input_path, versions,
+                                                      keep=is_metamodel_need, fields=metamodel_fields)
+        span.count("versions", len(needs_per_version))
+        span.count("elements", sum(len(needs) for needs in needs_per_version.values()))
+
+    with profiler.span("extraction") as span:
+        records_per_version, shared = share_records(needs_per_version)
+        indexes = {version: MetamodelIndex(records) for version, records in records_per_version.items()}
+        span.count("shared", shared)
+
+    # fragments of elements unchanged since an earlier version are cache hits
+    cache = SchemaCache(cache_path, generator=generator_hash)
+    for version, index in indexes.items():
+        cache.next_index()
+        generate(index, input_path, version_output_path(output_path, version), profiler, compact, snapshot, cache,
+                 flat=flat, dedup=dedup)
+        log(1, f"version {version}: {cache.hits} fragments shared, {cache.misses} generated")
+    cache.save()
+
+    with profiler.span("delta") as span:
+        delta = versions_delta(indexes)
+        span.count("written", write_if_changed(output_path.with_suffix('.delta.json'),
+                                               json_io.dumps(delta, compact=compact)))
+
+    return profiler
+
+BatchJob = Tuple[Path, Path, Optional[Path]]
+
+def is_manifest(path: Path) -> bool:
+    """
+    Whether a JSON file is a batch manifest, a list, and not an export, an object.
+    Only the first character is read, exports are not parsed twice.
+    """
+    with open(path, 'rb') as infile:
+        while chunk := infile.read(4096):
+            chunk = chunk.lstrip()
+            if chunk:
+                return chunk.startswith(b"[")
+    return False
+
+def collect_batch_jobs(entries: List[str]) -> List[BatchJob]:
+    """
+    Collect (input, output, cache) jobs from manifests and glob patterns.
 
-    # Convert JSON data to schema
-    schema = json2schema(data)
+    A manifest is a JSON file with a list of {"input": ..., "output": ..., "cache": ...}
+    objects, paths relative to the manifest. Every other entry is a glob pattern of
+    input files, their outputs are written next to them as <input stem>.txt.
+    """
+    jobs = []
+    for entry in entries:
+        if entry.endswith(".json") and not glob.has_magic(entry) and Path(entry).is_file() and is_manifest(Path(entry)):
+            manifest_path = Path(entry)
+            with open(manifest_path, 'r') as infile:
+                manifest = json.load(infile)
+            base = manifest_path.parent
+            for item in manifest:
+                cache = base / item["cache"] if item.get("cache") else None
+                jobs.append((base / item["input"], base / item["output"], cache))
+            continue
+        matches = sorted(glob.glob(entry, recursive=True))
+        if not matches:
+            print(f"batch: no input matches '{entry}'", file=sys.stderr)
+        for match in matches:
+            input_path = Path(match)
+            jobs.append((input_path, input_path.with_suffix('.txt'), None))
+    return jobs
+
+def run_batch_job(job: BatchJob) -> Tuple[BatchJob, float, Optional[str]]:
+    """
+    Convert a single export, returns the job, its duration and an error text on failure.
+    """
+    start = time.perf_counter()
+    try:
+        # the per-need output of the conversion is not of interest in a batch
+        with contextlib.redirect_stdout(io.StringIO()):
+            main(*job)
+    except Exception:
+        return job, time.perf_counter() - start, traceback.format_exc()
+    return job, time.perf_counter() - start, None
+
+def main_batch(entries: List[str], jobs: Optional[int] = None) -> int:
+    """
+    Convert many exports in one process tree, a failing export does not stop the batch.
+    Returns the number of failed conversions.
+    """
+    batch_jobs = collect_batch_jobs(entries)
+    workers = max(1, min(jobs or os.cpu_count() or 1, len(batch_jobs)))
+
+    start = time.perf_counter()
+    failures = 0
+    # the workers inherit or re-import this module once, including sphinx_needs.config
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job, duration, error in pool.map(run_batch_job, batch_jobs):
+            if error is None:
+                print(f"ok     {duration:8.3f}s  {job[0]} -> {job[1]}")
+            else:
+                failures += 1
+                print(f"FAILED {duration:8.3f}s  {job[0]}")
+                print(error, file=sys.stderr)
 
-    # Write the schema data to output file
-    schema_output_path = output_path.with_suffix('.schema.json')
-    with open(schema_output_path, 'w') as schema_outfile:
-        json.dump(schema, schema_outfile, indent=4)
+    print(f"batch: {len(batch_jobs) - failures} converted, {failures} failed, "
+          f"{time.perf_counter() - start:.3f}s with {workers} workers")
+    return failures
 
 if __name__ == "__main__":
       parser = argparse.ArgumentParser(description="Convert JSON to custom configuration format.")
-      parser.add_argument("-i", "--input", help="Path to the input json file.", required=True, type=Path)
-      parser.add_argument("-o", "--output", help="Path to the output json file.", required=True, type=Path)
+      parser.add_argument("-i", "--input", help="Path to the input json file, or to the index rst file of the metamodel.", type=Path)
+      parser.add_argument("-o", "--output", help="Path to the output json file.", type=Path)
+      parser.add_argument("-c", "--cache", help="Path to the schema fragment cache file.", default=None, type=Path)
+      parser.add_argument("-b", "--batch", help="Manifest files or glob patterns of input json files.", nargs="+", default=None)
+      parser.add_argument("-j", "--jobs", help="Number of worker processes in batch mode or for the schema generation.", default=None, type=int)
+      parser.add_argument("--threads", help="Generate the schema with -j threads instead of processes.", action="store_true")
+      parser.add_argument("-v", "--verbose", help="Print element listings, twice to print every need.", action="count", default=0)
+      parser.add_argument("--profile", help="Print time, counts and memory peak per stage.", action="store_true")
+      parser.add_argument("--compact", help="Write the schema without whitespace and with sorted keys.", action="store_true")
+      parser.add_argument("--mmap", help="Memory-map the input and keep an offset index next to it.", action="store_true")
+      parser.add_argument("--snapshot", help="Also write the config and schema as a snapshot for conf.py.", action="store_true")
+      parser.add_argument("--flat", help="Write each schema entry with its $refs and allOf chains resolved.", action="store_true")
+      parser.add_argument("--dedup", help="Write repeated subschemas once as shared $defs and report the bytes saved.", action="store_true")
+      parser.add_argument("--versions", help="Convert the given versions, all versions without a name.", nargs="*", default=None)
+      parser.add_argument("--metrics-json", help="Path to write the stage measurements as json.", default=None, type=Path)
       #parser.add_argument("input", help="Path to the input JSON file.")
       #parser.add_argument("output", help="Path to the output configuration file.")
       args = parser.parse_args()
 
-      main(args.input, args.output)
+      verbosity = args.verbose
+
+      if args.batch:
+          sys.exit(1 if main_batch(args.batch, args.jobs) else 0)
+
+      if args.input is None or args.output is None:
+          parser.error("the following arguments are required: -i/--input, -o/--output")
+
+      profiler = Profiler(trace_memory=args.profile or args.metrics_json is not None)
+      if args.versions is not None:
+          # the versions share one fragment cache and are read in one pass, not memory-mapped
+          if args.mmap or args.jobs is not None or args.threads:
+              parser.error("--versions cannot be combined with --mmap, -j/--jobs or --threads")
+          main_versions(args.input, args.output, args.versions or None, args.cache, profiler, args.compact,
+                        args.snapshot, args.flat, args.dedup)
+      else:
+          main(args.input, args.output, args.cache, profiler, args.compact, args.mmap, args.snapshot,
+               jobs=args.jobs, threads=args.threads, flat=args.flat, dedup=args.dedup)
+
+      if args.profile:
+          print(profiler.table(), end="")
+      if args.metrics_json is not None:
+          write_if_changed(args.metrics_json, json.dumps(profiler.to_dict(), indent=4))
 
@@ -0,0 +1,135 @@
+"""
+JSON input and output with a pluggable backend.
+
+If orjson is installed it is used to parse and serialize, otherwise the stdlib
+json module. Both backends produce the same documents: pretty output (indent 4)
+always goes through the stdlib encoder to stay byte-identical to earlier runs,
+compact output has no whitespace, sorted keys and unescaped non-ASCII text.
+
+iter_dump() serializes a document piece by piece, one entry of each top-level
+object or array at a time, so large schema documents can be written without
+building the whole text in memory.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib gives the same results
+    orjson = None
+
+backend : str = "orjson" if orjson is not None else "json"
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def load(path: Path) -> Any:
+    """
+    Parse a JSON file.
+    """
+    return loads(Path(path).read_bytes())
+
+
+def dumps(obj: Any, compact: bool = False, sort_keys: bool = False) -> str:
+    """
+    Serialize obj, pretty printed with indent 4 unless compact.
+    """
+    if not compact:
+        return json.dumps(obj, indent=4, sort_keys=sort_keys)
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_SORT_KEYS if sort_keys else 0).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=sort_keys)
+
+
+class EntryMemo:
+    """
+    Pretty text of the entries one level below the top-level values.
+
+    A long-running process dumping mostly the same entry objects again (e.g.
+    the reused schema fragments of the watch mode) serializes only the new
+    ones. Entries are recognized by identity, the memo keeps them alive.
+    """
+
+    def __init__(self) -> None:
+        self.texts: Dict[int, Tuple[Any, str]] = {}
+        self.used: Dict[int, Tuple[Any, str]] = {}
+
+    def text(self, value: Any) -> str:
+        entry = self.texts.get(id(value))
+        if entry is None or entry[0] is not value:
+            # same layout as the indent 4 encoder at nesting level 2
+            entry = (value, json.dumps(value, indent=4).replace("\n", "\n" + " " * 8))
+        self.used[id(value)] = entry
+        return entry[1]
+
+    def next_run(self) -> None:
+        """
+        Keep the texts used in this run for the next one, drop all others.
+        """
+        self.texts, self.used = self.used, {}
+
+
+def _iter_dump_memo(obj: Dict[str, Any], memo: EntryMemo) -> Iterator[str]:
+    # pretty layout of a top-level object, byte-identical to JSONEncoder(indent=4)
+    if not obj:
+        yield "{}"
+        return
+    yield "{"
+    for i, (key, value) in enumerate(obj.items()):
+        yield ("," if i else "") + "\n    " + json.dumps(key) + ": "
+        if isinstance(value, dict) and value:
+            yield "{"
+            for k, (sub_key, item) in enumerate(value.items()):
+                yield ("," if k else "") + "\n        " + json.dumps(sub_key) + ": " + memo.text(item)
+            yield "\n    }"
+        elif isinstance(value, list) and value:
+            yield "["
+            for k, item in enumerate(value):
+                yield ("," if k else "") + "\n        " + memo.text(item)
+            yield "\n    ]"
+        else:
+            yield json.dumps(value, indent=4).replace("\n", "\n    ")
+    yield "\n}"
+
+
+def iter_dump(obj: Any, compact: bool = False, memo: Optional[EntryMemo] = None) -> Iterator[str]:
+    """
+    Serialize obj in chunks, compact output with sorted keys.
+
+    Pretty output of a top-level object reuses the entry texts of a memo.
+    """
+    if not compact:
+        if memo is not None and isinstance(obj, dict) and all(isinstance(key, str) for key in obj):
+            yield from _iter_dump_memo(obj, memo)
+        else:
+            yield from json.JSONEncoder(indent=4).iterencode(obj)
+        return
+
+    if not isinstance(obj, dict):
+        yield dumps(obj, compact=True, sort_keys=True)
+        return
+
+    yield "{"
+    for i, key in enumerate(sorted(obj)):
+        yield ("," if i else "") + dumps(str(key), compact=True) + ":"
+        value = obj[key]
+        if isinstance(value, dict):
+            yield "{"
+            for k, sub_key in enumerate(sorted(value)):
+                yield (("," if k else "") + dumps(str(sub_key), compact=True) + ":"
+                       + dumps(value[sub_key], compact=True, sort_keys=True))
+            yield "}"
+        elif isinstance(value, list):
+            yield "["
+            for k, item in enumerate(value):
+                yield ("," if k else "") + dumps(item, compact=True, sort_keys=True)
+            yield "]"
+        else:
+            yield dumps(value, compact=True, sort_keys=True)
+    yield "}"
@@ -0,0 +1,110 @@
+"""
+Array-backed link graph of a project export for network validation.
+
+The need ids are mapped to dense integers once. Each link option is stored
+CSR-style as an offset array (one entry per need plus one) and an index array
+of the link targets, next to a parallel array with the type code of every
+need. A network rule testing the type of linked needs (contains + enum +
+minContains) then is one pass over the edges of the link option, instead of
+dict lookups per link and need.
+
+The passes use numpy, a requirement of the documentation build
+(docs/requirements.txt). Where numpy is not installed, the edges of each
+checked need are visited on the plain arrays instead, with the same results.
+"""
+
+from array import array
+from typing import Any, Dict, FrozenSet, Iterable, List, Sequence, Tuple
+
+try:
+    import numpy
+except ImportError:  # optional, the pure Python passes give the same results
+    numpy = None
+
+
+class LinkGraph:
+    """
+    Links of all needs, per link option, as CSR arrays over dense need indices.
+    """
+
+    def __init__(self, needs: Dict[str, Dict[str, Any]], link_options: Iterable[str]) -> None:
+        self.ids: List[str] = list(needs)
+        self.index: Dict[str, int] = {need_id: i for i, need_id in enumerate(self.ids)}
+
+        self.type_codes: Dict[str, int] = {}
+        self.need_types = array("l")
+        for need in needs.values():
+            need_type = need.get("type")
+            code = self.type_codes.setdefault(need_type, len(self.type_codes))
+            self.need_types.append(code)
+
+        self.offsets: Dict[str, array] = {}
+        self.targets: Dict[str, array] = {}
+        for option in link_options:
+            self._add_option(needs, option)
+
+        self._counts: Dict[Tuple[str, FrozenSet[str]], Sequence[int]] = {}
+        self._masks: Dict[Tuple[str, FrozenSet[str]], bytearray] = {}
+
+    def _add_option(self, needs: Dict[str, Dict[str, Any]], option: str) -> None:
+        index = self.index
+        offsets = array("l", [0])
+        targets = array("l")
+        for need in needs.values():
+            for target in need.get(option, ()):
+                # dead links have no target need to check
+                position = index.get(target)
+                if position is not None:
+                    targets.append(position)
+            offsets.append(len(targets))
+        self.offsets[option] = offsets
+        self.targets[option] = targets
+
+    def degree(self, option: str, i: int) -> int:
+        """
+        Number of resolved links of need i for the link option.
+        """
+        offsets = self.offsets[option]
+        return offsets[i + 1] - offsets[i]
+
+    def type_mask(self, types: FrozenSet[str]) -> bytearray:
+        mask = bytearray(len(self.type_codes))
+        for need_type in types:
+            if need_type in self.type_codes:
+                mask[self.type_codes[need_type]] = 1
+        return mask
+
+    def count_targets(self, option: str, types: FrozenSet[str], i: int) -> int:
+        """
+        Number of needs linked by need i with one of the given types.
+
+        With numpy, the counts of all needs are computed in one vectorized pass
+        over the edges of the option and memoized, as many schema entries share
+        the same rule. Without numpy only the edges of need i are visited.
+        """
+        key = (option, types)
+        if numpy is not None:
+            if key not in self._counts:
+                self._counts[key] = self._count_numpy(self.type_mask(types), option)
+            return self._counts[key][i]
+
+        if key not in self._masks:
+            self._masks[key] = self.type_mask(types)
+        mask = self._masks[key]
+        need_types = self.need_types
+        offsets = self.offsets[option]
+        targets = self.targets[option]
+        return sum(mask[need_types[targets[k]]] for k in range(offsets[i], offsets[i + 1]))
+
+    def _count_numpy(self, mask: bytearray, option: str) -> Sequence[int]:
+        offsets = self.offsets[option]
+        targets = self.targets[option]
+        need_types = numpy.frombuffer(self.need_types, dtype=self.need_types.typecode)
+        np_offsets = numpy.frombuffer(offsets, dtype=offsets.typecode)
+        np_targets = numpy.frombuffer(targets, dtype=targets.typecode)
+        np_mask = numpy.frombuffer(bytes(mask), dtype=numpy.uint8)
+
+        matched = np_mask[need_types[np_targets]].astype(numpy.int64)
+        # running sum over the edges, a need's count is the difference at its offsets
+        running = numpy.concatenate(([0], numpy.cumsum(matched)))
+        return (running[np_offsets[1:]] - running[np_offsets[:-1]]).tolist()
@@ -0,0 +1,149 @@
+"""
+Index over the metamodel elements (sn_*) of a sphinx-needs export.
+
+The index is built with a single pass over the needs and buckets the elements
+by their type. All conf and schema generators read from the index instead of
+filtering the whole needs dict again.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional
+
+from typegroup_closure import TypegroupClosure
+
+sn_element_types : List[str] = [
+    "sn_type",
+    "sn_typegroup",
+    "sn_option",
+    "sn_link",
+    "sn_association",
+]
+
+
+class ResolvedAssociation:
+    """
+    Link option and expanded target directives of an association.
+
+    targets is None, if the association has no resolvable first target.
+    """
+
+    __slots__ = ("id", "option", "targets")
+
+    def __init__(self, association_id: str, option: str, targets: Optional[List[str]]) -> None:
+        self.id = association_id
+        self.option = option
+        self.targets = targets
+
+
+class MetamodelIndex:
+    """
+    Metamodel elements bucketed by type, with an id lookup table.
+    """
+
+    def __init__(self, needs: Dict[str, Any]) -> None:
+        self.needs: Dict[str, Any] = needs
+        self.buckets: Dict[str, List[Dict[str, Any]]] = {t: [] for t in sn_element_types}
+        self.by_id: Dict[str, Dict[str, Any]] = {}
+
+        for need_id, need in needs.items():
+            bucket = self.buckets.get(need.get("type"))
+            if bucket is None:
+                continue
+            bucket.append(need)
+            self.by_id[need_id] = need
+
+        # associations and typegroups are resolved once and shared by all generators
+        self.resolved_associations: Dict[str, Optional[ResolvedAssociation]] = {}
+        self.resolved_typegroups: Dict[str, List[str]] = {}
+        self.association_resolutions = 0
+        self._typegroup_closure: Optional[TypegroupClosure] = None
+
+    @property
+    def types(self) -> List[Dict[str, Any]]:
+        return self.buckets["sn_type"]
+
+    @property
+    def typegroups(self) -> List[Dict[str, Any]]:
+        return self.buckets["sn_typegroup"]
+
+    @property
+    def options(self) -> List[Dict[str, Any]]:
+        return self.buckets["sn_option"]
+
+    @property
+    def links(self) -> List[Dict[str, Any]]:
+        return self.buckets["sn_link"]
+
+    @property
+    def associations(self) -> List[Dict[str, Any]]:
+        return self.buckets["sn_association"]
+
+    def __contains__(self, need_id: object) -> bool:
+        return need_id in self.by_id
+
+    def __getitem__(self, need_id: str) -> Dict[str, Any]:
+        return self.by_id[need_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.by_id)
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def get(self, need_id: str, default: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        return self.by_id.get(need_id, default)
+
+    def association(self, association_id: str) -> Optional[ResolvedAssociation]:
+        """
+        Resolve an association once, later calls return the memoized result.
+
+        None, if the id is not an association or its link can not be resolved.
+        """
+        if association_id not in self.resolved_associations:
+            self.association_resolutions += 1
+            self.resolved_associations[association_id] = self._resolve_association(association_id)
+        return self.resolved_associations[association_id]
+
+    @property
+    def typegroup_closure(self) -> TypegroupClosure:
+        """
+        Membership of nested typegroups, built on first use.
+        """
+        if self._typegroup_closure is None:
+            self._typegroup_closure = TypegroupClosure(self.types, self.typegroups)
+        return self._typegroup_closure
+
+    def typegroup_directives(self, typegroup_id: str) -> List[str]:
+        """
+        Directives of all types in a typegroup and its nested typegroups, memoized per typegroup.
+        """
+        if typegroup_id not in self.resolved_typegroups:
+            directives = [self.by_id[t]["directive"] for t in self.typegroup_closure.types_in(typegroup_id)]
+            self.resolved_typegroups[typegroup_id] = directives
+        return self.resolved_typegroups[typegroup_id]
+
+    def _resolve_association(self, association_id: str) -> Optional[ResolvedAssociation]:
+        association_need = self.by_id.get(association_id)
+        if association_need is None or association_need["type"] != "sn_association":
+            return None
+        link = association_need.get("link", None)
+        if not link or len(link) != 1 or link[0] not in self.by_id:
+            # todo: warn about missing link
+            return None
+        option = self.by_id[link[0]]["option"]
+
+        targets = association_need.get("targets", [])
+        if len(targets) == 0 or targets[0] not in self.by_id:
+            return ResolvedAssociation(association_id, option, None)
+
+        list_targets = []
+        for t in targets:
+            if t not in self.by_id:
+                continue
+            target_need = self.by_id[t]
+            if "type" in target_need and target_need["type"] == "sn_type":
+                list_targets.append(target_need["directive"])
+            elif "type" in target_need and target_need["type"] == "sn_typegroup":
+                list_targets += self.typegroup_directives(t)
+
+        return ResolvedAssociation(association_id, option, list_targets)
+
@@ -0,0 +1,140 @@
+"""
+Compact record types for the metamodel elements (sn_*).
+
+The records keep only the fields the generators read in __slots__: those of
+the sphinx-needs TypedDict an element is converted to and the sn_* fields
+linking the elements (mandatory, groups, targets, ...). They intern all
+id strings and store the reference lists as tuples. They offer the read-only mapping interface of the sphinx-needs dicts
+(need["id"], need.get("mandatory", []), "schema" in need), so the generators
+accept records and plain dicts alike.
+"""
+
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from sphinx_needs.config import NeedType, NeedExtraOption, LinkOptionsType
+
+from get_class_variables import typed_dict_fields
+
+
+class SnElement:
+    """
+    Base record of a metamodel element.
+
+    Fields missing in the export are left unset and behave like missing keys.
+    """
+
+    __slots__ = ("id", "type", "title")
+
+    # fields referencing other elements by id
+    ref_fields : Tuple[str, ...] = ()
+    # all fields of the record, in the order of the sphinx-needs export
+    fields : Tuple[str, ...] = ("id", "type", "title")
+
+    def __init__(self, need: Dict[str, Any]) -> None:
+        ref_fields = self.ref_fields
+        for field in self.fields:
+            if field not in need:
+                continue
+            value = need[field]
+            if field in ref_fields:
+                value = tuple(sys.intern(v) for v in value)
+            elif field == "id" or field == "type":
+                value = sys.intern(value)
+            setattr(self, field, value)
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.fields:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.fields and hasattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (field for field in self.fields if hasattr(self, field))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        return iter(self)
+
+    def __repr__(self) -> str:
+        items = ", ".join(f"{k}={self[k]!r}" for k in self)
+        return f"{type(self).__name__}({items})"
+
+
+def record_fields(typed_dict: Optional[type], sn_fields: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    """
+    Fields of a record type besides those of SnElement: the fields of the
+    sphinx-needs TypedDict, then the sn_* fields.
+    """
+    names = [*(typed_dict_fields(typed_dict) if typed_dict is not None else ()), *sn_fields]
+    return tuple(name for name in dict.fromkeys(names) if name not in SnElement.fields)
+
+
+class SnType(SnElement):
+    ref_fields = ("mandatory", "optional", "groups", "parent_needs_back")
+    __slots__ = record_fields(NeedType, ref_fields)
+    fields = SnElement.fields + __slots__
+
+
+class SnTypegroup(SnElement):
+    ref_fields = ("mandatory", "optional", "groups", "groups_back", "parent_needs_back")
+    __slots__ = record_fields(None, ref_fields)
+    fields = SnElement.fields + __slots__
+
+
+class SnOption(SnElement):
+    __slots__ = record_fields(NeedExtraOption)
+    fields = SnElement.fields + __slots__
+
+
+class SnLink(SnElement):
+    __slots__ = record_fields(LinkOptionsType)
+    fields = SnElement.fields + __slots__
+
+
+class SnAssociation(SnElement):
+    ref_fields = ("link", "targets")
+    __slots__ = record_fields(None, ref_fields)
+    fields = SnElement.fields + __slots__
+
+
+record_types : Dict[str, type] = {
+    "sn_type": SnType,
+    "sn_typegroup": SnTypegroup,
+    "sn_option": SnOption,
+    "sn_link": SnLink,
+    "sn_association": SnAssociation,
+}
+
+
+def need2record(need: Dict[str, Any]) -> Optional[SnElement]:
+    """
+    Build the record for a metamodel element, None for all other needs.
+    """
+    record_type = record_types.get(need.get("type"))
+    if record_type is None:
+        return None
+    return record_type(need)
+
+
+def needs2records(needs: Dict[str, Any]) -> Dict[str, SnElement]:
+    """
+    Convert the metamodel elements of a needs dict to records, keyed by interned id.
+    """
+    records = {}
+    for need_id, need in needs.items():
+        record = need2record(need)
+        if record is None:
+            continue
+        records[sys.intern(need_id)] = record
+    return records
@@ -0,0 +1,97 @@
+"""
+Precompiled snapshot of the generated sphinx-needs configuration.
+
+json2conf.py --snapshot writes the needs_types, needs_extra_options and
+needs_extra_links lists, converted as sphinx-needs expects them, and the schema
+into one marshal file, tagged with the sha256 of the export it was generated
+from. marshal data is only readable by the interpreter version that wrote
+it, so a text header line names the interpreter and the marshal version. A conf.py loads all of it with a
+single read instead of executing pasted literal config:
+
+    sys.path.append(os.path.abspath('../scripts'))
+    from metamodel_snapshot import load_snapshot
+
+    metamodel = load_snapshot('../use_datamodel/output2.snapshot')
+    needs_types = metamodel["needs_types"]
+    needs_extra_options = metamodel["needs_extra_options"]
+    needs_extra_links = metamodel["needs_extra_links"]
+    needs_schema_definitions = metamodel["schema"]
+
+This module only uses the standard library, so loading it does not import
+the generators or sphinx-needs.
+"""
+
+import gc
+import hashlib
+import marshal
+import sys
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# bump when the content of the snapshot changes
+snapshot_format : int = 2
+
+snapshot_suffix : str = ".snapshot"
+
+
+def snapshot_header() -> bytes:
+    """
+    First line of a snapshot written by this interpreter.
+    """
+    return f"metamodel-snapshot {snapshot_format} {sys.implementation.cache_tag} marshal {marshal.version}\n".encode("ascii")
+
+
+def source_hash(path: Path) -> str:
+    """
+    sha256 of a file, read in chunks.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dump_snapshot(config: Dict[str, Any], schema: Dict[str, Any], source: str) -> bytes:
+    """
+    Serialize the config lists and the schema, source is the hash of the export.
+    """
+    snapshot = {
+        "format": snapshot_format,
+        "source": source,
+        "needs_types": config["needs_types"],
+        "needs_extra_options": config["needs_extra_options"],
+        "needs_extra_links": config["needs_extra_links"],
+        "schema": schema,
+    }
+    return snapshot_header() + marshal.dumps(snapshot)
+
+
+def load_snapshot(path: Path, source_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    Load a snapshot written by json2conf.py --snapshot.
+
+    With source_path, the snapshot must have been generated from exactly that
+    export, otherwise a ValueError is raised.
+    """
+    with open(path, "rb") as infile:
+        header = infile.readline()
+        if header != snapshot_header():
+            raise ValueError(f"{path} is not a metamodel snapshot of format {snapshot_format} for "
+                             f"{sys.implementation.cache_tag}, regenerate it with json2conf.py --snapshot.")
+        data = infile.read()
+    # the loaded containers are all alive, collections during the load only cost time
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        snapshot = marshal.loads(data)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    if not isinstance(snapshot, dict) or snapshot.get("format") != snapshot_format:
+        raise ValueError(f"{path} is not a metamodel snapshot of format {snapshot_format}, "
+                         f"regenerate it with json2conf.py --snapshot.")
+    if source_path is not None and snapshot["source"] != source_hash(source_path):
+        raise ValueError(f"{path} was not generated from {source_path}, "
+                         f"regenerate it with json2conf.py --snapshot.")
+    return snapshot
@@ -0,0 +1,89 @@
+"""
+Metamodel elements of several versions of one export.
+
+Elements with the same content in several versions are converted to a
+single record shared by the indexes of all these versions. Their schema
+fragments therefore have the same cache key and are generated only once.
+The delta between two versions lists the added, removed and changed
+elements per kind, with the names of the changed fields.
+"""
+
+import json
+import sys
+from typing import Any, Dict, List, Tuple
+
+from metamodel_index import MetamodelIndex
+from metamodel_records import SnElement, need2record
+
+# kinds of the delta and their element types
+delta_kinds : Dict[str, str] = {
+    "types": "sn_type",
+    "typegroups": "sn_typegroup",
+    "options": "sn_option",
+    "links": "sn_link",
+    "associations": "sn_association",
+}
+
+
+def share_records(needs_per_version: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, SnElement]], int]:
+    """
+    Convert the metamodel elements of all versions to records, equal elements share one record.
+
+    Returns the records per version and the number of elements reused from an earlier version.
+    """
+    seen: Dict[str, SnElement] = {}
+    shared = 0
+    records_per_version = {}
+    for version, needs in needs_per_version.items():
+        records = {}
+        for need_id, need in needs.items():
+            content = json.dumps(need, sort_keys=True, separators=(",", ":"))
+            record = seen.get(content)
+            if record is None:
+                record = need2record(need)
+                if record is None:
+                    continue
+                seen[content] = record
+            else:
+                shared += 1
+            records[sys.intern(need_id)] = record
+        records_per_version[version] = records
+    return records_per_version, shared
+
+
+def element_delta(old: MetamodelIndex, new: MetamodelIndex) -> Dict[str, Any]:
+    """
+    Added, removed and changed elements per kind between two versions.
+    """
+    delta = {}
+    for kind, element_type in delta_kinds.items():
+        old_elements = {e["id"]: e for e in old.buckets[element_type]}
+        new_elements = {e["id"]: e for e in new.buckets[element_type]}
+
+        changed = {}
+        for element_id, element in new_elements.items():
+            previous = old_elements.get(element_id)
+            if previous is None or previous is element:
+                continue
+            fields = list(dict.fromkeys([*previous, *element]))
+            changed_fields = [k for k in fields if previous.get(k) != element.get(k)]
+            if changed_fields:
+                changed[element_id] = changed_fields
+
+        delta[kind] = {
+            "added": [e for e in new_elements if e not in old_elements],
+            "removed": [e for e in old_elements if e not in new_elements],
+            "changed": changed,
+        }
+    return delta
+
+
+def versions_delta(indexes: Dict[str, MetamodelIndex]) -> List[Dict[str, Any]]:
+    """
+    Deltas between each version and the one before it.
+    """
+    versions = list(indexes)
+    return [
+        {"from": old, "to": new, **element_delta(indexes[old], indexes[new])}
+        for old, new in zip(versions, versions[1:])
+    ]
@@ -0,0 +1,200 @@
+# usage:
+# python ./scripts/metamodel_watch.py -i ./use_datamodel/needs.json -o ./use_datamodel/output2.txt
+# python ./scripts/metamodel_watch.py -i ./metamodel/index.rst -o ./use_datamodel/output2.txt
+# python ./scripts/metamodel_watch.py -i ./metamodel/_build/needs/needs.json -o ./use_datamodel/output2.txt \
+#     --sources ./metamodel --build "sphinx-build -b needs ./metamodel ./metamodel/_build/needs"
+
+"""
+Watch mode: regenerate the conf text and the schema whenever the metamodel changes.
+
+The process stays alive and polls the modification times of the export and,
+optionally, of the metamodel sources. Changes are debounced until the files
+are quiet. A change of the sources runs the given build command, which
+writes a new export. A change of the export regenerates the outputs.
+
+The schema fragments of the last run stay in memory and are keyed by the
+content of the elements they are generated from. Only the fragments of
+changed elements and their dependents are generated and serialized again,
+the pretty text of reused fragments is kept as well. Unchanged outputs
+are not touched. The latency from the detected change to the written
+outputs is reported per change.
+"""
+
+import argparse
+import os
+import shlex
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import json2conf
+import json_io
+from instrumentation import Profiler
+from schema_cache import SchemaCache
+
+# path -> mtime_ns of all watched files
+FileState = Dict[str, int]
+
+
+def file_state(paths: List[Path]) -> FileState:
+    """
+    Modification times of the given files and of all files below the given folders.
+    """
+    state: FileState = {}
+    for path in paths:
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                # build output below the sources must not trigger another build
+                dirs[:] = [d for d in dirs if not d.startswith(("_build", "."))]
+                for name in files:
+                    file_path = os.path.join(root, name)
+                    try:
+                        state[file_path] = os.stat(file_path).st_mtime_ns
+                    except FileNotFoundError:
+                        pass
+        else:
+            try:
+                state[str(path)] = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                pass
+    return state
+
+
+class WatchSession:
+    """
+    Resident state between the regenerations of a watch.
+    """
+
+    def __init__(self, input_path: Path, output_path: Path,
+                 compact: bool = False, snapshot: bool = False) -> None:
+        self.input_path = input_path
+        self.output_path = output_path
+        self.compact = compact
+        self.snapshot = snapshot
+        self.cache = SchemaCache(None, generator=json2conf.generator_hash)
+        self.memo = json_io.EntryMemo()
+        self.element_hashes: Dict[str, str] = {}
+        self.runs = 0
+
+    def regenerate(self) -> Profiler:
+        """
+        Regenerate all outputs, reusing the fragments of unchanged elements.
+        """
+        self.cache.next_run()
+        self.memo.next_run()
+        profiler = json2conf.main(self.input_path, self.output_path, profiler=Profiler(),
+                                  compact=self.compact, snapshot=self.snapshot,
+                                  cache=self.cache, memo=self.memo)
+        self.runs += 1
+        return profiler
+
+    def changed_elements(self) -> int:
+        """
+        Number of elements added, removed or changed since the previous regeneration.
+        """
+        current = self.cache.element_hashes
+        previous, self.element_hashes = self.element_hashes, dict(current)
+        keys = previous.keys() | current.keys()
+        return sum(1 for key in keys if previous.get(key) != current.get(key))
+
+
+def report(session: WatchSession, profiler: Profiler, latency_s: float, stages: bool = False) -> None:
+    spans = {span.name: span for span in profiler.spans}
+    fragments = spans["defs+schemas"].counts
+    written = spans["write"].counts.get("written", 0)
+    generation_s = sum(span.wall_s for span in profiler.spans)
+    # the latency also covers debouncing and the build of the export
+    print(f"[{time.strftime('%H:%M:%S')}] regenerated {latency_s * 1000:.0f} ms after the change "
+          f"({generation_s * 1000:.0f} ms generation): "
+          f"{session.changed_elements()} elements changed, "
+          f"{fragments.get('cache_misses', 0)} fragments regenerated, "
+          f"{fragments.get('cache_hits', 0)} reused, {written} outputs written")
+    if stages:
+        print(profiler.table(), end="")
+
+
+def regenerate(session: WatchSession, detected_s: float, stages: bool = False) -> None:
+    """
+    Regenerate the outputs and report them, or the error if the regeneration failed.
+    """
+    try:
+        profiler = session.regenerate()
+    except Exception as e:
+        # e.g. an export still being written or a broken metamodel, the next change triggers again
+        print(f"[{time.strftime('%H:%M:%S')}] regeneration failed: {type(e).__name__}: {e}", file=sys.stderr)
+        return
+    report(session, profiler, time.perf_counter() - detected_s, stages)
+
+
+def run_build(command: str) -> bool:
+    start = time.perf_counter()
+    result = subprocess.run(shlex.split(command))
+    print(f"[{time.strftime('%H:%M:%S')}] build finished in {time.perf_counter() - start:.1f} s "
+          f"with exit code {result.returncode}")
+    return result.returncode == 0
+
+
+def wait_quiet(paths: List[Path], state: FileState, debounce_s: float) -> FileState:
+    """
+    Wait until the files did not change for debounce_s, returns their final state.
+    """
+    while True:
+        time.sleep(debounce_s)
+        current = file_state(paths)
+        if current == state:
+            return current
+        state = current
+
+
+def watch(session: WatchSession, sources: List[Path], build: Optional[str],
+          poll_s: float = 0.2, debounce_s: float = 0.3, stages: bool = False) -> None:
+    """
+    Poll the export and the sources until interrupted.
+    """
+    # the rst sources of the metamodel are read directly, all of them are the export
+    export = [session.input_path.parent if session.input_path.suffix == ".rst" else session.input_path]
+    export_state = file_state(export)
+    sources_state = file_state(sources)
+
+    if export_state:
+        regenerate(session, time.perf_counter(), stages)
+    print(f"watching {session.input_path}" + "".join(f", {source}" for source in sources))
+
+    while True:
+        time.sleep(poll_s)
+        current_sources = file_state(sources)
+        current_export = file_state(export)
+        if current_sources == sources_state and current_export == export_state:
+            continue
+
+        detected = time.perf_counter()
+        if current_sources != sources_state:
+            sources_state = wait_quiet(sources, current_sources, debounce_s)
+            if build is not None and not run_build(build):
+                continue
+            current_export = file_state(export)
+        if current_export == export_state:
+            continue
+        export_state = wait_quiet(export, current_export, debounce_s)
+        regenerate(session, detected, stages)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Regenerate configuration and schema on metamodel changes.")
+      parser.add_argument("-i", "--input", help="Path to the input json file, or to the index rst file of the metamodel.", required=True, type=Path)
+      parser.add_argument("-o", "--output", help="Path to the output json file.", required=True, type=Path)
+      parser.add_argument("--sources", help="Folders or files of the metamodel sources.", nargs="*", default=[], type=Path)
+      parser.add_argument("--build", help="Command writing the export, run on changed sources.", default=None)
+      parser.add_argument("--poll", help="Seconds between two checks for changes.", default=0.2, type=float)
+      parser.add_argument("--debounce", help="Seconds the files must be quiet before regenerating.", default=0.3, type=float)
+      parser.add_argument("--compact", help="Write the schema without whitespace and with sorted keys.", action="store_true")
+      parser.add_argument("--snapshot", help="Also write the config and schema as a snapshot for conf.py.", action="store_true")
+      parser.add_argument("--profile", help="Print time and counts per stage of each regeneration.", action="store_true")
+      args = parser.parse_args()
+
+      session = WatchSession(args.input, args.output, args.compact, args.snapshot)
+      try:
+          watch(session, args.sources, args.build, args.poll, args.debounce, args.profile)
+      except KeyboardInterrupt:
+          print(f"stopped after {session.runs} regenerations")
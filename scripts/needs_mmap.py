@@ -0,0 +1,207 @@
+"""
+Lazy, memory-mapped access to the needs of a sphinx-needs export (needs.json).
+
+The export is scanned once to record the byte range and the type of every
+need of a version. Lookups then decode only the requested need from the
+memory map, the first time it is requested. The offset index is stored next
+to the export (needs.json.offsets) and reused as long as the export is
+unchanged, so later runs do not scan the file again.
+
+json2conf --mmap keeps the sn_* needs: building the metamodel index buckets
+them by type and so decodes every one of them up front. The laziness saves
+the decoding of all other needs of the export, the project needs, which are
+only scanned for their byte range and type. LazyNeeds is a context manager,
+closing the memory map on exit.
+"""
+
+import mmap
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import json_io
+from needs_reader import _JsonStream
+from output_writer import write_if_changed
+
+# bump on changes of the offset index layout
+offsets_format : int = 1
+
+# byte range of the need object and need type, per need id
+NeedOffsets = Dict[str, Tuple[int, int, Optional[str]]]
+
+
+def _byte_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class _OffsetStream(_JsonStream):
+    """
+    Pull parser that also tracks the byte offset of the current position.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        # byte offset of buf[mark], advanced incrementally by tell()
+        self.mark = 0
+        self.mark_offset = 0
+
+    def tell(self) -> int:
+        self.mark_offset += _byte_length(self.buf[self.mark:self.pos])
+        self.mark = self.pos
+        return self.mark_offset
+
+    def _fill(self) -> bool:
+        offset = self.tell()
+        if not super()._fill():
+            return False
+        # the buffer now starts at the former position
+        self.mark = 0
+        self.mark_offset = offset
+        return True
+
+
+def _scan_needs(stream: _OffsetStream) -> NeedOffsets:
+    offsets: NeedOffsets = {}
+    for need_id in stream.iter_object():
+        stream.peek()
+        start = stream.tell()
+        need = stream.read_value()
+        need_type = need.get("type") if isinstance(need, dict) else None
+        offsets[need_id] = (start, stream.tell(), need_type)
+    return offsets
+
+
+def _scan_version(stream: _OffsetStream) -> NeedOffsets:
+    offsets: NeedOffsets = {}
+    for key in stream.iter_object():
+        if key == "needs":
+            offsets = _scan_needs(stream)
+        else:
+            stream.skip_value()
+    return offsets
+
+
+def scan_offsets(input_path: Path, version: Optional[str] = None) -> NeedOffsets:
+    """
+    Scan a needs.json file for the byte ranges of the needs of a version.
+
+    Without a version, the current_version of the export is used.
+    """
+    requested = version
+    candidates: Dict[str, NeedOffsets] = {}
+
+    # newline="" keeps \r\n, the offsets must match the bytes in the file
+    with open(input_path, "r", encoding="utf-8", newline="") as infile:
+        stream = _OffsetStream(infile)
+        for key in stream.iter_object():
+            if key == "current_version" and requested is None:
+                version = stream.read_value()
+            elif key == "versions":
+                for name in stream.iter_object():
+                    if version is None or name == version:
+                        candidates[name] = _scan_version(stream)
+                    else:
+                        stream.skip_value()
+            else:
+                stream.skip_value()
+
+    return candidates.get(version, {})
+
+
+class LazyNeeds(Mapping):
+    """
+    Read-only needs mapping decoding each need on first access.
+
+    Membership, iteration and the need types are answered from the offset
+    index without decoding.
+    """
+
+    def __init__(self, input_path: Path, offsets: NeedOffsets,
+                 mapped: Optional[mmap.mmap] = None,
+                 decoded: Optional[Dict[str, Any]] = None) -> None:
+        self.input_path = Path(input_path)
+        self.offsets = offsets
+        if mapped is None:
+            with open(self.input_path, "rb") as infile:
+                mapped = mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ)
+        self._map = mapped
+        # shared with all subsets of the same export
+        self._decoded: Dict[str, Any] = {} if decoded is None else decoded
+
+    @classmethod
+    def open(cls, input_path: Path, version: Optional[str] = None,
+             index_path: Optional[Path] = None, persist: bool = True) -> "LazyNeeds":
+        """
+        Map an export, reusing or creating its offset index.
+        """
+        input_path = Path(input_path)
+        if index_path is None:
+            index_path = input_path.with_name(input_path.name + ".offsets")
+        stat = input_path.stat()
+        key = [offsets_format, stat.st_size, stat.st_mtime_ns, version]
+
+        offsets = None
+        if index_path.is_file():
+            try:
+                data = json_io.load(index_path)
+            except ValueError:
+                data = None
+            if isinstance(data, dict) and data.get("key") == key:
+                offsets = {need_id: tuple(entry) for need_id, entry in data["needs"].items()}
+
+        if offsets is None:
+            offsets = scan_offsets(input_path, version)
+            if persist:
+                data = {"key": key, "needs": offsets}
+                write_if_changed(index_path, json_io.dumps(data, compact=True))
+
+        return cls(input_path, offsets)
+
+    def __getitem__(self, need_id: str) -> Any:
+        need = self._decoded.get(need_id)
+        if need is None:
+            start, end, _ = self.offsets[need_id]
+            need = json_io.loads(self._map[start:end])
+            self._decoded[need_id] = need
+        return need
+
+    def __contains__(self, need_id: object) -> bool:
+        return need_id in self.offsets
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @property
+    def decoded(self) -> int:
+        """
+        Number of needs decoded so far.
+        """
+        return len(self._decoded)
+
+    def need_type(self, need_id: str) -> Optional[str]:
+        return self.offsets[need_id][2]
+
+    def ids_of_type(self, need_type: str) -> List[str]:
+        return [need_id for need_id, entry in self.offsets.items() if entry[2] == need_type]
+
+    def subset(self, keep: Callable[[Optional[str]], bool]) -> "LazyNeeds":
+        """
+        View on the needs whose type is accepted by keep, without decoding them.
+        """
+        offsets = {need_id: entry for need_id, entry in self.offsets.items() if keep(entry[2])}
+        return LazyNeeds(self.input_path, offsets, self._map, self._decoded)
+
+    def close(self) -> None:
+        """
+        Close the memory map, shared with all subsets of the same export.
+        """
+        self._map.close()
+
+    def __enter__(self) -> "LazyNeeds":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,236 @@
+"""
+Incremental reader for sphinx-needs exports (needs.json).
+
+Instead of loading the whole export with json.load, the file is read in chunks
+and walked event by event down to versions[current_version].needs. Each need
+is decoded on its own, checked against a filter and reduced to the fields the
+generators read, so peak memory only depends on the largest single need and
+the kept elements, not on the size of the export.
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO
+
+chunk_size : int = 1 << 20
+
+_whitespace : str = " \t\n\r"
+
+
+class _JsonStream:
+    """
+    Minimal pull parser on top of json.JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, infile: TextIO, read_size: int = chunk_size) -> None:
+        self.infile = infile
+        self.read_size = read_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.infile.read(self.read_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """
+        Skip whitespace and return the next character, '' at the end of the file.
+        """
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _whitespace:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' but found '{found}' in JSON stream.")
+        self.pos += 1
+
+    def read_value(self) -> Any:
+        """
+        Decode the next complete JSON value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # a number at the end of the buffer may continue in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def read_key(self) -> str:
+        key = self.read_value()
+        if not isinstance(key, str):
+            raise ValueError("Expected an object key in JSON stream.")
+        self.expect(":")
+        return key
+
+    def iter_object(self) -> Iterator[str]:
+        """
+        Yield the keys of the next object. The caller consumes each value.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_key()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def skip_value(self) -> None:
+        """
+        Skip the next value without materializing it as a whole.
+        """
+        char = self.peek()
+        if char == "{":
+            for _ in self.iter_object():
+                self.skip_value()
+        elif char == "[":
+            self.pos += 1
+            if self.peek() == "]":
+                self.pos += 1
+                return
+            while True:
+                self.skip_value()
+                if self.peek() == ",":
+                    self.pos += 1
+                    continue
+                self.expect("]")
+                return
+        else:
+            self.read_value()
+
+
+def _read_needs(stream: _JsonStream,
+                keep: Callable[[Dict[str, Any]], bool],
+                fields: Optional[frozenset]) -> Dict[str, Any]:
+    needs = {}
+    for need_id in stream.iter_object():
+        need = stream.read_value()
+        if not isinstance(need, dict) or not keep(need):
+            continue
+        if fields is not None:
+            need = {k: v for k, v in need.items() if k in fields}
+        needs[need_id] = need
+    return needs
+
+
+def _read_version(stream: _JsonStream,
+                  keep: Callable[[Dict[str, Any]], bool],
+                  fields: Optional[frozenset]) -> Dict[str, Any]:
+    needs = {}
+    for key in stream.iter_object():
+        if key == "needs":
+            needs = _read_needs(stream, keep, fields)
+        else:
+            stream.skip_value()
+    return needs
+
+
+def stream_needs_from_json(input_path: Path,
+                           keep: Callable[[Dict[str, Any]], bool] = lambda need: True,
+                           fields: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Read the 'needs' section of the current version from a needs.json file.
+
+    Only needs accepted by keep are returned, reduced to the given fields.
+    Needs of other versions are decoded one by one and dropped again.
+    """
+    fields = frozenset(fields) if fields is not None else None
+    current_version = None
+    # needs per version, only collected while current_version is not known yet
+    candidates: Dict[str, Dict[str, Any]] = {}
+    needs: Dict[str, Any] = {}
+
+    with open(input_path, "r", encoding="utf-8") as infile:
+        stream = _JsonStream(infile)
+        for key in stream.iter_object():
+            if key == "current_version":
+                current_version = stream.read_value()
+            elif key == "versions":
+                for version in stream.iter_object():
+                    if current_version is None:
+                        candidates[version] = _read_version(stream, keep, fields)
+                    elif version == current_version:
+                        needs = _read_version(stream, keep, fields)
+                    else:
+                        _read_version(stream, lambda need: False, None)
+            else:
+                stream.skip_value()
+
+    if current_version in candidates:
+        needs = candidates[current_version]
+    return needs
+
+
+def stream_versions_from_json(input_path: Path,
+                              versions: Optional[Iterable[str]] = None,
+                              keep: Callable[[Dict[str, Any]], bool] = lambda need: True,
+                              fields: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the 'needs' sections of several versions from a needs.json file in one pass.
+
+    Without versions, all versions of the export are read, in the order of the file.
+    """
+    fields = frozenset(fields) if fields is not None else None
+    selected = frozenset(versions) if versions is not None else None
+    needs_per_version: Dict[str, Dict[str, Any]] = {}
+
+    with open(input_path, "r", encoding="utf-8") as infile:
+        stream = _JsonStream(infile)
+        for key in stream.iter_object():
+            if key == "versions":
+                for version in stream.iter_object():
+                    if selected is None or version in selected:
+                        needs_per_version[version] = _read_version(stream, keep, fields)
+                    else:
+                        stream.skip_value()
+            else:
+                stream.skip_value()
+
+    if selected is not None:
+        missing = sorted(selected - needs_per_version.keys())
+        if missing:
+            raise ValueError(f"Versions {', '.join(missing)} not found in {input_path}.")
+    return needs_per_version
+
+
+def extract_needs_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extract the needs of the current version from an already parsed export.
+    """
+    current_version = data.get("current_version", {})
+    versions = data.get("versions", {})
+    current_version_data = versions.get(current_version, {})
+    needs = current_version_data.get("needs", {})
+    return needs
+
+
+def is_metamodel_need(need: Dict[str, Any]) -> bool:
+    """
+    True for the metamodel elements (sn_type, sn_option, ...).
+    """
+    return str(need.get("type", "")).startswith("sn_")
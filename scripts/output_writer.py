@@ -0,0 +1,109 @@
+"""
+Writing of generated outputs.
+
+Outputs are only replaced when their content changed, so unchanged files keep
+their mtime and downstream Sphinx projects do not rebuild. New content is
+written to a temporary file next to the target and moved in place atomically.
+The temporary file gets the mode of the replaced file, or the mode the umask
+gives new files, instead of the 0600 of tempfile.mkstemp.
+"""
+
+import filecmp
+import os
+import stat
+import tempfile
+from pathlib import Path
+from typing import Any, Iterable, Optional, TextIO
+
+# read once, setting the umask to read it is not thread safe
+_umask : int = os.umask(0)
+os.umask(_umask)
+
+
+def _target_mode(path: Path) -> int:
+    try:
+        return stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        return 0o666 & ~_umask
+
+
+def write_if_changed(path: Path, text: str) -> bool:
+    """
+    Atomically write text to path, unless the file already holds the same bytes.
+
+    Returns True if the file was written.
+    """
+    return write_bytes_if_changed(path, text.encode("utf-8"))
+
+
+def write_bytes_if_changed(path: Path, data: bytes) -> bool:
+    """
+    Atomically write data to path, unless the file already holds the same bytes.
+
+    Returns True if the file was written.
+    """
+    path = Path(path)
+    try:
+        if path.read_bytes() == data:
+            return False
+    except FileNotFoundError:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.chmod(tmp_name, _target_mode(path))
+        os.replace(tmp_name, path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+    return True
+
+
+class ChangedFile:
+    """
+    Text stream to a temporary file, moved to path on exit unless the file
+    already holds the same bytes. Nothing is written if the block fails.
+
+    After the block, written tells whether path was replaced.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.written = False
+
+    def __enter__(self) -> TextIO:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_name = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp")
+        self.tmp_file = os.fdopen(fd, "w", encoding="utf-8", newline="")
+        return self.tmp_file
+
+    def __exit__(self, exc_type: Optional[type], exc: Optional[BaseException], tb: Any) -> None:
+        try:
+            self.tmp_file.close()
+            if exc_type is None:
+                if self.path.is_file() and filecmp.cmp(self.tmp_name, self.path, shallow=False):
+                    os.unlink(self.tmp_name)
+                else:
+                    os.chmod(self.tmp_name, _target_mode(self.path))
+                    os.replace(self.tmp_name, self.path)
+                    self.written = True
+        finally:
+            if os.path.exists(self.tmp_name):
+                os.unlink(self.tmp_name)
+
+
+def write_chunks_if_changed(path: Path, chunks: Iterable[str]) -> bool:
+    """
+    Stream chunks of text to a temporary file and move it to path, unless the
+    file already holds the same bytes.
+
+    Returns True if the file was written.
+    """
+    changed_file = ChangedFile(path)
+    with changed_file as outfile:
+        for chunk in chunks:
+            outfile.write(chunk)
+    return changed_file.written
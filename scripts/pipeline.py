@@ -0,0 +1,136 @@
+# usage:
+# python ./scripts/pipeline.py -i ./use_datamodel/needs.json -o ./use_datamodel/output2.txt
+# python ./scripts/pipeline.py -i ./use_datamodel/basic_needs.json -o ./use_datamodel/output.txt --emit basic
+
+"""
+All outputs of an export from one load.
+
+The export is parsed once, with the union of the fields the selected
+emitters read, and the metamodel elements are indexed once. Each registered
+emitter then writes its output from this shared input:
+- conf: the sphinx-needs config block for conf.py (as json2conf.py),
+- toml: the same config values as [needs] tables for a project TOML file,
+- schema: the schema document (as json2conf.py),
+- basic: the config of the basic flavor, sn_attributes and sn_links of
+  plain needs (as basic_json2conf.py).
+Unchanged outputs are not touched.
+"""
+
+import argparse
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import basic_json2conf
+import json2conf
+import json_io
+from dict2toml import tables_to_toml
+from instrumentation import Profiler
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json, is_metamodel_need
+from output_writer import write_chunks_if_changed
+from rst_metamodel import read_rst_metamodel
+
+
+class PipelineInput:
+    """
+    The export loaded once, with the values shared by several emitters built on first use.
+    """
+
+    def __init__(self, needs: Dict[str, Any], compact: bool = False) -> None:
+        self.needs = needs
+        self.compact = compact
+        self._index: Optional[MetamodelIndex] = None
+        self._config: Optional[Dict[str, List[Dict[str, Any]]]] = None
+
+    @property
+    def index(self) -> MetamodelIndex:
+        if self._index is None:
+            metamodel = {need_id: need for need_id, need in self.needs.items() if is_metamodel_need(need)}
+            self._index = MetamodelIndex(needs2records(metamodel))
+        return self._index
+
+    @property
+    def config(self) -> Dict[str, List[Dict[str, Any]]]:
+        if self._config is None:
+            self._config = json2conf.index2config(self.index)
+        return self._config
+
+
+class Emitter(NamedTuple):
+    # output path derived from the -o path
+    output: Callable[[Path], Path]
+    # fields of the needs read by the emitter
+    fields: List[str]
+    # True if only the metamodel elements (sn_*) are read
+    metamodel_only: bool
+    emit: Callable[[PipelineInput], Iterable[str]]
+
+
+def emit_toml(data: PipelineInput) -> Iterable[str]:
+    # the config values without the needs_ prefix, as sphinx-needs reads them from [needs]
+    values = {name[len("needs_"):]: elements for name, elements in data.config.items()}
+    return [tables_to_toml("needs", values)]
+
+
+emitters : Dict[str, Emitter] = {
+    "conf": Emitter(lambda path: path, json2conf.metamodel_fields, True,
+                    lambda data: [json2conf.json_to_conf(data.index)]),
+    "toml": Emitter(lambda path: path.with_suffix(".toml"), json2conf.metamodel_fields, True, emit_toml),
+    "schema": Emitter(lambda path: path.with_suffix(".schema.json"), json2conf.metamodel_fields, True,
+                      lambda data: json_io.iter_dump(json2conf.json2schema(data.index), data.compact)),
+    "basic": Emitter(lambda path: path.with_suffix(".basic.txt"), basic_json2conf.basic_fields, False,
+                     lambda data: [basic_json2conf.json_to_conf(data.needs)]),
+}
+
+default_emitters : List[str] = ["conf", "toml", "schema"]
+
+
+def load(input_path: Path, selected: List[Emitter]) -> Dict[str, Any]:
+    """
+    Parse the export once, with the fields and needs all selected emitters read.
+    """
+    if input_path.suffix == ".rst":
+        return read_rst_metamodel(input_path)
+    fields = list(dict.fromkeys(field for emitter in selected for field in emitter.fields))
+    if all(emitter.metamodel_only for emitter in selected):
+        return stream_needs_from_json(input_path, keep=is_metamodel_need, fields=fields)
+    return stream_needs_from_json(input_path, fields=fields)
+
+
+def main(input_path: Path, output_path: Path, names: Optional[List[str]] = None,
+         profiler: Optional[Profiler] = None, compact: bool = False) -> Profiler:
+    """
+    Write the outputs of the named emitters, all from one load of the input.
+    """
+    profiler = profiler or Profiler()
+    names = names or default_emitters
+    unknown = [name for name in names if name not in emitters]
+    if unknown:
+        raise ValueError(f"Unknown emitters {', '.join(unknown)}, known are {', '.join(emitters)}.")
+    selected = [emitters[name] for name in names]
+
+    with profiler.span("load") as span:
+        data = PipelineInput(load(input_path, selected), compact)
+        span.count("needs", len(data.needs))
+
+    for name, emitter in zip(names, selected):
+        with profiler.span(name) as span:
+            span.count("written", write_chunks_if_changed(emitter.output(output_path), emitter.emit(data)))
+    return profiler
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Write all configuration outputs of an export from one load.")
+      parser.add_argument("-i", "--input", help="Path to the input json file, or to the index rst file of the metamodel.", required=True, type=Path)
+      parser.add_argument("-o", "--output", help="Path to the conf output, the other outputs are written next to it.", required=True, type=Path)
+      parser.add_argument("--emit", help="Emitters to run.", nargs="+", default=default_emitters, choices=list(emitters))
+      parser.add_argument("--compact", help="Write the schema without whitespace and with sorted keys.", action="store_true")
+      parser.add_argument("--profile", help="Print time and counts per stage.", action="store_true")
+      args = parser.parse_args()
+
+      try:
+          profiler = main(args.input, args.output, args.emit, compact=args.compact)
+      except ValueError as e:
+          parser.error(str(e))
+      if args.profile:
+          print(profiler.table(), end="")
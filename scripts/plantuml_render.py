@@ -0,0 +1,395 @@
+# usage:
+# python ./scripts/plantuml_render.py --plantuml "java -jar ./_tools/plantuml.jar" -c ./_build/plantuml_cache -o ./_build/uml ./diagrams/*.puml
+# as sphinx extension, in conf.py:
+#   sys.path.append(os.path.join(os.path.dirname(__file__), "..", "scripts"))
+#   extensions = [..., 'sphinxcontrib.plantuml', 'plantuml_render']
+
+"""
+Cached PlantUML rendering on long-lived PlantUML processes.
+
+sphinxcontrib.plantuml starts one JVM per diagram, and the metamodel
+documentation has needflow and needarch diagrams per typegroup. Here the
+rendered image is stored under a hash of the PlantUML source, the output
+format, the command and the size and modification time of the files it
+runs (the PlantUML jar), so unchanged diagrams are read from the cache, also
+in a fresh output folder. The errors of failing diagrams are cached as well. Cache misses are written to PlantUML processes in
+pipe mode (-pipe), which stay alive and render one diagram after the other,
+so the JVM starts once per process instead of once per diagram. A diagram
+PlantUML does not finish within the timeout (plantuml_pipe_timeout) stops its
+process and is left to sphinxcontrib.plantuml.
+
+As sphinx extension, the diagrams of sphinxcontrib.plantuml are rendered this
+way, with the plantuml command of conf.py. Each sphinx worker process keeps
+its own PlantUML processes (plantuml_pipe_processes, 0 leaves all rendering
+to sphinxcontrib.plantuml). The cache folder is set with plantuml_cache_dir,
+by default the plantuml cache in the output folder.
+Diagrams with includes and failing diagrams are left to sphinxcontrib.plantuml,
+for a cached error without starting a pipe process first.
+"""
+
+import argparse
+import atexit
+import hashlib
+import os
+import queue
+import shlex
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from output_writer import write_bytes_if_changed
+
+# line written by PlantUML after each image in pipe mode
+pipe_delimiter : str = "__plantuml_render_end__"
+
+# output format arguments, as sphinxcontrib.plantuml passes them
+format_arguments : Dict[str, str] = {
+    "eps": "-teps",
+    "png": "-tpng",
+    "svg": "-tsvg",
+    "txt": "-ttxt",
+    "latex": "-tlatex:nopreamble",
+}
+
+# seconds a pipe process may take for one diagram, e.g. a @startuml without @enduml never ends
+render_timeout_s : float = 60.0
+
+# bump when the layout of the cache folder changes
+cache_format : int = 2
+
+
+def plantuml_command(plantuml: Union[str, List[str]]) -> List[str]:
+    """
+    Command of the plantuml config value, as sphinxcontrib.plantuml splits it.
+    """
+    return shlex.split(plantuml) if isinstance(plantuml, str) else list(plantuml)
+
+
+def command_stamp(command: List[str]) -> str:
+    """
+    Size and modification time of the files the command runs: the program and
+    file arguments like the PlantUML jar, so an updated PlantUML renders again.
+    """
+    stamps = []
+    for i, argument in enumerate(command):
+        path = shutil.which(argument) if i == 0 else argument
+        if path is not None and os.path.isfile(path):
+            stat = os.stat(path)
+            stamps.append(f"{argument}:{stat.st_size}:{stat.st_mtime_ns}")
+    return " ".join(stamps)
+
+
+def with_start_end(source: str) -> str:
+    """
+    The PlantUML source with @startuml and @enduml, as the plantuml directive adds them.
+    """
+    if not source.lstrip().startswith("@start"):
+        source = "@startuml\n" + source + "\n@enduml"
+    return source
+
+
+class DiagramError(RuntimeError):
+    """
+    PlantUML reported an error in the diagram source, it fails on every run.
+    """
+
+
+class PipeProcess:
+    """
+    A PlantUML process in pipe mode, rendering one diagram per call.
+    """
+
+    def __init__(self, command: List[str], fileformat: str, timeout_s: float = render_timeout_s) -> None:
+        self.fileformat = fileformat
+        self.timeout_s = timeout_s
+        self.command = command + ["-pipe", "-pipeNoStderr", "-pipedelimitor", pipe_delimiter,
+                                  format_arguments.get(fileformat, f"-t{fileformat}"), "-charset", "utf-8"]
+        self.process: Optional[subprocess.Popen] = None
+        # lines of the process output, read by a thread so that reading has a deadline
+        self.lines: queue.Queue = queue.Queue()
+        self.started = 0
+
+    def _start(self) -> subprocess.Popen:
+        if self.process is None or self.process.poll() is not None:
+            try:
+                self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                stderr=subprocess.DEVNULL)
+            except OSError as e:
+                raise RuntimeError(f"PlantUML command {shlex.join(self.command)} cannot be run: {e}") from e
+            self.lines = queue.Queue()
+            threading.Thread(target=self._read, args=(self.process.stdout, self.lines), daemon=True).start()
+            self.started += 1
+        return self.process
+
+    @staticmethod
+    def _read(stdout: Any, lines: queue.Queue) -> None:
+        # selectors do not support pipes on Windows, a thread does
+        for line in iter(stdout.readline, b""):
+            lines.put(line)
+        lines.put(b"")
+
+    def render(self, source: str) -> bytes:
+        process = self._start()
+        try:
+            process.stdin.write((with_start_end(source) + "\n").encode("utf-8"))
+            process.stdin.flush()
+        except OSError as e:
+            self.close()
+            raise RuntimeError(f"PlantUML process stopped: {e}") from e
+
+        delimiter = pipe_delimiter.encode("utf-8")
+        deadline = time.monotonic() + self.timeout_s
+        lines = []
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self.close(kill=True)
+                raise RuntimeError(f"PlantUML did not finish the diagram within {self.timeout_s:g} s.") from None
+            if not line:
+                self.close()
+                raise RuntimeError(f"PlantUML process stopped with exit code {process.poll()}.")
+            if line.rstrip(b"\r\n") == delimiter:
+                break
+            lines.append(line)
+        output = b"".join(lines)
+
+        # with -pipeNoStderr a syntax error is reported before the error image
+        if output.startswith(b"ERROR"):
+            report = output.split(b"\n", 3)
+            line_number = report[1].decode("utf-8", "replace").strip() if len(report) > 1 else "?"
+            message = report[2].decode("utf-8", "replace").strip() if len(report) > 2 else ""
+            raise DiagramError(f"PlantUML error in line {line_number}: {message}")
+        return output
+
+    def close(self, kill: bool = False) -> None:
+        if self.process is None:
+            return
+        if kill:
+            self.process.kill()
+            self.process.wait()
+        elif self.process.poll() is None:
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=10)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+                self.process.wait()
+        self.process = None
+
+
+class PlantumlRenderer:
+    """
+    Renderer with an on-disk cache in front of a pool of PlantUML pipe processes.
+
+    Without a cache folder, images are only kept in memory. Processes are
+    started on the first cache miss that needs them.
+    """
+
+    def __init__(self, plantuml: Union[str, List[str]], cache_dir: Optional[Path] = None,
+                 processes: int = 1, timeout_s: float = render_timeout_s) -> None:
+        self.command = plantuml_command(plantuml)
+        self.stamp = command_stamp(self.command)
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.processes = max(1, processes)
+        self.timeout_s = timeout_s
+        self.memory: Dict[str, bytes] = {}
+        # error messages of failing diagrams
+        self.errors: Dict[str, str] = {}
+        # idle pipe processes per output format
+        self.idle: Dict[str, queue.LifoQueue] = {}
+        self.pool: List[PipeProcess] = []
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: str, fileformat: str) -> str:
+        text = "\0".join([str(cache_format), shlex.join(self.command), self.stamp, fileformat,
+                          with_start_end(source)])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def cache_path(self, key: str, fileformat: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / key[:2] / f"{key}.{fileformat}"
+
+    def error_path(self, key: str) -> Optional[Path]:
+        if self.cache_dir is None:
+            return None
+        return self.cache_dir / key[:2] / f"{key}.error"
+
+    def cached_error(self, key: str) -> Optional[str]:
+        if key in self.errors:
+            return self.errors[key]
+        path = self.error_path(key)
+        if path is not None and path.exists():
+            self.errors[key] = path.read_text(encoding="utf-8")
+            return self.errors[key]
+        return None
+
+    def cached(self, key: str, fileformat: str) -> Optional[bytes]:
+        if key in self.memory:
+            return self.memory[key]
+        path = self.cache_path(key, fileformat)
+        if path is not None and path.exists():
+            self.memory[key] = path.read_bytes()
+            return self.memory[key]
+        return None
+
+    def _acquire(self, fileformat: str) -> PipeProcess:
+        with self.lock:
+            idle = self.idle.setdefault(fileformat, queue.LifoQueue())
+            if idle.empty() and sum(p.fileformat == fileformat for p in self.pool) < self.processes:
+                process = PipeProcess(self.command, fileformat, self.timeout_s)
+                self.pool.append(process)
+                return process
+        return idle.get()
+
+    def render(self, source: str, fileformat: str = "svg") -> bytes:
+        """
+        The image of the PlantUML source, from the cache or rendered by a pipe process.
+        Raises DiagramError for a failing diagram, also when the error is cached.
+        """
+        key = self.key(source, fileformat)
+        image = self.cached(key, fileformat)
+        error = self.cached_error(key) if image is None else None
+        if image is not None or error is not None:
+            with self.lock:
+                self.hits += 1
+            if error is not None:
+                raise DiagramError(error)
+            return image
+
+        process = self._acquire(fileformat)
+        try:
+            image = process.render(source)
+        except DiagramError as e:
+            with self.lock:
+                self.misses += 1
+                self.errors[key] = str(e)
+            path = self.error_path(key)
+            if path is not None:
+                write_bytes_if_changed(path, str(e).encode("utf-8"))
+            raise
+        finally:
+            self.idle[fileformat].put(process)
+
+        with self.lock:
+            self.misses += 1
+            self.memory[key] = image
+        path = self.cache_path(key, fileformat)
+        if path is not None:
+            # atomic, concurrent builds never read half written images
+            write_bytes_if_changed(path, image)
+        return image
+
+    def render_file(self, source: str, fileformat: str = "svg") -> Path:
+        """
+        Path of the cached image of the PlantUML source, rendered on a cache miss.
+        """
+        key = self.key(source, fileformat)
+        path = self.cache_path(key, fileformat)
+        if path is None:
+            raise ValueError("Rendering to files needs a cache folder.")
+        self.render(source, fileformat)
+        return path
+
+    def render_many(self, sources: List[str], fileformat: str = "svg") -> List[bytes]:
+        """
+        Images of several sources, the cache misses spread over the process pool.
+        """
+        unique = list(dict.fromkeys(sources))
+        with ThreadPoolExecutor(max_workers=self.processes) as executor:
+            images = dict(zip(unique, executor.map(lambda source: self.render(source, fileformat), unique)))
+        return [images[source] for source in sources]
+
+    def close(self) -> None:
+        for process in self.pool:
+            process.close()
+        self.pool = []
+        self.idle = {}
+
+
+# one renderer per process, sphinx workers fork after the setup
+_renderers : Dict[Tuple[int, str, str], PlantumlRenderer] = {}
+
+
+def process_renderer(plantuml: Union[str, List[str]], cache_dir: Path, processes: int = 1,
+                     timeout_s: float = render_timeout_s) -> PlantumlRenderer:
+    """
+    The renderer of the current process for the command and cache folder.
+    """
+    key = (os.getpid(), shlex.join(plantuml_command(plantuml)), str(cache_dir))
+    if key not in _renderers:
+        _renderers[key] = PlantumlRenderer(plantuml, cache_dir, processes, timeout_s)
+        atexit.register(_renderers[key].close)
+    return _renderers[key]
+
+
+def _on_builder_inited(app: Any) -> None:
+    if app.config.plantuml_pipe_processes < 1:
+        return
+    plantuml_builder = app.builder.plantuml_builder
+    fallback = plantuml_builder.render
+    cache_dir = Path(app.config.plantuml_cache_dir or plantuml_builder.cache_dir)
+
+    def render(node: Any, fileformat: str) -> str:
+        source = node["uml"]
+        # includes are resolved relative to the document, a shared pipe process has one cwd
+        if "!include" in source or "%filename" in source:
+            return fallback(node, fileformat)
+        renderer = process_renderer(app.config.plantuml, cache_dir, app.config.plantuml_pipe_processes,
+                                    app.config.plantuml_pipe_timeout)
+        try:
+            return str(renderer.render_file(source, fileformat))
+        except RuntimeError:
+            # reported (or drawn as error image) by sphinxcontrib.plantuml itself
+            return fallback(node, fileformat)
+
+    plantuml_builder.render = render
+
+
+def _on_build_finished(app: Any, exception: Optional[Exception]) -> None:
+    for renderer in _renderers.values():
+        renderer.close()
+
+
+def setup(app: Any) -> Dict[str, Any]:
+    """
+    Sphinx extension rendering the diagrams of sphinxcontrib.plantuml with the cache and pipe processes.
+    """
+    app.setup_extension("sphinxcontrib.plantuml")
+    app.add_config_value("plantuml_cache_dir", "", "")
+    app.add_config_value("plantuml_pipe_processes", 1, "")
+    app.add_config_value("plantuml_pipe_timeout", render_timeout_s, "")
+    # after sphinxcontrib.plantuml created its builder
+    app.connect("builder-inited", _on_builder_inited, priority=600)
+    app.connect("build-finished", _on_build_finished)
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Render PlantUML files with a cache and long-lived PlantUML processes.")
+      parser.add_argument("inputs", help="PlantUML source files.", nargs="+", type=Path)
+      parser.add_argument("--plantuml", help="Command to run PlantUML.", default="java -jar ./_tools/plantuml.jar")
+      parser.add_argument("-c", "--cache", help="Path to the cache folder.", default=None, type=Path)
+      parser.add_argument("-o", "--output", help="Folder of the rendered images.", required=True, type=Path)
+      parser.add_argument("-t", "--format", help="Output format.", default="svg")
+      parser.add_argument("-j", "--jobs", help="Number of PlantUML processes.", default=1, type=int)
+      parser.add_argument("--timeout", help="Seconds a PlantUML process may take for one diagram.", default=render_timeout_s, type=float)
+      args = parser.parse_args()
+
+      renderer = PlantumlRenderer(args.plantuml, args.cache, args.jobs, args.timeout)
+      try:
+          sources = [path.read_text(encoding="utf-8") for path in args.inputs]
+          images = renderer.render_many(sources, args.format)
+      except RuntimeError as e:
+          parser.error(str(e))
+      finally:
+          renderer.close()
+      for path, image in zip(args.inputs, images):
+          write_bytes_if_changed(args.output / path.with_suffix(f".{args.format}").name, image)
+      print(f"{len(images)} diagrams, {renderer.hits} from the cache, {renderer.misses} rendered")
@@ -0,0 +1,376 @@
+# usage:
+# python ./scripts/rst_metamodel.py -i ./metamodel/index.rst -o ./metamodel/_build/needs/needs.json
+# python ./scripts/json2conf.py -i ./metamodel/index.rst -o ./use_datamodel/output2.txt
+
+"""
+Front-end reading the metamodel elements directly from the rst sources.
+
+The generators need the elements as exported by a sphinx-needs build,
+including back-links like groups_back and parent_needs_back. A full build
+of the metamodel also renders its needflow, needarch and PlantUML diagrams,
+which the conversion never uses. This front-end scans the index document,
+the documents it includes or lists in a toctree, for the need directives
+of the metamodel (sn_type, sn_typegroup, sn_option, sn_link,
+sn_association) and the list2need directives with their
+((option="value", ...)) entries. Needs nested in the content of a need, and
+list2need items nested in an item, get it as parent need. The back-links of
+all link options and of the parent relation are computed afterwards.
+
+The need types, extra options and extra links are read from the conf.py next
+to the index document without executing it, so every need gets the same
+empty defaults as in the export. Roles, substitutions and jinja content are
+not evaluated.
+"""
+
+import argparse
+import ast
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from metamodel_records import record_types
+
+# conf.py values read by the front-end
+conf_names : Tuple[str, ...] = ("needs_types", "needs_extra_options", "needs_extra_links", "version")
+
+# directives whose content is not rst, nested directives in there are not needs
+literal_directives : Set[str] = {
+    "code", "code-block", "sourcecode", "literalinclude", "raw", "math",
+    "needarch", "needuml", "uml", "plantuml", "graphviz",
+}
+
+_directive_re = re.compile(r"^(?P<indent>\s*)\.\.\s+(?P<name>[\w:-]+)::\s*(?P<argument>.*)$")
+_explicit_markup_re = re.compile(r"^\s*\.\.(\s|$)")
+_option_re = re.compile(r"^\s*:(?P<name>[^:\s][^:]*):(?:\s+(?P<value>.*))?$")
+_bullet_re = re.compile(r"^(?P<indent>\s*)[*+-]\s+(?P<text>.*)$")
+_item_options_re = re.compile(r"\(\((?P<options>.*?)\)\)", re.DOTALL)
+_item_option_re = re.compile(r'(?P<name>[\w-]+)\s*=\s*"(?P<value>(?:[^"\\]|\\.)*)"')
+_item_id_re = re.compile(r"^\s*\((?P<id>[^)\s]+)\)\s*")
+_link_split_re = re.compile(r"[\s,;|]+")
+
+
+class Line(NamedTuple):
+    docname: str
+    lineno: int
+    text: str
+
+
+class RstProject:
+    """
+    Need types, extra options and extra links of the metamodel project.
+    """
+
+    def __init__(self, conf: Dict[str, Any]) -> None:
+        self.directives = [t["directive"] for t in conf.get("needs_types", []) if "directive" in t] \
+            or list(record_types)
+        self.extra_options = [o if isinstance(o, str) else o["name"] for o in conf.get("needs_extra_options", [])]
+        self.link_options = [link["option"] for link in conf.get("needs_extra_links", [])]
+        self.version = str(conf.get("version", ""))
+
+    @classmethod
+    def from_conf(cls, conf_path: Optional[Path]) -> "RstProject":
+        if conf_path is None or not conf_path.exists():
+            # without a conf.py, the fields the generators read
+            fields = {field for record_type in record_types.values() for field in record_type.fields}
+            links = {field for record_type in record_types.values() for field in record_type.ref_fields}
+            links -= {"groups_back", "parent_needs_back"}
+            return cls({
+                "needs_extra_options": sorted(fields - links - {"id", "type", "title", "style"}),
+                "needs_extra_links": [{"option": option} for option in sorted(links)],
+            })
+        return cls(read_conf(conf_path))
+
+
+def _conf_value(node: ast.AST) -> Any:
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == "dict" and not node.args:
+        return {keyword.arg: _conf_value(keyword.value) for keyword in node.keywords}
+    if isinstance(node, (ast.List, ast.Tuple)):
+        return [_conf_value(element) for element in node.elts]
+    if isinstance(node, ast.Dict):
+        return {_conf_value(key): _conf_value(value) for key, value in zip(node.keys, node.values)}
+    return ast.literal_eval(node)
+
+
+def read_conf(conf_path: Path) -> Dict[str, Any]:
+    """
+    Literal values of the conf_names assigned in a conf.py, which is parsed but not executed.
+    """
+    conf: Dict[str, Any] = {}
+    tree = ast.parse(conf_path.read_text(encoding="utf-8"), str(conf_path))
+    for statement in tree.body:
+        if not isinstance(statement, ast.Assign):
+            continue
+        for target in statement.targets:
+            if isinstance(target, ast.Name) and target.id in conf_names:
+                try:
+                    conf[target.id] = _conf_value(statement.value)
+                except ValueError:
+                    pass
+    return conf
+
+
+def _indent(text: str) -> int:
+    return len(text) - len(text.lstrip())
+
+
+def read_lines(path: Path, srcdir: Path, indent: str = "", including: Tuple[Path, ...] = ()) -> List[Line]:
+    """
+    Lines of a document with the include directives replaced by the included lines.
+    """
+    path = path.resolve()
+    if path in including:
+        raise ValueError(f"{path} includes itself.")
+    docname = path.relative_to(srcdir).with_suffix("").as_posix() if path.is_relative_to(srcdir) else str(path)
+    lines: List[Line] = []
+    with open(path, "r", encoding="utf-8-sig") as infile:
+        for lineno, text in enumerate(infile, 1):
+            text = text.rstrip("\r\n").expandtabs(8)
+            match = _directive_re.match(text)
+            if match and match["name"] == "include":
+                include = match["argument"].strip()
+                include_path = srcdir / include.lstrip("/") if include.startswith("/") else path.parent / include
+                lines += read_lines(include_path, srcdir, indent + match["indent"], (*including, path))
+            else:
+                lines.append(Line(docname, lineno, indent + text if text else text))
+    return lines
+
+
+def _block_end(lines: List[Line], start: int, end: int, indent: int) -> int:
+    """
+    End of the block starting at start: the next line not indented deeper than indent.
+    """
+    i = start + 1
+    while i < end and (not lines[i].text.strip() or _indent(lines[i].text) > indent):
+        i += 1
+    return i
+
+
+def _split_links(value: str) -> List[str]:
+    return [target for target in _link_split_re.split(value) if target]
+
+
+class RstReader:
+    """
+    Needs of the documents read so far, in document order.
+    """
+
+    def __init__(self, project: RstProject, srcdir: Path) -> None:
+        self.project = project
+        self.srcdir = srcdir
+        self.directives = set(project.directives)
+        self.link_options = set(project.link_options)
+        self.needs: Dict[str, Dict[str, Any]] = {}
+        self.toctree: List[Path] = []
+
+    def add_need(self, line: Line, need_type: str, need_id: Optional[str], title: str,
+                 options: Dict[str, str], parent: Optional[str]) -> str:
+        where = f"{line.docname}:{line.lineno}"
+        if not need_id:
+            raise ValueError(f"{where}: {need_type} '{title}' has no id.")
+        if need_id in self.needs:
+            raise ValueError(f"{where}: duplicate need id {need_id}.")
+
+        need: Dict[str, Any] = {"id": need_id, "type": need_type, "title": title, "style": None}
+        for name in self.project.extra_options:
+            need[name] = ""
+        for name in self.project.link_options:
+            need[name] = []
+            need[name + "_back"] = []
+        for name, value in options.items():
+            need[name] = _split_links(value) if name in self.link_options or name == "tags" else value
+        need.update({
+            "docname": line.docname,
+            "lineno": line.lineno,
+            "parent_need": parent,
+            "parent_needs": [parent] if parent else [],
+            "parent_needs_back": [],
+        })
+        self.needs[need_id] = need
+        return need_id
+
+    def read_block(self, lines: List[Line], start: int, end: int, parent: Optional[str]) -> None:
+        """
+        Find the needs between start and end, they get parent as parent need.
+        """
+        i = start
+        while i < end:
+            text = lines[i].text
+            match = _directive_re.match(text)
+            if match is None:
+                if _explicit_markup_re.match(text):
+                    # comment, target or substitution definition, Sphinx reads no needs from its body
+                    i = _block_end(lines, i, end, _indent(text))
+                elif text.rstrip().endswith("::"):
+                    # literal block
+                    i = _block_end(lines, i, end, _indent(text))
+                else:
+                    i += 1
+                continue
+
+            indent = len(match["indent"])
+            block_end = _block_end(lines, i, end, indent)
+            options, content = self.read_options(lines, i + 1, block_end)
+            name = match["name"]
+            if name in self.directives:
+                need_id = self.add_need(lines[i], name, options.pop("id", None),
+                                        match["argument"].strip(), options, parent)
+                self.read_block(lines, content, block_end, need_id)
+            elif name == "list2need":
+                self.read_list2need(lines, i, options, content, block_end, parent)
+            elif name == "toctree":
+                self.read_toctree(lines[i], options, lines[content:block_end])
+            elif name not in literal_directives:
+                self.read_block(lines, content, block_end, parent)
+            i = block_end
+
+    def read_options(self, lines: List[Line], start: int, end: int) -> Tuple[Dict[str, str], int]:
+        """
+        Options of a directive and the start of its content.
+        """
+        options: Dict[str, str] = {}
+        i = start
+        while i < end:
+            match = _option_re.match(lines[i].text)
+            if match is None:
+                break
+            name, value = match["name"], match["value"] or ""
+            option_indent = _indent(lines[i].text)
+            i += 1
+            # continuation lines of the option value
+            while i < end and lines[i].text.strip() and _indent(lines[i].text) > option_indent \
+                    and not _option_re.match(lines[i].text):
+                value += " " + lines[i].text.strip()
+                i += 1
+            options[name] = value.strip()
+        return options, i
+
+    def read_list2need(self, lines: List[Line], start: int, options: Dict[str, str],
+                       content: int, end: int, parent: Optional[str]) -> None:
+        """
+        Needs of the bullet list of a list2need directive, nested items get the item above as parent.
+        """
+        where = f"{lines[start].docname}:{lines[start].lineno}"
+        types = [t.strip() for t in options.get("types", "").split(",") if t.strip()]
+        delimiter = options.get("delimiter", ".")
+
+        # (indent of the bullet, need id) of the items above the current one
+        stack: List[Tuple[int, Optional[str]]] = []
+        i = content
+        while i < end:
+            match = _bullet_re.match(lines[i].text)
+            if match is None:
+                i += 1
+                continue
+            indent = len(match["indent"])
+            item_end = i + 1
+            # the item text continues on lines indented deeper than its bullet, up to a nested item
+            while item_end < end and (not lines[item_end].text.strip() or _indent(lines[item_end].text) > indent) \
+                    and not _bullet_re.match(lines[item_end].text):
+                item_end += 1
+            text = "\n".join([match["text"], *(line.text.strip() for line in lines[i + 1:item_end])])
+
+            while stack and stack[-1][0] >= indent:
+                stack.pop()
+            level = len(stack)
+            if level >= len(types):
+                raise ValueError(f"{where}: list2need has no type for level {level + 1}.")
+
+            item_options = {}
+            for options_match in _item_options_re.finditer(text):
+                for option in _item_option_re.finditer(options_match["options"]):
+                    item_options[option["name"]] = option["value"].replace('\\"', '"')
+            text = _item_options_re.sub("", text)
+
+            id_match = _item_id_re.match(text)
+            need_id = id_match["id"] if id_match else None
+            text = text[id_match.end():] if id_match else text.lstrip()
+            title = text.split("\n", 1)[0].split(delimiter, 1)[0].strip()
+
+            item_parent = stack[-1][1] if stack else parent
+            need_id = self.add_need(lines[i], types[level], need_id, title, item_options, item_parent)
+            stack.append((indent, need_id))
+            i = item_end
+
+    def read_toctree(self, line: Line, options: Dict[str, str], entries: List[Line]) -> None:
+        folder = (self.srcdir / line.docname).parent
+        for entry in entries:
+            name = entry.text.strip()
+            if not name or name.startswith(":"):
+                continue
+            # "Title <docname>" entries
+            if name.endswith(">") and "<" in name:
+                name = name[name.rindex("<") + 1:-1]
+            base = self.srcdir if name.startswith("/") else folder
+            if "glob" in options and any(c in name for c in "*?["):
+                self.toctree += sorted(base.glob(name.lstrip("/") + ".rst"))
+            else:
+                self.toctree.append(base / (name.lstrip("/") + ".rst"))
+
+    def compute_back_links(self) -> None:
+        """
+        Back-links of all link options and of the parent relation, in the document order of the sources.
+        """
+        for need in self.needs.values():
+            for option in self.project.link_options:
+                for target in need.get(option, []):
+                    if target in self.needs:
+                        self.needs[target][option + "_back"].append(need["id"])
+            if need["parent_need"] in self.needs:
+                self.needs[need["parent_need"]]["parent_needs_back"].append(need["id"])
+
+
+def read_rst_metamodel(index_path: Path, conf_path: Optional[Path] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Needs of the metamodel sources below index_path, keyed and sorted by id like in the export.
+    """
+    srcdir = index_path.parent.resolve()
+    if conf_path is None:
+        conf_path = srcdir / "conf.py"
+    reader = RstReader(RstProject.from_conf(conf_path), srcdir)
+
+    pending = [index_path.resolve()]
+    read: Set[Path] = set()
+    while pending:
+        path = pending.pop(0)
+        if path in read:
+            continue
+        read.add(path)
+        lines = read_lines(path, srcdir)
+        reader.toctree = []
+        reader.read_block(lines, 0, len(lines), None)
+        pending += [p.resolve() for p in reader.toctree]
+
+    reader.compute_back_links()
+    return {need_id: reader.needs[need_id] for need_id in sorted(reader.needs)}
+
+
+def rst_export(index_path: Path, conf_path: Optional[Path] = None) -> Dict[str, Any]:
+    """
+    The needs of the metamodel sources in the layout of a needs.json export.
+    """
+    if conf_path is None:
+        conf_path = index_path.parent / "conf.py"
+    needs = read_rst_metamodel(index_path, conf_path)
+    version = RstProject.from_conf(conf_path).version
+    return {
+        "current_version": version,
+        "versions": {version: {"needs": needs, "needs_amount": len(needs)}},
+    }
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Read the metamodel elements from the rst sources into a needs.json.")
+      parser.add_argument("-i", "--input", help="Path to the index rst file of the metamodel.", required=True, type=Path)
+      parser.add_argument("-o", "--output", help="Path to the output json file.", required=True, type=Path)
+      parser.add_argument("--conf", help="Path to the conf.py of the metamodel, next to the input by default.", default=None, type=Path)
+      args = parser.parse_args()
+
+      try:
+          data = rst_export(args.input, args.conf)
+      except (OSError, ValueError) as e:
+          print(f"{args.input}: {e}", file=sys.stderr)
+          sys.exit(1)
+      args.output.parent.mkdir(parents=True, exist_ok=True)
+      with open(args.output, "w", encoding="utf-8") as outfile:
+          json.dump(data, outfile, indent=4)
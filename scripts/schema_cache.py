@@ -0,0 +1,136 @@
+"""
+On-disk cache of the generated schema fragments, one per metamodel element.
+
+Each sn_option, sn_type and sn_typegroup produces its $defs entries (and for
+types the schema entries) only from itself and the elements it references.
+The fragment is stored under a hash over the content of exactly these
+elements, so a rerun regenerates only the fragments whose inputs changed.
+"""
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from metamodel_index import MetamodelIndex
+
+from output_writer import write_if_changed
+
+import json_io
+
+# bump when the layout of the cache file changes
+cache_format : int = 1
+
+
+def element_dependencies(index: MetamodelIndex, need: Dict[str, Any]) -> List[str]:
+    """
+    Ids of all elements read while generating the fragment of the given element.
+    """
+    deps = [need["id"]]
+    deps += need.get("mandatory", [])
+    deps += need.get("optional", [])
+    deps += need.get("groups_back", [])
+    # nested typegroups add their types to the selector and their groups to the allOf
+    closure = index.typegroup_closure
+    deps += closure.types_in(need["id"])
+    deps += closure.groups_of(need["id"])
+    for child in need.get("parent_needs_back", []):
+        association = index.get(child)
+        if association is None or association.get("type") != "sn_association":
+            continue
+        deps.append(child)
+        deps += association.get("link", [])
+        for target in association.get("targets", []):
+            deps.append(target)
+            target_need = index.get(target)
+            if target_need is not None and target_need.get("type") == "sn_typegroup":
+                deps += target_need.get("groups_back", [])
+                deps += closure.types_in(target)
+    return deps
+
+
+class SchemaCache:
+    """
+    Fragments of a previous run, keyed by the hash of their inputs.
+
+    Without a path the cache is only kept in memory, next_run() then carries
+    the fragments over to the next run of a long-running process.
+    """
+
+    def __init__(self, path: Optional[Path], generator: str = "") -> None:
+        self.path = Path(path) if path is not None else None
+        # changes of the generating code invalidate all fragments
+        self.generator = generator
+        self.fragments: Dict[str, Any] = {}
+        self.used: Dict[str, Any] = {}
+        self.element_hashes: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+        if self.path is None:
+            return
+        try:
+            data = json_io.load(self.path)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("format") == cache_format and data.get("generator") == self.generator:
+            self.fragments = data.get("fragments", {})
+
+    def element_hash(self, index: MetamodelIndex, need_id: str) -> str:
+        if need_id not in self.element_hashes:
+            need = index.get(need_id)
+            content = {k: need[k] for k in need} if need is not None else None
+            text = json.dumps(content, sort_keys=True, separators=(",", ":"))
+            self.element_hashes[need_id] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return self.element_hashes[need_id]
+
+    def fragment_key(self, index: MetamodelIndex, need: Dict[str, Any]) -> str:
+        digest = hashlib.sha256()
+        for need_id in element_dependencies(index, need):
+            digest.update(need_id.encode("utf-8"))
+            digest.update(self.element_hash(index, need_id).encode("ascii"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # fragments of this run first, e.g. of an earlier version of the same export
+        fragment = self.used.get(key)
+        if fragment is None:
+            fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.used[key] = fragment
+        return fragment
+
+    def put(self, key: str, fragment: Dict[str, Any]) -> None:
+        self.used[key] = fragment
+
+    def next_index(self) -> None:
+        """
+        Forget the element hashes and counters before generating from another index.
+        The fragments of this run stay available.
+        """
+        self.element_hashes = {}
+        self.hits = 0
+        self.misses = 0
+
+    def next_run(self) -> None:
+        """
+        Keep the fragments used in this run for the next one, drop all others.
+        """
+        self.fragments, self.used = self.used, {}
+        self.next_index()
+
+    def save(self) -> bool:
+        """
+        Write the fragments used in this run, stale ones are dropped.
+        """
+        if self.path is None:
+            return False
+        data = {
+            "format": cache_format,
+            "generator": self.generator,
+            "fragments": self.used,
+        }
+        return write_if_changed(self.path, json_io.dumps(data, compact=True))
@@ -0,0 +1,173 @@
+"""
+Structural deduplication of a generated schema document.
+
+The generated schema repeats identical subschemas many times, e.g.
+{"type": "array", "items": {"type": "string"}} for every link property or
+the type test of a link target in every type linking to it. Subschemas are
+hash-consed by their canonical JSON text. A subschema found often enough
+for the $refs to be smaller than the copies they replace is hoisted into a
+shared $defs entry named after its hash. Passes repeat until nothing is
+left to share, so repeated parts of hoisted subschemas are shared as well.
+
+Only positions holding a JSON schema are rewritten (the selectors, the local
+validations and their subschemas), never the sphinx-needs network
+structure around them or keyword values like enum lists.
+"""
+
+import hashlib
+import json
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+# subschemas with a shorter canonical text are never shared
+min_shared_bytes : int = 32
+
+shared_prefix : str = "SHARED__"
+
+_ref_bytes : int = len('{"$ref":"#/$defs/' + shared_prefix + 12 * "0" + '"}')
+
+# keywords whose value is a subschema, a list or a map of subschemas
+_schema_keywords = ("items", "contains", "not", "additionalProperties", "unevaluatedProperties",
+                    "unevaluatedItems", "propertyNames", "if", "then", "else")
+_list_keywords = ("allOf", "anyOf", "oneOf", "prefixItems")
+_map_keywords = ("properties", "patternProperties", "dependentSchemas")
+
+# visitor of a subschema position: (value, replace callback)
+Position = Tuple[Any, Callable[[Any], None]]
+
+
+def _canonical(node: Any) -> str:
+    return json.dumps(node, sort_keys=True, separators=(",", ":"))
+
+
+def _setter(container: Any, key: Any) -> Callable[[Any], None]:
+    def replace(value: Any) -> None:
+        container[key] = value
+    return replace
+
+
+def _subschemas(schema: Any) -> Iterator[Position]:
+    """
+    Direct subschema positions of a subschema.
+    """
+    if not isinstance(schema, dict):
+        return
+    for key in _schema_keywords:
+        if key in schema:
+            yield schema[key], _setter(schema, key)
+    for key in _list_keywords:
+        if isinstance(schema.get(key), list):
+            for i, item in enumerate(schema[key]):
+                yield item, _setter(schema[key], i)
+    for key in _map_keywords:
+        if isinstance(schema.get(key), dict):
+            for name, item in schema[key].items():
+                yield item, _setter(schema[key], name)
+
+
+def _validation_roots(validate: Any) -> Iterator[Position]:
+    """
+    Subschema positions of a sphinx-needs validate object (local and network rules).
+    """
+    if not isinstance(validate, dict):
+        return
+    if "local" in validate:
+        yield validate["local"], _setter(validate, "local")
+    for rule in validate.get("network", {}).values():
+        if not isinstance(rule, dict):
+            continue
+        for key in ("contains", "items"):
+            yield from _validation_roots(rule.get(key))
+
+
+def _roots(document: Dict[str, Any]) -> Iterator[Position]:
+    for name, definition in document.get("$defs", {}).items():
+        yield definition, _setter(document["$defs"], name)
+    for entry in document.get("schemas", []):
+        if "select" in entry:
+            yield entry["select"], _setter(entry, "select")
+        yield from _validation_roots(entry.get("validate"))
+
+
+def _walk(node: Any, replace: Callable[[Any], None],
+          visit: Callable[[Any, Callable[[Any], None]], bool]) -> None:
+    # visit returns False to skip the subschemas of a replaced node
+    stack = [(node, replace)]
+    while stack:
+        node, replace = stack.pop()
+        if visit(node, replace):
+            stack += reversed(list(_subschemas(node)))
+
+
+def _is_candidate(node: Any) -> bool:
+    return isinstance(node, dict) and bool(node) and set(node) != {"$ref"}
+
+
+def _dedup_pass(document: Dict[str, Any], threshold: int) -> int:
+    counts: Dict[str, int] = {}
+    texts: Dict[int, str] = {}
+
+    def count(node: Any, replace: Callable[[Any], None]) -> bool:
+        if _is_candidate(node):
+            text = _canonical(node)
+            texts[id(node)] = text
+            counts[text] = counts.get(text, 0) + 1
+        return True
+
+    for root, replace in list(_roots(document)):
+        _walk(root, replace, count)
+
+    defs = document.setdefault("$defs", {})
+    # a subschema equal to a whole def refers to that def
+    named = {texts[id(definition)]: name for name, definition in defs.items() if id(definition) in texts}
+    hoisted = 0
+
+    def hoist(node: Any, replace: Callable[[Any], None]) -> bool:
+        nonlocal hoisted
+        text = texts.get(id(node))
+        if text is None or len(text) < threshold:
+            return True
+        # the copies replaced by $refs must outweigh the refs themselves
+        if (counts[text] - 1) * len(text) <= counts[text] * _ref_bytes:
+            return True
+        name = named.get(text)
+        if name is None:
+            name = named[text] = shared_prefix + hashlib.sha256(text.encode("utf-8")).hexdigest()[:12]
+            defs[name] = node
+        replace({"$ref": f"#/$defs/{name}"})
+        hoisted += 1
+        return False
+
+    roots = [position for definition in list(defs.values()) for position in _subschemas(definition)]
+    for entry in document.get("schemas", []):
+        if "select" in entry:
+            roots.append((entry["select"], _setter(entry, "select")))
+        roots += _validation_roots(entry.get("validate"))
+    for root, replace in roots:
+        _walk(root, replace, hoist)
+    return hoisted
+
+
+def dedup_schema(document: Dict[str, Any], threshold: int = min_shared_bytes) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    """
+    Copy of a schema document with repeated subschemas shared through $defs.
+
+    Returns the copy and its statistics: replaced subschemas, shared defs,
+    size before and after as pretty printed JSON.
+    """
+    text = json.dumps(document, indent=4)
+    before = len(text)
+    # the generated document may share objects with the schema cache
+    document = json.loads(text)
+    replaced = 0
+    while True:
+        hoisted = _dedup_pass(document, threshold)
+        if not hoisted:
+            break
+        replaced += hoisted
+    stats = {
+        "replaced": replaced,
+        "shared_defs": sum(1 for name in document.get("$defs", {}) if name.startswith(shared_prefix)),
+        "bytes_before": before,
+        "bytes_after": len(json.dumps(document, indent=4)),
+    }
+    return document, stats
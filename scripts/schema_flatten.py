@@ -0,0 +1,126 @@
+"""
+Flattened form of a generated schema document.
+
+Every schema entry generated by json2conf.py validates a need locally
+through allOf of $refs: to the def of its type and of each of its groups.
+Those defs in turn $ref the OPTION__* defs. Flattening resolves these chains
+at generation time:
+- Each $ref is replaced by a copy of its def.
+- An allOf of property defs under unevaluatedProperties: false is merged
+  into one subschema with the union of the properties, the union of the
+  required names and still unevaluatedProperties: false, the only closing
+  keyword sphinx-needs accepts for a local schema.
+- A property defined differently by several defs becomes the allOf of its
+  definitions.
+- The selector $refs are inlined as well.
+- Only the defs still referenced afterwards are kept.
+
+The flattened document accepts and rejects the same needs as the original.
+"""
+
+import copy
+import json
+from typing import Any, Dict, List, Optional, Set
+
+_ref_prefix : str = "#/$defs/"
+
+# keywords of the defs which can be merged into one flat subschema
+_mergeable_keys : Set[str] = {"properties", "required"}
+
+
+class _Resolver:
+    def __init__(self, defs: Dict[str, Any]) -> None:
+        self.defs = defs
+        self.resolving: List[str] = []
+        self.kept: Set[str] = set()
+
+    def inline(self, node: Any) -> Any:
+        """
+        Copy of node with all resolvable, non-recursive $refs replaced by their defs.
+        """
+        if isinstance(node, list):
+            return [self.inline(item) for item in node]
+        if not isinstance(node, dict):
+            return node
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith(_ref_prefix):
+            name = ref[len(_ref_prefix):]
+            if name in self.defs and name not in self.resolving:
+                self.resolving.append(name)
+                resolved = self.inline(self.defs[name])
+                self.resolving.pop()
+                if len(node) == 1:
+                    return resolved
+                # $ref next to other keywords, both must hold
+                rest = {k: self.inline(v) for k, v in node.items() if k != "$ref"}
+                return {"allOf": [resolved, rest]}
+            if name in self.defs:
+                self.kept.add(name)
+        return {key: self.inline(value) for key, value in node.items()}
+
+
+def _merge_properties(subschemas: List[Dict[str, Any]], closed: bool) -> Optional[Dict[str, Any]]:
+    """
+    One subschema equivalent to the allOf of property subschemas, None if not mergeable.
+    """
+    if not all(isinstance(s, dict) and set(s) <= _mergeable_keys for s in subschemas):
+        return None
+
+    definitions: Dict[str, List[Any]] = {}
+    required: List[str] = []
+    for subschema in subschemas:
+        for name, definition in subschema.get("properties", {}).items():
+            variants = definitions.setdefault(name, [])
+            if definition not in variants:
+                variants.append(definition)
+        for name in subschema.get("required", []):
+            if name not in required:
+                required.append(name)
+
+    flat: Dict[str, Any] = {
+        "properties": {name: variants[0] if len(variants) == 1 else {"allOf": variants}
+                       for name, variants in definitions.items()},
+        "required": required,
+    }
+    if closed:
+        flat["unevaluatedProperties"] = False
+    return flat
+
+
+def _flatten_local(local: Any) -> Any:
+    if not isinstance(local, dict) or set(local) - {"allOf", "unevaluatedProperties"}:
+        return local
+    if local.get("unevaluatedProperties", False) is not False:
+        return local
+    flat = _merge_properties(local.get("allOf", []), "unevaluatedProperties" in local)
+    return local if flat is None else flat
+
+
+def flatten_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Flattened copy of a schema document with "$defs" and "schemas".
+    """
+    resolver = _Resolver(schema.get("$defs", {}))
+    schemas = []
+    for entry in schema.get("schemas", []):
+        entry = resolver.inline(entry)
+        validate = entry.get("validate", {})
+        if "local" in validate:
+            validate["local"] = _flatten_local(validate["local"])
+        schemas.append(entry)
+
+    # defs still referenced, e.g. recursive ones, and everything they reference
+    defs: Dict[str, Any] = {}
+    pending = sorted(resolver.kept)
+    while pending:
+        name = pending.pop()
+        if name in defs:
+            continue
+        defs[name] = copy.deepcopy(resolver.defs[name])
+        text = json.dumps(defs[name])
+        pending += [other for other in resolver.defs if f'"{_ref_prefix}{other}"' in text]
+
+    return {
+        "$defs": {name: defs[name] for name in resolver.defs if name in defs},
+        "schemas": schemas,
+    }
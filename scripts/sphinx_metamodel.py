@@ -0,0 +1,112 @@
+"""
+Sphinx extension, which generates the sphinx-needs configuration of a project
+directly from a metamodel export.
+
+Instead of running json2conf.py and pasting its output into conf.py, the
+consuming project lists the extension and points it to the needs.json of the
+metamodel build:
+
+    sys.path.append(os.path.abspath('../scripts'))
+
+    extensions = [
+        'sphinx_needs',
+        'sphinx_metamodel',
+    ]
+
+    metamodel_needs_json = '../use_datamodel/needs.json'
+
+On config-inited the types, extra options and extra links are appended to
+needs_types, needs_extra_options and needs_extra_links, and the schema is
+handed to sphinx-needs in memory as needs_schema_definitions. The generated
+values are kept in a compiled cache in the doctree folder, so later builds
+skip the JSON parsing as long as the export is unchanged.
+"""
+
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict
+
+from sphinx.application import Sphinx
+from sphinx.config import Config
+from sphinx.util import logging
+
+from json2conf import index2config, json2schema, metamodel_fields
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json, is_metamodel_need
+
+logger = logging.getLogger(__name__)
+
+# bump when the content of the compiled cache changes
+compiled_format : int = 2
+
+compiled_name : str = "metamodel.pickle"
+
+
+def source_signature(path: Path) -> tuple:
+    stat = os.stat(path)
+    return (compiled_format, str(path), stat.st_size, stat.st_mtime_ns)
+
+
+def compile_metamodel(path: Path) -> Dict[str, Any]:
+    """
+    Generate the sphinx-needs config values and the schema from a metamodel export.
+    """
+    needs = stream_needs_from_json(path, keep=is_metamodel_need, fields=metamodel_fields)
+    index = MetamodelIndex(needs2records(needs))
+
+    compiled = index2config(index)
+    compiled["needs_schema_definitions"] = json2schema(index)
+    return compiled
+
+
+def load_compiled(path: Path, cache_path: Path) -> Dict[str, Any]:
+    signature = source_signature(path)
+    try:
+        with open(cache_path, "rb") as infile:
+            cached = pickle.load(infile)
+        if cached.get("signature") == signature:
+            return cached["compiled"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        pass
+
+    compiled = compile_metamodel(path)
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(cache_path, "wb") as outfile:
+        pickle.dump({"signature": signature, "compiled": compiled}, outfile, protocol=pickle.HIGHEST_PROTOCOL)
+    return compiled
+
+
+def inject_metamodel(app: Sphinx, config: Config) -> None:
+    if not config.metamodel_needs_json:
+        return
+
+    path = Path(app.confdir, config.metamodel_needs_json).resolve()
+    compiled = load_compiled(path, Path(app.doctreedir, compiled_name))
+
+    config.needs_types = [*config.needs_types, *compiled["needs_types"]]
+    config.needs_extra_options = [*config.needs_extra_options, *compiled["needs_extra_options"]]
+    config.needs_extra_links = [*config.needs_extra_links, *compiled["needs_extra_links"]]
+    config.needs_schema_definitions = compiled["needs_schema_definitions"]
+
+    logger.info(f"metamodel: {len(compiled['needs_types'])} types, "
+                f"{len(compiled['needs_extra_options'])} options, "
+                f"{len(compiled['needs_extra_links'])} links from {path}")
+
+
+def setup(app: Sphinx) -> Dict[str, Any]:
+    app.setup_extension("sphinx_needs")
+
+    app.add_config_value("metamodel_needs_json", None, "env", types=[str])
+
+    # run before sphinx-needs evaluates its config (default priority 500),
+    # but after it has loaded a needs.toml (priority 10)
+    app.connect("config-inited", inject_metamodel, priority=100)
+
+    return {
+        "version": "1.0",
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
@@ -0,0 +1,127 @@
+"""
+Transitive closure of the typegroup membership of a metamodel.
+
+A typegroup holds types and other typegroups (groups_back, and groups of the
+members). Types and typegroups are mapped to dense integers once, and the
+closure is computed in one pass in topological order: the types below each
+typegroup and the typegroups containing each type and typegroup are collected
+as ordered lists, deduplicated with a bitset over the dense codes. The
+generators answer "types under G" and "groups of T" with a lookup of these
+lists instead of a walk over nested groups.
+
+Direct members and groups keep the order of the export, members of nested
+typegroups follow in place of their group. A metamodel with typegroups
+containing each other raises a ValueError naming the cycle.
+"""
+
+from typing import Any, Dict, List, Set, Tuple
+
+
+class TypegroupClosure:
+    """
+    Concrete types under each typegroup and typegroups containing each element.
+    """
+
+    def __init__(self, types: List[Dict[str, Any]], typegroups: List[Dict[str, Any]]) -> None:
+        self.type_ids: List[str] = [t["id"] for t in types]
+        self.group_ids: List[str] = [g["id"] for g in typegroups]
+        self.type_codes: Dict[str, int] = {type_id: i for i, type_id in enumerate(self.type_ids)}
+        self.group_codes: Dict[str, int] = {group_id: i for i, group_id in enumerate(self.group_ids)}
+
+        # direct edges in both directions, from groups_back and from groups: the members
+        # of a group keep the groups_back order, the groups of an element its groups order
+        self._children: Dict[str, List[str]] = {group_id: [] for group_id in self.group_ids}
+        self._parents: Dict[str, List[str]] = {element_id: [] for element_id in [*self.type_ids, *self.group_ids]}
+        members = [(group["id"], member) for group in typegroups for member in group.get("groups_back", [])]
+        groups = [(group_id, element["id"]) for element in [*types, *typegroups] for group_id in element.get("groups", [])]
+        # an edge given by both groups_back and groups is added once
+        child_edges: Set[Tuple[str, str]] = set()
+        for group_id, member in [*members, *groups]:
+            if self._is_edge(group_id, member) and (group_id, member) not in child_edges:
+                child_edges.add((group_id, member))
+                self._children[group_id].append(member)
+        parent_edges: Set[Tuple[str, str]] = set()
+        for group_id, member in [*groups, *members]:
+            if self._is_edge(group_id, member) and (group_id, member) not in parent_edges:
+                parent_edges.add((group_id, member))
+                self._parents[member].append(group_id)
+
+        self._members: Dict[str, List[str]] = {}
+        self._groups: Dict[str, List[str]] = {}
+        self._close()
+
+    def _is_edge(self, group_id: str, member: str) -> bool:
+        # only edges from a typegroup to a type or typegroup of the metamodel
+        return group_id in self.group_codes and member in self._parents
+
+    def _topological_order(self) -> List[str]:
+        """
+        Typegroups ordered with nested groups before the groups containing them.
+        """
+        order = []
+        # 0 unvisited, 1 on the current path, 2 done
+        state = dict.fromkeys(self.group_ids, 0)
+        for root in self.group_ids:
+            if state[root]:
+                continue
+            state[root] = 1
+            path = [root]
+            stack = [iter(self._children[root])]
+            while stack:
+                child = next((c for c in stack[-1] if c in self.group_codes), None)
+                if child is None:
+                    done = path.pop()
+                    stack.pop()
+                    state[done] = 2
+                    order.append(done)
+                elif state[child] == 1:
+                    cycle = path[path.index(child):] + [child]
+                    raise ValueError(f"Typegroups contain each other: {' -> '.join(cycle)}.")
+                elif state[child] == 0:
+                    state[child] = 1
+                    path.append(child)
+                    stack.append(iter(self._children[child]))
+        return order
+
+    def _close(self) -> None:
+        order = self._topological_order()
+
+        # members bottom-up: the types of a group and the members of its groups
+        for group_id in order:
+            row = 0
+            members = []
+            for child in self._children[group_id]:
+                if child in self.type_codes:
+                    candidates = [child]
+                else:
+                    candidates = self._members[child]
+                for type_id in candidates:
+                    bit = 1 << self.type_codes[type_id]
+                    if not row & bit:
+                        row |= bit
+                        members.append(type_id)
+            self._members[group_id] = members
+
+        # containing groups top-down: the parents and the groups containing them
+        for element_id in [*reversed(order), *self.type_ids]:
+            row = 0
+            groups = []
+            for parent in self._parents[element_id]:
+                for group_id in [parent, *self._groups[parent]]:
+                    bit = 1 << self.group_codes[group_id]
+                    if not row & bit:
+                        row |= bit
+                        groups.append(group_id)
+            self._groups[element_id] = groups
+
+    def types_in(self, group_id: str) -> List[str]:
+        """
+        Ids of all types below the typegroup, also through nested typegroups.
+        """
+        return self._members.get(group_id, [])
+
+    def groups_of(self, element_id: str) -> List[str]:
+        """
+        Ids of all typegroups containing the type or typegroup, also through nested typegroups.
+        """
+        return self._groups.get(element_id, [])
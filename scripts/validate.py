@@ -0,0 +1,631 @@
+# usage:
+# python ./scripts/validate.py -s ./use_datamodel/output2.schema.json -i ./test-project/_build/html/needs.json
+
+"""
+We validate the needs of a project export (needs.json) against the schema
+generated by json2conf.py, without running a Sphinx build.
+
+The schema document is compiled once into Python closures: $ref is resolved at
+compile time, the 'select' of each schema entry is turned into a dispatch table
+keyed by the need type, and enum, const, required and unevaluatedProperties
+get specialized checks. Only the subset of JSON Schema used by sphinx-needs
+schemas is supported, other keywords are rejected while compiling.
+
+As in sphinx-needs, only set fields are validated: empty values ("", [] and
+None) count as not set, and unevaluatedProperties / additionalProperties only
+look at the fields the schema governs (every property named in the schema),
+so the core fields of a need do not count as unevaluated.
+"""
+
+import argparse
+import re
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+from needs_reader import stream_needs_from_json
+
+from link_graph import LinkGraph
+
+import json_io
+
+# check(instance, errors) returns the evaluated property names, None if invalid
+Check = Callable[[Any, List[str]], Optional[FrozenSet[str]]]
+
+# validate(need, needs, errors) returns True if the need is valid
+NeedCheck = Callable[[Dict[str, Any], Dict[str, Any], List[str]], bool]
+
+_no_properties : FrozenSet[str] = frozenset()
+
+_json_types : Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+# keywords without effect on validation
+_annotations : FrozenSet[str] = frozenset({
+    "$schema", "$id", "$comment", "title", "description", "default", "examples", "id", "severity", "message",
+})
+
+
+def _ok(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+    return _no_properties
+
+
+class SchemaCompiler:
+    """
+    Compiles the subschemas of a schema document to check closures.
+    """
+
+    def __init__(self, document: Dict[str, Any]) -> None:
+        self.document = document
+        self.defs: Dict[str, Any] = document.get("$defs", {})
+        self.compiled_refs: Dict[str, Check] = {}
+        self.governed: FrozenSet[str] = frozenset(self._collect_properties(document))
+
+    def _collect_properties(self, node: Any) -> Set[str]:
+        names: Set[str] = set()
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "properties" and isinstance(value, dict):
+                    names.update(value.keys())
+                if key == "network" and isinstance(value, dict):
+                    names.update(value.keys())
+                names |= self._collect_properties(value)
+        elif isinstance(node, list):
+            for value in node:
+                names |= self._collect_properties(value)
+        # the selectors dispatch on the type, it is a core field
+        names.discard("type")
+        return names
+
+    def resolve(self, ref: str) -> Any:
+        if not ref.startswith("#/$defs/"):
+            raise ValueError(f"Only local $defs references are supported, got '{ref}'.")
+        name = ref[len("#/$defs/"):]
+        if name not in self.defs:
+            raise ValueError(f"Unresolvable reference '{ref}'.")
+        return self.defs[name]
+
+    def compile_ref(self, ref: str) -> Check:
+        if ref not in self.compiled_refs:
+            # placeholder for recursive references, replaced once compiled
+            cell: List[Check] = []
+            self.compiled_refs[ref] = lambda instance, errors: cell[0](instance, errors)
+            compiled = self.compile(self.resolve(ref))
+            cell.append(compiled)
+            self.compiled_refs[ref] = compiled
+        return self.compiled_refs[ref]
+
+    def compile(self, schema: Any) -> Check:
+        """
+        Compile a subschema, all keywords of the subschema must hold.
+        """
+        if schema is True or schema == {}:
+            return _ok
+        if schema is False:
+            return lambda instance, errors: errors.append("false schema") or None
+
+        checks: List[Check] = []
+        # keywords evaluated with the properties found by the other keywords
+        unevaluated = None
+        additional = None
+
+        for key, value in schema.items():
+            if key in _annotations:
+                continue
+            if key == "$ref":
+                checks.append(self.compile_ref(value))
+            elif key == "allOf":
+                checks.append(self._compile_all_of([self.compile(s) for s in value]))
+            elif key == "anyOf":
+                checks.append(self._compile_any_of([self.compile(s) for s in value]))
+            elif key == "oneOf":
+                checks.append(self._compile_one_of([self.compile(s) for s in value]))
+            elif key == "not":
+                checks.append(self._compile_not(self.compile(value)))
+            elif key == "properties":
+                checks.append(self._compile_properties({k: self.compile(s) for k, s in value.items()}))
+            elif key == "required":
+                checks.append(self._compile_required(tuple(value)))
+            elif key == "unevaluatedProperties":
+                unevaluated = value
+            elif key == "additionalProperties":
+                additional = value
+            elif key == "type":
+                checks.append(self._compile_type(value))
+            elif key == "const":
+                checks.append(self._compile_const(value))
+            elif key == "enum":
+                checks.append(self._compile_enum(value))
+            elif key == "items":
+                checks.append(self._compile_items(self.compile(value)))
+            elif key == "contains":
+                checks.append(self._compile_contains(self.compile(value),
+                                                     schema.get("minContains", 1),
+                                                     schema.get("maxContains", None)))
+            elif key in ("minContains", "maxContains"):
+                continue
+            elif key in ("minItems", "maxItems", "minLength", "maxLength", "minimum", "maximum"):
+                checks.append(self._compile_bound(key, value))
+            elif key == "pattern":
+                checks.append(self._compile_pattern(value))
+            else:
+                raise ValueError(f"Keyword '{key}' is not supported by the compiled validator.")
+
+        if additional is not None:
+            names = frozenset(schema.get("properties", {}).keys())
+            checks.append(self._compile_closed(names, self.compile(additional), "additional"))
+        combined = self._compile_all_of(checks) if len(checks) != 1 else checks[0]
+        if unevaluated is not None:
+            combined = self._compile_unevaluated(combined, self.compile(unevaluated))
+        return combined
+
+    @staticmethod
+    def _compile_all_of(checks: List[Check]) -> Check:
+        if not checks:
+            return _ok
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            evaluated = _no_properties
+            valid = True
+            for c in checks:
+                result = c(instance, errors)
+                if result is None:
+                    valid = False
+                elif result:
+                    evaluated = evaluated | result
+            return evaluated if valid else None
+        return check
+
+    @staticmethod
+    def _compile_any_of(checks: List[Check]) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            evaluated = None
+            branch_errors: List[str] = []
+            for c in checks:
+                result = c(instance, branch_errors)
+                if result is not None:
+                    evaluated = result if evaluated is None else evaluated | result
+            if evaluated is None:
+                errors.append("no subschema of anyOf matches: " + "; ".join(branch_errors))
+            return evaluated
+        return check
+
+    @staticmethod
+    def _compile_one_of(checks: List[Check]) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            matches = [r for r in (c(instance, []) for c in checks) if r is not None]
+            if len(matches) != 1:
+                errors.append(f"{len(matches)} subschemas of oneOf match, expected exactly 1")
+                return None
+            return matches[0]
+        return check
+
+    @staticmethod
+    def _compile_not(inner: Check) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if inner(instance, []) is not None:
+                errors.append("value matches a 'not' subschema")
+                return None
+            return _no_properties
+        return check
+
+    @staticmethod
+    def _compile_properties(properties: Dict[str, Check]) -> Check:
+        items = tuple(properties.items())
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, dict):
+                return _no_properties
+            valid = True
+            evaluated = []
+            for name, c in items:
+                if name not in instance:
+                    continue
+                evaluated.append(name)
+                if c(instance[name], errors) is None:
+                    errors.append(f"property '{name}' is invalid")
+                    valid = False
+            return frozenset(evaluated) if valid else None
+        return check
+
+    @staticmethod
+    def _compile_required(required: Tuple[str, ...]) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, dict):
+                return _no_properties
+            missing = [name for name in required if name not in instance]
+            if missing:
+                errors.append("missing required properties: " + ", ".join(missing))
+                return None
+            return _no_properties
+        return check
+
+    def _compile_unevaluated(self, inner: Check, rest: Check) -> Check:
+        governed = self.governed
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            evaluated = inner(instance, errors)
+            if evaluated is None or not isinstance(instance, dict):
+                return evaluated
+            unexpected = [k for k in instance if k in governed and k not in evaluated
+                          and rest(instance[k], []) is None]
+            if unexpected:
+                errors.append("unevaluated properties: " + ", ".join(unexpected))
+                return None
+            return frozenset(k for k in instance if k in governed)
+        return check
+
+    def _compile_closed(self, names: FrozenSet[str], rest: Check, label: str) -> Check:
+        governed = self.governed
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, dict):
+                return _no_properties
+            unexpected = [k for k in instance if k in governed and k not in names
+                          and rest(instance[k], []) is None]
+            if unexpected:
+                errors.append(f"{label} properties: " + ", ".join(unexpected))
+                return None
+            return frozenset(k for k in instance if k in governed)
+        return check
+
+    @staticmethod
+    def _compile_type(json_type: Any) -> Check:
+        tests = [_json_types[t] for t in (json_type if isinstance(json_type, list) else [json_type])]
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            for test in tests:
+                if test(instance):
+                    return _no_properties
+            errors.append(f"{instance!r} is not of type {json_type}")
+            return None
+        return check
+
+    @staticmethod
+    def _compile_const(const: Any) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if instance == const:
+                return _no_properties
+            errors.append(f"{instance!r} is not {const!r}")
+            return None
+        return check
+
+    @staticmethod
+    def _compile_enum(enum: List[Any]) -> Check:
+        try:
+            allowed = frozenset(enum)
+            contains = allowed.__contains__
+        except TypeError:
+            contains = enum.__contains__
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            try:
+                if contains(instance):
+                    return _no_properties
+            except TypeError:
+                if instance in enum:
+                    return _no_properties
+            errors.append(f"{instance!r} is not one of {enum}")
+            return None
+        return check
+
+    @staticmethod
+    def _compile_items(inner: Check) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, list):
+                return _no_properties
+            for item in instance:
+                if inner(item, errors) is None:
+                    return None
+            return _no_properties
+        return check
+
+    @staticmethod
+    def _compile_contains(inner: Check, min_contains: int, max_contains: Optional[int]) -> Check:
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, list):
+                return _no_properties
+            count = sum(1 for item in instance if inner(item, []) is not None)
+            if count < min_contains or (max_contains is not None and count > max_contains):
+                errors.append(f"{count} items match 'contains', expected {min_contains}..{max_contains}")
+                return None
+            return _no_properties
+        return check
+
+    @staticmethod
+    def _compile_bound(key: str, bound: Any) -> Check:
+        if key in ("minItems", "maxItems"):
+            applies = lambda v: isinstance(v, list)
+        elif key in ("minLength", "maxLength"):
+            applies = lambda v: isinstance(v, str)
+        else:
+            applies = _json_types["number"]
+        if key.startswith("min"):
+            holds = lambda v: (len(v) if key != "minimum" else v) >= bound
+        else:
+            holds = lambda v: (len(v) if key != "maximum" else v) <= bound
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not applies(instance) or holds(instance):
+                return _no_properties
+            errors.append(f"{instance!r} violates {key} {bound}")
+            return None
+        return check
+
+    @staticmethod
+    def _compile_pattern(pattern: str) -> Check:
+        search = re.compile(pattern).search
+
+        def check(instance: Any, errors: List[str]) -> Optional[FrozenSet[str]]:
+            if not isinstance(instance, str) or search(instance):
+                return _no_properties
+            errors.append(f"{instance!r} does not match '{pattern}'")
+            return None
+        return check
+
+    def deref(self, schema: Any) -> Any:
+        """
+        The subschema a chain of plain {"$ref": ...} subschemas points to.
+        """
+        while isinstance(schema, dict) and set(schema.keys()) == {"$ref"}:
+            schema = self.resolve(schema["$ref"])
+        return schema
+
+    def select_types(self, schema: Any) -> Optional[FrozenSet[str]]:
+        """
+        Need types a selector matches, None if it does not only test the type.
+        """
+        schema = self.deref(schema)
+        if not isinstance(schema, dict):
+            return None
+        if set(schema.keys()) == {"anyOf"}:
+            types: Set[str] = set()
+            for sub in schema["anyOf"]:
+                sub_types = self.select_types(sub)
+                if sub_types is None:
+                    return None
+                types |= sub_types
+            return frozenset(types)
+        if set(schema.keys()) == {"properties"} and set(schema["properties"].keys()) == {"type"}:
+            type_schema = self.deref(schema["properties"]["type"])
+            if not isinstance(type_schema, dict):
+                return None
+            if set(type_schema.keys()) == {"const"}:
+                return frozenset([type_schema["const"]])
+            if set(type_schema.keys()) == {"enum"}:
+                return frozenset(type_schema["enum"])
+        return None
+
+    def type_only(self, validate: Any) -> Optional[FrozenSet[str]]:
+        """
+        Need types a linked need must have, None if the validation tests more than the type.
+        """
+        if not isinstance(validate, dict) or set(validate.keys()) != {"local"}:
+            return None
+        schema = self.deref(validate["local"])
+        if not isinstance(schema, dict) or set(schema.keys()) != {"properties"}:
+            return None
+        if set(schema["properties"].keys()) != {"type"}:
+            return None
+        type_schema = self.deref(schema["properties"]["type"])
+        if not isinstance(type_schema, dict):
+            return None
+        type_schema = dict(type_schema)
+        if type_schema.pop("type", "string") != "string":
+            return None
+        if set(type_schema.keys()) == {"const"}:
+            return frozenset([type_schema["const"]])
+        if set(type_schema.keys()) == {"enum"}:
+            return frozenset(type_schema["enum"])
+        return None
+
+    def type_rule(self, option: str, rule: Dict[str, Any]) -> Optional["TypeRule"]:
+        """
+        The network rule as type rule for the link graph, None if it tests more than types.
+        """
+        if not set(rule.keys()) <= {"contains", "items", "minContains", "maxContains", "minItems", "maxItems"}:
+            return None
+        contains = items = None
+        if "contains" in rule:
+            contains = self.type_only(rule["contains"])
+            if contains is None:
+                return None
+        if "items" in rule:
+            items = self.type_only(rule["items"])
+            if items is None:
+                return None
+        return TypeRule(option, contains, items,
+                        rule.get("minContains", 1), rule.get("maxContains", None),
+                        rule.get("minItems", 0), rule.get("maxItems", None))
+
+    def compile_validate(self, validate: Dict[str, Any], type_rules: Optional[List["TypeRule"]] = None) -> NeedCheck:
+        """
+        Compile the local and network validation of a need.
+
+        With type_rules, network rules only testing the type of linked needs are
+        collected there for the link graph instead of being compiled.
+        """
+        local = self.compile(validate.get("local", {}))
+        network = []
+        for option, rule in validate.get("network", {}).items():
+            if type_rules is not None:
+                type_rule = self.type_rule(option, rule)
+                if type_rule is not None:
+                    type_rules.append(type_rule)
+                    continue
+            network.append((option, self._compile_network_rule(rule)))
+
+        def check(need: Dict[str, Any], needs: Dict[str, Any], errors: List[str]) -> bool:
+            valid = local(need, errors) is not None
+            for option, rule in network:
+                targets = [needs[t] for t in need.get(option, []) if t in needs]
+                if not rule(targets, needs, errors):
+                    errors.append(f"network validation of link '{option}' failed")
+                    valid = False
+            return valid
+        return check
+
+    def _compile_network_rule(self, rule: Dict[str, Any]) -> Callable[[List[Dict[str, Any]], Dict[str, Any], List[str]], bool]:
+        contains = self.compile_validate(rule["contains"]) if "contains" in rule else None
+        items = self.compile_validate(rule["items"]) if "items" in rule else None
+        min_contains = rule.get("minContains", 1)
+        max_contains = rule.get("maxContains", None)
+        min_items = rule.get("minItems", 0)
+        max_items = rule.get("maxItems", None)
+
+        def check(targets: List[Dict[str, Any]], needs: Dict[str, Any], errors: List[str]) -> bool:
+            valid = True
+            if len(targets) < min_items or (max_items is not None and len(targets) > max_items):
+                errors.append(f"{len(targets)} linked needs, expected {min_items}..{max_items}")
+                valid = False
+            if items is not None:
+                for target in targets:
+                    if not items(target, needs, errors):
+                        valid = False
+            if contains is not None:
+                count = sum(1 for target in targets if contains(target, needs, []))
+                if count < min_contains or (max_contains is not None and count > max_contains):
+                    errors.append(f"{count} linked needs match, expected {min_contains}..{max_contains}")
+                    valid = False
+            return valid
+        return check
+
+
+class TypeRule:
+    """
+    Network rule on the types of the needs linked by a link option.
+    """
+
+    __slots__ = ("option", "contains", "items", "min_contains", "max_contains", "min_items", "max_items")
+
+    def __init__(self, option: str, contains: Optional[FrozenSet[str]], items: Optional[FrozenSet[str]],
+                 min_contains: int, max_contains: Optional[int], min_items: int, max_items: Optional[int]) -> None:
+        self.option = option
+        self.contains = contains
+        self.items = items
+        self.min_contains = min_contains
+        self.max_contains = max_contains
+        self.min_items = min_items
+        self.max_items = max_items
+
+    def check(self, graph: LinkGraph, i: int, errors: List[str]) -> bool:
+        valid = True
+        linked = graph.degree(self.option, i)
+        if linked < self.min_items or (self.max_items is not None and linked > self.max_items):
+            errors.append(f"{linked} linked needs, expected {self.min_items}..{self.max_items}")
+            valid = False
+        if self.items is not None and graph.count_targets(self.option, self.items, i) != linked:
+            errors.append(f"linked needs are not of type {sorted(self.items)}")
+            valid = False
+        if self.contains is not None:
+            count = graph.count_targets(self.option, self.contains, i)
+            if count < self.min_contains or (self.max_contains is not None and count > self.max_contains):
+                errors.append(f"{count} linked needs match, expected {self.min_contains}..{self.max_contains}")
+                valid = False
+        if not valid:
+            errors.append(f"network validation of link '{self.option}' failed")
+        return valid
+
+
+SchemaEntry = Tuple[str, NeedCheck, List[TypeRule]]
+
+class CompiledSchemas:
+    """
+    The schema entries of a document, dispatched by need type.
+
+    Network rules testing only the types of linked needs are evaluated on the
+    link graph, all other rules with compiled closures.
+    """
+
+    def __init__(self, document: Dict[str, Any]) -> None:
+        self.compiler = SchemaCompiler(document)
+        self.by_type: Dict[str, List[SchemaEntry]] = {}
+        # entries whose selector does not only test the type, checked for every need
+        self.generic: List[Tuple[Check, SchemaEntry]] = []
+        self.link_options: Set[str] = set()
+
+        for entry in document.get("schemas", []):
+            entry_id = entry.get("id", "<unnamed>")
+            type_rules: List[TypeRule] = []
+            validate = self.compiler.compile_validate(entry.get("validate", {}), type_rules)
+            self.link_options.update(rule.option for rule in type_rules)
+            compiled = (entry_id, validate, type_rules)
+            select = entry.get("select", {})
+            types = self.compiler.select_types(select)
+            if types is None:
+                self.generic.append((self.compiler.compile(select), compiled))
+                continue
+            for need_type in types:
+                self.by_type.setdefault(need_type, []).append(compiled)
+
+    @property
+    def fields(self) -> FrozenSet[str]:
+        """
+        Fields of a need read by the validation.
+        """
+        return self.compiler.governed | {"id", "type"}
+
+    def validate_need(self, need: Dict[str, Any], needs: Dict[str, Any], graph: LinkGraph, i: int) -> List[str]:
+        """
+        Validate need i of the graph, returns one message per failed schema entry.
+        """
+        messages = []
+        entries = list(self.by_type.get(need.get("type"), []))
+        entries += [compiled for select, compiled in self.generic if select(need, []) is not None]
+        for entry_id, validate, type_rules in entries:
+            errors: List[str] = []
+            valid = validate(need, needs, errors)
+            for rule in type_rules:
+                valid = rule.check(graph, i, errors) and valid
+            if not valid:
+                messages.append(f"{need.get('id')}: {entry_id}: " + "; ".join(errors))
+        return messages
+
+
+def reduce_need(need: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Drop the fields which are not set.
+    """
+    return {k: v for k, v in need.items() if v is not None and v != "" and v != []}
+
+
+def validate_needs(schemas: CompiledSchemas, needs: Dict[str, Any]) -> List[str]:
+    """
+    Validate all needs, returns one message per failed need and schema entry.
+    """
+    graph = LinkGraph(needs, sorted(schemas.link_options))
+    messages = []
+    for i, need in enumerate(needs.values()):
+        messages += schemas.validate_need(need, needs, graph, i)
+    return messages
+
+
+def main(schema_path: Path, input_path: Path) -> int:
+    """
+    Validate a project export against a generated schema, returns the number of failures.
+    """
+    schemas = CompiledSchemas(json_io.load(schema_path))
+
+    needs = stream_needs_from_json(input_path, fields=schemas.fields)
+    needs = {need_id: reduce_need(need) for need_id, need in needs.items()}
+
+    messages = validate_needs(schemas, needs)
+    for message in messages:
+        print(message)
+    print(f"validated {len(needs)} needs: {len(messages)} failures")
+    return len(messages)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Validate a needs.json against a generated schema.")
+      parser.add_argument("-s", "--schema", help="Path to the schema json file.", required=True, type=Path)
+      parser.add_argument("-i", "--input", help="Path to the needs json file of the project.", required=True, type=Path)
+      args = parser.parse_args()
+
+      sys.exit(1 if main(args.schema, args.input) else 0)
@@ -0,0 +1,334 @@
+# usage:
+# python ./scripts/validation_cache.py -s ./use_datamodel/output2.schema.json -i ./test-project/_build/html/needs.json \
+#     -c ./test-project/_build/validation.cache.json -m ./use_datamodel/needs.json
+
+"""
+Incremental validation of a project export, with a persistent result cache.
+
+The result of every need is stored under a hash over everything it depends on:
+- its fields read by the validation,
+- the types of the needs it links to through options with type-only network
+  rules, and the content of the needs it links to through other network rules,
+- the schema entries selected for its type, with the $defs they reference.
+
+On the next run only needs with a changed hash are validated again, all
+others reuse their stored messages. With the metamodel export, a reverse
+index from each metamodel element (type, typegroup, option, link,
+association) to the project needs it governs is built as well. It is kept
+as the governed need types per element, so the elements changed since the
+last run are reported with the number of needs they govern, also removed
+ones.
+"""
+
+import argparse
+import hashlib
+import sys
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import json_io
+import validate
+from link_graph import LinkGraph
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import stream_needs_from_json, is_metamodel_need
+from output_writer import write_if_changed
+from rst_metamodel import read_rst_metamodel
+
+# bump when the layout of the cache file changes
+cache_format : int = 1
+
+# modules the results are computed with, besides this one: the schema compiler
+# (with deref), the link graph counting the network rules and the governed types
+validator_modules : List[str] = ["validate", "link_graph", "metamodel_index", "typegroup_closure"]
+
+# changes of the validation code invalidate all results
+validator_hash : str = hashlib.sha256(b"".join(
+    Path(path).read_bytes() for path in [__file__, *(sys.modules[m].__file__ for m in validator_modules)]
+)).hexdigest()
+
+_ref_prefix : str = "#/$defs/"
+
+
+def _canonical(value: Any) -> str:
+    return json_io.dumps(value, compact=True, sort_keys=True)
+
+
+def _digest(*parts: str) -> str:
+    return hashlib.blake2b("\0".join(parts).encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _refs(node: Any) -> Iterator[str]:
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith(_ref_prefix):
+            yield ref[len(_ref_prefix):]
+        for value in node.values():
+            yield from _refs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _refs(value)
+
+
+def _network_options(validate_object: Any, depth: int = 1) -> Iterator[Tuple[str, int]]:
+    """
+    (link option, nesting depth) of all network rules of a validate object.
+    """
+    if not isinstance(validate_object, dict):
+        return
+    for option, rule in validate_object.get("network", {}).items():
+        yield option, depth
+        if isinstance(rule, dict):
+            for key in ("contains", "items"):
+                yield from _network_options(rule.get(key), depth + 1)
+
+
+class SchemaDependencies:
+    """
+    What the validation of a need depends on, derived from the schema document.
+    """
+
+    def __init__(self, document: Dict[str, Any], schemas: validate.CompiledSchemas) -> None:
+        defs = document.get("$defs", {})
+        compiler = schemas.compiler
+
+        def entry_hash(entry: Dict[str, Any]) -> str:
+            # the entry and the closure of the defs it references
+            names: Set[str] = set()
+            pending = list(_refs(entry))
+            while pending:
+                name = pending.pop()
+                if name not in names and name in defs:
+                    names.add(name)
+                    pending += _refs(defs[name])
+            return _digest(_canonical(entry), *(name + _canonical(defs[name]) for name in sorted(names)))
+
+        by_type: Dict[str, List[str]] = {}
+        generic: List[str] = []
+        # options of network rules testing more than the types of the linked needs
+        self.content_options: Set[str] = set()
+        self.network_options: Set[str] = set()
+        self.depth = 0
+        for entry in document.get("schemas", []):
+            types = compiler.select_types(entry.get("select", {}))
+            for need_type in types if types is not None else []:
+                by_type.setdefault(need_type, []).append(entry_hash(entry))
+            if types is None:
+                generic.append(entry_hash(entry))
+
+            validate_object = entry.get("validate", {})
+            for option, depth in _network_options(validate_object):
+                self.network_options.add(option)
+                self.depth = max(self.depth, depth)
+            for option, rule in validate_object.get("network", {}).items():
+                if not isinstance(rule, dict) or compiler.type_rule(option, rule) is None:
+                    self.content_options.add(option)
+
+        # entries with other selectors may apply to every need
+        generic_hash = _digest(*generic)
+        self.type_hashes = {need_type: _digest(generic_hash, *hashes) for need_type, hashes in by_type.items()}
+        self.generic_hash = _digest(generic_hash)
+        self.type_options = schemas.link_options - self.content_options
+
+    def need_keys(self, needs: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Hash of the inputs of the validation of each need.
+        """
+        contents = {need_id: _canonical(need) for need_id, need in needs.items()}
+        linked: Dict[Tuple[str, int], str] = {}
+
+        def linked_content(need_id: str, depth: int) -> str:
+            # a linked need, with its own linked needs as deep as nested network rules reach
+            key = (need_id, depth)
+            if key not in linked:
+                need = needs.get(need_id)
+                if need is None:
+                    linked[key] = "-"
+                elif depth <= 1:
+                    linked[key] = contents[need_id]
+                else:
+                    linked[key] = _digest(contents[need_id], *(
+                        option + ":" + linked_content(target, depth - 1)
+                        for option in sorted(self.network_options) for target in need.get(option, [])))
+            return linked[key]
+
+        type_options = sorted(self.type_options)
+        content_options = sorted(self.content_options)
+        keys = {}
+        for need_id, need in needs.items():
+            parts = [self.type_hashes.get(need.get("type"), self.generic_hash), contents[need_id]]
+            for option in type_options:
+                targets = need.get(option)
+                if targets:
+                    parts.append(option)
+                    parts += [str(needs[t].get("type")) if t in needs else "-" for t in targets]
+            for option in content_options:
+                targets = need.get(option)
+                if targets:
+                    parts.append(option)
+                    parts += [linked_content(t, self.depth) for t in targets]
+            keys[need_id] = _digest(*parts)
+        return keys
+
+
+def governed_types(index: MetamodelIndex) -> Dict[str, List[str]]:
+    """
+    Need types (directives) governed by each metamodel element.
+    """
+    governs: Dict[str, List[str]] = {element_id: [] for element_id in index}
+
+    def add(element_id: str, directives: List[str]) -> None:
+        if element_id in governs:
+            governs[element_id] += [d for d in directives if d not in governs[element_id]]
+
+    for need_type in index.types:
+        add(need_type["id"], [need_type["directive"]])
+    for typegroup in index.typegroups:
+        add(typegroup["id"], index.typegroup_directives(typegroup["id"]))
+    for owner in [*index.types, *index.typegroups]:
+        directives = governs[owner["id"]]
+        for option_id in [*owner.get("mandatory", []), *owner.get("optional", [])]:
+            add(option_id, directives)
+        for child in owner.get("parent_needs_back", []):
+            association = index.get(child)
+            if association is None or association.get("type") != "sn_association":
+                continue
+            # the association validates the needs of its parent
+            add(child, directives)
+            for link_id in association.get("link", []):
+                add(link_id, directives)
+    return governs
+
+
+def governed_needs(governs: Dict[str, List[str]], needs: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Reverse index from each metamodel element to the ids of the project needs it governs.
+    """
+    by_type: Dict[str, List[str]] = {}
+    for need_id, need in needs.items():
+        by_type.setdefault(need.get("type"), []).append(need_id)
+    return {element_id: [need_id for directive in directives for need_id in by_type.get(directive, [])]
+            for element_id, directives in governs.items()}
+
+
+def element_hashes(index: MetamodelIndex) -> Dict[str, str]:
+    return {element_id: _digest(_canonical({k: need[k] for k in need})) for element_id, need in index.by_id.items()}
+
+
+class ValidationCache:
+    """
+    Messages of each need of a previous run, with the hash of their inputs,
+    and the hashes and governed types of the metamodel elements.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.results: Dict[str, List[Any]] = {}
+        self.elements: Dict[str, str] = {}
+        self.governs: Dict[str, List[str]] = {}
+        try:
+            data = json_io.load(self.path)
+        except (FileNotFoundError, ValueError):
+            return
+        if data.get("format") == cache_format and data.get("validator") == validator_hash:
+            self.results = data.get("needs", {})
+            self.elements = data.get("elements", {})
+            self.governs = data.get("governs", {})
+
+    def get(self, need_id: str, key: str) -> Optional[List[str]]:
+        result = self.results.get(need_id)
+        if result is None or result[0] != key:
+            return None
+        return result[1]
+
+    def save(self, results: Dict[str, List[Any]], elements: Dict[str, str], governs: Dict[str, List[str]]) -> bool:
+        self.results, self.elements, self.governs = results, elements, governs
+        data = {
+            "format": cache_format,
+            "validator": validator_hash,
+            "needs": results,
+            "elements": elements,
+            "governs": governs,
+        }
+        return write_if_changed(self.path, json_io.dumps(data, compact=True))
+
+
+def validate_needs_cached(schemas: validate.CompiledSchemas, document: Dict[str, Any],
+                          needs: Dict[str, Dict[str, Any]], cache: ValidationCache,
+                          index: Optional[MetamodelIndex] = None) -> Tuple[List[str], Dict[str, int]]:
+    """
+    Validate the needs whose inputs changed since the cached run, reuse the messages of all others.
+
+    Returns all messages and the counts of validated and skipped needs, and with
+    the metamodel index of its changed elements and the needs they govern.
+    """
+    keys = SchemaDependencies(document, schemas).need_keys(needs)
+    cached = {need_id: cache.get(need_id, keys[need_id]) for need_id in needs}
+    pending = [need_id for need_id, need_messages in cached.items() if need_messages is None]
+
+    if pending:
+        # the link graph only needs the revalidated needs and the needs they link to
+        options = sorted(schemas.link_options)
+        graph_ids = dict.fromkeys(pending)
+        for need_id in pending:
+            for option in options:
+                graph_ids.update((t, None) for t in needs[need_id].get(option, []) if t in needs)
+        graph = LinkGraph({need_id: needs[need_id] for need_id in graph_ids}, options)
+        for need_id in pending:
+            cached[need_id] = schemas.validate_need(needs[need_id], needs, graph, graph.index[need_id])
+
+    messages = [message for need_messages in cached.values() for message in need_messages]
+    results = {need_id: [keys[need_id], need_messages] for need_id, need_messages in cached.items()}
+    stats = {"validated": len(pending), "skipped": len(needs) - len(pending)}
+
+    elements: Dict[str, str] = {}
+    governs: Dict[str, List[str]] = {}
+    if index is not None:
+        elements = element_hashes(index)
+        governs = governed_types(index)
+        changed = [e for e in elements.keys() | cache.elements.keys() if elements.get(e) != cache.elements.get(e)]
+        # the types governed before the change count as well, e.g. of a removed option
+        changed_governs = {e: [*governs.get(e, []), *cache.governs.get(e, [])] for e in changed}
+        affected = {need_id for need_ids in governed_needs(changed_governs, needs).values() for need_id in need_ids}
+        stats["changed_elements"] = len(changed)
+        stats["governed_needs"] = len(affected)
+
+    cache.save(results, elements, governs)
+    return messages, stats
+
+
+def load_metamodel(metamodel_path: Path) -> MetamodelIndex:
+    if metamodel_path.suffix == ".rst":
+        return MetamodelIndex(needs2records(read_rst_metamodel(metamodel_path)))
+    return MetamodelIndex(needs2records(stream_needs_from_json(metamodel_path, keep=is_metamodel_need)))
+
+
+def main(schema_path: Path, input_path: Path, cache_path: Path, metamodel_path: Optional[Path] = None) -> int:
+    """
+    Validate a project export incrementally, returns the number of failures.
+    """
+    document = json_io.load(schema_path)
+    schemas = validate.CompiledSchemas(document)
+
+    needs = stream_needs_from_json(input_path, fields=schemas.fields)
+    needs = {need_id: validate.reduce_need(need) for need_id, need in needs.items()}
+    index = load_metamodel(metamodel_path) if metamodel_path is not None else None
+
+    messages, stats = validate_needs_cached(schemas, document, needs, ValidationCache(cache_path), index)
+    for message in messages:
+        print(message)
+    if index is not None:
+        print(f"metamodel: {stats['changed_elements']} elements changed, governing {stats['governed_needs']} needs")
+    print(f"validated {len(needs)} needs: {len(messages)} failures, "
+          f"{stats['validated']} revalidated, {stats['skipped']} skipped as unchanged")
+    return len(messages)
+
+if __name__ == "__main__":
+      parser = argparse.ArgumentParser(description="Validate a needs.json incrementally against a generated schema.")
+      parser.add_argument("-s", "--schema", help="Path to the schema json file.", required=True, type=Path)
+      parser.add_argument("-i", "--input", help="Path to the needs json file of the project.", required=True, type=Path)
+      parser.add_argument("-c", "--cache", help="Path to the validation cache file.", required=True, type=Path)
+      parser.add_argument("-m", "--metamodel", help="Path to the metamodel needs.json or index rst, for the reverse index.", default=None, type=Path)
+      args = parser.parse_args()
+
+      sys.exit(1 if main(args.schema, args.input, args.cache, args.metamodel) else 0)
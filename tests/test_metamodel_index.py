@@ -0,0 +1,45 @@
+"""
+Each association is resolved once per run, however many generators read it.
+"""
+
+import unittest
+from pathlib import Path
+
+import benchmarks  # noqa: F401, puts the scripts on the module search path
+from benchmarks.synthetic import synthetic_metamodel
+
+from json2conf import json2schema, json_to_conf
+from metamodel_index import MetamodelIndex
+from metamodel_records import needs2records
+from needs_reader import is_metamodel_need, stream_needs_from_json
+
+fixture_path : Path = Path(__file__).resolve().parent.parent / "use_datamodel" / "needs.json"
+
+
+class AssociationResolutionTest(unittest.TestCase):
+
+    def check_resolved_once(self, index: MetamodelIndex) -> None:
+        json_to_conf(index)
+        json2schema(index)
+        # the selectors, the type defs and the network rules all read the associations
+        self.assertGreater(index.association_resolutions, 0)
+        self.assertEqual(index.association_resolutions, len(index.resolved_associations))
+
+        resolutions = index.association_resolutions
+        json2schema(index)
+        self.assertEqual(index.association_resolutions, resolutions)
+
+    def test_fixture(self) -> None:
+        needs = stream_needs_from_json(fixture_path, keep=is_metamodel_need)
+        self.check_resolved_once(MetamodelIndex(needs2records(needs)))
+
+    def test_shared_typegroups(self) -> None:
+        # many types with associations to few, nested typegroups
+        metamodel = synthetic_metamodel(types=200, typegroups=7, associations=4, nested_groups=True)
+        index = MetamodelIndex(needs2records(metamodel))
+        self.check_resolved_once(index)
+        self.assertEqual(index.association_resolutions, len(index.associations))
+
+
+if __name__ == "__main__":
+    unittest.main()